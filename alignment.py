@@ -0,0 +1,208 @@
+
+#       Stereo pair alignment estimate for camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Measures how the right eye image is misaligned with
+#       the left: vertical and horizontal offset, rotation,
+#       and scale (zoom) mismatch. For a properly set up rig
+#       the vertical offset and rotation should be zero and
+#       scale one. Horizontal offset is just the convergence.
+#
+#       Uses FFT phase correlation. Rotation and scale come
+#       from the Fourier-Mellin method: the magnitude of the
+#       Fourier transform doesn't change with translation,
+#       and in log-polar coordinates rotation and scale
+#       become translations too. Translation is then found
+#       coarse to fine on an image pyramid.
+
+from __future__ import division, print_function
+
+import math
+
+import numpy
+
+from analysis import Analyzer
+
+# Smallest pyramid level dimension
+MIN_LEVEL = 32
+# Biggest image that the rotation/scale estimate uses
+ROTATION_SIZE = 256
+
+
+def halve(img):
+    """Next pyramid level, 2x2 average"""
+    h = img.shape[0] - img.shape[0] % 2
+    w = img.shape[1] - img.shape[1] % 2
+    img = img[:h, :w]
+    return (img[0::2, 0::2] + img[1::2, 0::2] +
+            img[0::2, 1::2] + img[1::2, 1::2]) * 0.25
+
+def pyramid(img, minSize=MIN_LEVEL):
+    """List of images, full size first"""
+    levels = [img]
+    while min(levels[-1].shape) >= 2 * minSize:
+        levels.append(halve(levels[-1]))
+    return levels
+
+def window(shape):
+    """2D Hann window, reduces FFT edge effects"""
+    return numpy.outer(numpy.hanning(shape[0]), numpy.hanning(shape[1])).astype(numpy.float32)
+
+def sample(img, ys, xs):
+    """Bilinear sample img at float coordinates, edge clamped"""
+    h, w = img.shape
+    ys = numpy.clip(ys, 0, h - 1.001)
+    xs = numpy.clip(xs, 0, w - 1.001)
+    y0 = ys.astype(numpy.intp)
+    x0 = xs.astype(numpy.intp)
+    fy = ys - y0
+    fx = xs - x0
+    top = img[y0, x0] * (1 - fx) + img[y0, x0 + 1] * fx
+    bot = img[y0 + 1, x0] * (1 - fx) + img[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bot * fy
+
+def warp(img, angle=0.0, scale=1.0, dy=0.0, dx=0.0):
+    """Rotate (degrees, counter clockwise on screen) and scale
+       img about its centre, then shift by dy, dx pixels"""
+    h, w = img.shape
+    cy = (h - 1) / 2.0
+    cx = (w - 1) / 2.0
+    ys, xs = numpy.mgrid[0:h, 0:w].astype(numpy.float32)
+    # Inverse map from destination to source. Image y is down
+    a = math.radians(angle)
+    c = math.cos(a) / scale
+    s = math.sin(a) / scale
+    ys = ys - cy - dy
+    xs = xs - cx - dx
+    srcX = c * xs - s * ys + cx
+    srcY = s * xs + c * ys + cy
+    return sample(img, srcY, srcX)
+
+def phaseCorrelate(a, b):
+    """Return (dy, dx, peak) such that b is approximately a
+       shifted by dy, dx. Peak near 1 is a good match"""
+    A = numpy.fft.fft2(a)
+    B = numpy.fft.fft2(b)
+    R = B * numpy.conj(A)
+    R /= numpy.abs(R) + 1e-9
+    r = numpy.fft.ifft2(R).real
+    h, w = r.shape
+    py, px = numpy.unravel_index(numpy.argmax(r), r.shape)
+    peak = r[py, px]
+    # Sub pixel by parabola through neighbours
+    def refine(m, c, p):
+        d = m - 2 * c + p
+        if d == 0:
+            return 0.0
+        return 0.5 * (m - p) / d
+    dy = py + refine(r[(py - 1) % h, px], peak, r[(py + 1) % h, px])
+    dx = px + refine(r[py, (px - 1) % w], peak, r[py, (px + 1) % w])
+    if dy > h / 2:
+        dy -= h
+    if dx > w / 2:
+        dx -= w
+    return dy, dx, peak
+
+def highPass(shape):
+    """Emphasise high frequencies in centred spectrum"""
+    y = numpy.cos(numpy.linspace(-0.5, 0.5, shape[0]) * math.pi)
+    x = numpy.cos(numpy.linspace(-0.5, 0.5, shape[1]) * math.pi)
+    X = numpy.outer(y, x)
+    return (1.0 - X) * (2.0 - X)
+
+def logPolar(img, nAngles, nRadii):
+    """Resample centred spectrum magnitude into log polar.
+       Angles cover 0 to pi, spectrum is symmetric"""
+    h, w = img.shape
+    cy = h / 2.0
+    cx = w / 2.0
+    maxR = min(cy, cx)
+    logBase = math.log(maxR) / nRadii
+    theta = numpy.linspace(0, math.pi, nAngles, endpoint=False)
+    radius = numpy.exp(numpy.arange(nRadii) * logBase)
+    ys = cy + numpy.outer(numpy.sin(theta), radius)
+    xs = cx + numpy.outer(numpy.cos(theta), radius)
+    return sample(img, ys, xs), logBase
+
+def spectrum(img):
+    """Windowed, high passed magnitude spectrum"""
+    F = numpy.fft.fftshift(numpy.abs(numpy.fft.fft2(img * window(img.shape))))
+    return F * highPass(img.shape)
+
+def centreSquare(img):
+    """Spectrum must be square for rotations to match"""
+    h, w = img.shape
+    n = min(h, w)
+    y = (h - n) // 2
+    x = (w - n) // 2
+    return img[y:y + n, x:x + n]
+
+def rotationScale(left, right, nAngles=180, nRadii=128):
+    """Return (angle degrees, scale, peak) of right relative to left"""
+    left = centreSquare(left)
+    right = centreSquare(right)
+    lp1, logBase = logPolar(spectrum(left), nAngles, nRadii)
+    lp2, logBase = logPolar(spectrum(right), nAngles, nRadii)
+    dA, dR, peak = phaseCorrelate(lp1, lp2)
+    # Angle axis covers 180 degrees
+    angle = -dA * 180.0 / nAngles
+    scale = math.exp(-dR * logBase)
+    return angle, scale, peak
+
+def cropSame(a, b):
+    h = min(a.shape[0], b.shape[0])
+    w = min(a.shape[1], b.shape[1])
+    return a[:h, :w], b[:h, :w]
+
+def estimate(left, right):
+    """Misalignment of right relative to left greyscale
+       images. Returns dict with offsets in pixels of the
+       images given, rotation in degrees, scale and
+       confidence, roughly 0 to 1"""
+    left, right = cropSame(left, right)
+    leftLevels = pyramid(left)
+    rightLevels = pyramid(right)
+    # Rotation and scale at a small level, they're global
+    rs = 0
+    while rs < len(leftLevels) - 1 and max(leftLevels[rs].shape) > ROTATION_SIZE:
+        rs += 1
+    angle, scale, rsPeak = rotationScale(leftLevels[rs], rightLevels[rs])
+    # Translation coarse to fine, after undoing rotation/scale
+    dy = dx = 0.0
+    peak = 0.0
+    for level in range(len(leftLevels) - 1, -1, -1):
+        dy *= 2
+        dx *= 2
+        a = leftLevels[level]
+        b = warp(rightLevels[level], -angle, 1.0 / scale, -dy, -dx)
+        win = window(a.shape)
+        ddy, ddx, peak = phaseCorrelate(a * win, b * win)
+        dy += ddy
+        dx += ddx
+    return { "dy": dy, "dx": dx, "rotation": angle, "scale": scale,
+             "confidence": min(peak, rsPeak) }
+
+
+class AlignmentAnalyzer(Analyzer):
+    """Background estimate of left/right misalignment"""
+
+    def __init__(self, left, right, onResult=None, budget=0.05, maxRate=4.0):
+        Analyzer.__init__(self, (left, right), onResult, budget, maxRate,
+                          minStep=2, maxStep=16, step=4)
+
+    def analyze(self, images, step, buffers):
+        result = estimate(images[0], images[1])
+        # Back to source pixels
+        height = buffers[0].caps[0]["height"]
+        result["dy"] *= step
+        result["dx"] *= step
+        result["dyPercent"] = 100.0 * result["dy"] / height
+        return result
+
+
+def statusText(result):
+    """Short summary for status bar"""
+    return "dy {0:+.1f} px ({1:+.2f}%)  rot {2:+.2f} deg  scale {3:.3f}  dx {4:+.1f}".format(
+            result["dy"], result["dyPercent"], result["rotation"],
+            result["scale"], result["dx"])
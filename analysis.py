@@ -0,0 +1,238 @@
+
+#       Background image analysis for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Analysis of the live video must never slow down the
+#       preview. A FrameTap sits on the sink pad of a video
+#       texture and does nothing but remember the latest
+#       buffer, so the streaming thread is held up for as
+#       short a time as possible. An Analyzer is a worker
+#       thread that picks up the latest frames from its taps,
+#       converts them to small greyscale NumPy arrays and
+#       runs the actual analysis. If it takes longer than
+#       its time budget, the frames are decimated more next
+#       time; if there's time to spare, less. Frames that
+#       arrive while the analyzer is busy are just skipped.
+
+from __future__ import division, print_function
+
+import threading, time
+
+import numpy
+
+
+def luminanceChannels(struct):
+    """Byte offsets of R, G, B within pixel for RGB caps"""
+    bpp = struct["bpp"] // 8
+    bigEndian = struct["endianness"] == 4321
+    result = []
+    for key in ("red_mask", "green_mask", "blue_mask"):
+        mask = struct[key] & 0xFFFFFFFF
+        low = 0
+        while mask and not (mask & 0xFF):
+            mask >>= 8
+            low += 1
+        if bigEndian:
+            result.append(bpp - 1 - low)
+        else:
+            result.append(low)
+    return bpp, result
+
+def regionBounds(region, w, h, align=1):
+    """Pixel bounds x0, y0, x1, y1 of region (x, y, w, h as
+       fractions, origin top left) in w x h frame"""
+    if region is None:
+        return 0, 0, w, h
+    x0 = int(region[0] * w) // align * align
+    y0 = int(region[1] * h) // align * align
+    x1 = max(x0 + align, int((region[0] + region[2]) * w))
+    y1 = max(y0 + align, int((region[1] + region[3]) * h))
+    return x0, y0, min(x1, w), min(y1, h)
+
+def frameToGray(data, caps, step=1, region=None):
+    """Convert raw frame to float32 greyscale array, taking
+       every step'th pixel. Bayer frames are binned in 2x2
+       mosaic blocks, so step is rounded to even. Region is
+       optional x, y, w, h fractions of frame to use"""
+    struct = caps[0]
+    name = struct.get_name()
+    w = struct["width"]
+    h = struct["height"]
+    step = max(1, int(step))
+    raw = numpy.frombuffer(data, numpy.uint8)
+    # Rows may be padded
+    stride = len(raw) // h
+    img = raw[:stride * h].reshape(h, stride)
+    if region is not None:
+        # Keep Bayer crop on mosaic boundaries
+        x0, y0, x1, y1 = regionBounds(region, w, h, 2)
+        if name == "video/x-raw-gray" or name == "video/x-raw-bayer":
+            bpp = 1
+        else:
+            bpp = struct["bpp"] // 8
+        img = img[y0:y1, x0 * bpp:x1 * bpp]
+        w = x1 - x0
+        h = y1 - y0
+    if name == "video/x-raw-bayer":
+        step = max(2, step - step % 2)
+        h2 = h - h % 2
+        w2 = w - w % 2
+        quad = img[:h2, :w2].astype(numpy.float32)
+        gray = (quad[0::step, 0::step] + quad[1::step, 0::step] +
+                quad[0::step, 1::step] + quad[1::step, 1::step])
+        return gray * 0.25
+    elif name == "video/x-raw-gray":
+        return img[::step, :w:step].astype(numpy.float32)
+    else:
+        bpp, (r, g, b) = luminanceChannels(struct)
+        pixels = img[::step, :w * bpp].reshape(-1, w, bpp)[:, ::step]
+        return (0.299 * pixels[..., r] + 0.587 * pixels[..., g] +
+                0.114 * pixels[..., b]).astype(numpy.float32)
+
+
+class FrameTap(object):
+    """Remember latest buffer arriving at a VideoTexture sink"""
+
+    def __init__(self, stream, wakeup=None):
+        self.lock   = threading.Lock()
+        self.wakeup = wakeup
+        self.buffer = None
+        self.count  = 0
+        self.pad    = stream.sink.get_pad("sink")
+        self.probe  = self.pad.add_buffer_probe(self.onBuffer)
+
+    def onBuffer(self, pad, buf):
+        # On the streaming thread, so do as little as possible
+        self.lock.acquire()
+        self.buffer = buf
+        self.count += 1
+        self.lock.release()
+        if self.wakeup:
+            self.wakeup.set()
+        return True
+
+    def latest(self):
+        """Return (buffer, count) of most recent frame"""
+        self.lock.acquire()
+        result = (self.buffer, self.count)
+        self.lock.release()
+        return result
+
+    def remove(self):
+        if self.probe is not None:
+            self.pad.remove_buffer_probe(self.probe)
+            self.probe = None
+        self.buffer = None
+
+
+class Analyzer(threading.Thread):
+    """Worker thread running analysis on latest frames from
+       one or more video textures. Subclasses override
+       analyze(). onResult(result) is called on this thread"""
+
+    def __init__(self, streams, onResult=None, budget=0.02, maxRate=5.0,
+                 minStep=1, maxStep=32, step=4):
+        threading.Thread.__init__(self)
+        self.daemon   = True
+        self.wakeup   = threading.Event()
+        self.taps     = [FrameTap(s, self.wakeup) for s in streams]
+        self.onResult = onResult
+        self.budget   = budget      # Seconds per result
+        self.maxRate  = maxRate     # Results per second
+        self.minStep  = minStep
+        self.maxStep  = maxStep
+        self.step     = step        # Current decimation
+        self.stopped  = False
+        self.seen     = [0] * len(self.taps)
+        self.region   = None        # Part of frame to use
+        self.result   = None
+        # Stats
+        self.runs       = 0
+        self.skipped    = 0
+        self.overBudget = 0
+        self.lastTime   = 0.0
+        self.totalTime  = 0.0
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+        for tap in self.taps:
+            tap.remove()
+
+    def run(self):
+        lastRun = 0.0
+        while not self.stopped:
+            self.wakeup.wait(0.5)
+            self.wakeup.clear()
+            if self.stopped:
+                break
+            # Rate limit
+            delay = lastRun + 1.0 / self.maxRate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+                if self.stopped:
+                    break
+            frames = [tap.latest() for tap in self.taps]
+            # Need something from every stream, and something new
+            if any(buf is None for buf, count in frames):
+                continue
+            counts = [count for buf, count in frames]
+            if counts == self.seen:
+                continue
+            for i in range(len(counts)):
+                self.skipped += max(0, counts[i] - self.seen[i] - 1)
+            self.seen = counts
+            lastRun = time.time()
+            result = self.process([buf for buf, count in frames])
+            self.account(time.time() - lastRun)
+            if isinstance(result, dict):
+                # Cost of this result, for the status bar
+                result["time"] = self.lastTime * 1000.0
+                result["budget"] = self.budget * 1000.0
+                result["overBudget"] = self.overBudget
+            self.result = result
+            if self.onResult and not self.stopped:
+                self.onResult(result)
+
+    def process(self, buffers):
+        """Convert buffers and analyze"""
+        step = self.step
+        region = self.region
+        images = [frameToGray(buf.data, buf.caps, step, region) for buf in buffers]
+        return self.analyze(images, step, buffers)
+
+    def analyze(self, images, step, buffers):
+        """Override. images are greyscale float32 arrays
+           decimated by step from the original frames. A dict
+           result gets time, budget (milliseconds) and
+           overBudget added once the run is accounted for"""
+        return None
+
+    def account(self, elapsed):
+        """Track time taken and adapt to budget"""
+        self.runs += 1
+        self.lastTime = elapsed
+        self.totalTime += elapsed
+        if elapsed > self.budget:
+            self.overBudget += 1
+            self.adapt(True)
+        elif elapsed < self.budget / 4:
+            self.adapt(False)
+
+    def adapt(self, over):
+        """Do less work next time if over budget, more if
+           well under. Default is to change decimation"""
+        if over:
+            self.step = min(self.step * 2, self.maxStep)
+        else:
+            self.step = max(self.step // 2, self.minStep)
+
+    def stats(self):
+        """Return dict of counters, times in milliseconds"""
+        return { "runs":       self.runs,
+                 "skipped":    self.skipped,
+                 "overBudget": self.overBudget,
+                 "step":       self.step,
+                 "lastTime":   self.lastTime * 1000.0,
+                 "meanTime":   self.totalTime * 1000.0 / max(1, self.runs) }
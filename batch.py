@@ -0,0 +1,378 @@
+#!/usr/bin/python
+
+#       Offline batch analysis for stereo camera recordings
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Checks recorded left/right file pairs without the GUI.
+#       Each pair is decoded with the same pipelines the app
+#       would use, into appsinks instead of texture sinks, and
+#       every frame is measured for alignment, sharpness,
+#       exposure, and whether it is a duplicate of the last
+#       frame from that eye (a dropped frame the recorder
+#       filled in). Pairs are spread over a process pool, one
+#       pair per process at a time, and results are written as
+#       JSON lines as soon as each pair is done, so a long
+#       list can be triaged while it is still running:
+#           python batch.py -j 8 left1.mov right1.mov left2.mov right2.mov
+#           python batch.py --list pairs.txt --frames -o results.jsonl
+#
+#       For each pair there is one line with "type": "pair"
+#       summarising it, and with --frames one "type": "frame"
+#       line per frame before that. Frames are paired by count,
+#       first with first, so the recordings must start together.
+#       Needs GST_PLUGIN_PATH set as for run.sh if the default
+#       RTSP pipe (Elphel Bayer) was used to record.
+
+from __future__ import division, print_function
+
+import sys, time, json, math, argparse, multiprocessing, Queue
+
+import numpy
+
+import pygst
+pygst.require("0.10")
+import gst
+import gobject
+
+import gstvideo
+import alignment, exposure, focus
+from analysis import frameToGray
+
+# What the app's texture sink accepts, so the pipeline
+# negotiates the same format
+SINK_CAPS = ("video/x-raw-rgb; video/x-raw-gray,bpp=8,depth=8; "
+             "video/x-raw-bayer,bpp=8,depth=8")
+
+# Sharpness is measured at this decimation, as FocusAnalyzer
+FOCUS_STEP = 2
+# Mean absolute difference, in grey levels, below which a
+# frame counts as a repeat of the previous one
+DUPLICATE_LEVEL = 0.5
+# Decoded frames waiting per eye
+QUEUE_FRAMES = 4
+# How often to check for pipeline errors while waiting, seconds
+ERROR_POLL = 0.5
+
+
+def finite(value):
+    """JSON has no NaN or infinity"""
+    if value is None or math.isnan(value) or math.isinf(value):
+        return None
+    return value
+
+def summary(values, ideal=0.0):
+    """Mean, and furthest from ideal, of values ignoring None"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return { "mean": None, "worst": None }
+    return { "mean": sum(values) / len(values),
+             "worst": max(values, key=lambda v: abs(v - ideal)) }
+
+
+class FrameReader(object):
+    """Decoded frames from one source, in order"""
+
+    def __init__(self, source, pipeline=None):
+        if not pipeline:
+            pipeline = gstvideo.defaultPipeline(source)
+        pipeline = gstvideo.splitSinkParams(pipeline)[0]
+        self.source = source
+        self.frames = Queue.Queue(QUEUE_FRAMES)
+        self.pipeline = gst.parse_launch(pipeline.format(source=source) +
+                                         " ! appsink name=batchsink")
+        sink = self.pipeline.get_by_name("batchsink")
+        sink.set_property("caps", gst.Caps(SINK_CAPS))
+        # Every frame, as fast as it can be decoded
+        sink.set_property("sync", False)
+        sink.set_property("emit-signals", True)
+        sink.connect("new-buffer", self.onBuffer)
+        sink.connect("eos", self.onEOS)
+        self.sink = sink
+        self.bus = self.pipeline.get_bus()
+        self.count = 0
+        self.stopping = False
+        self.pipeline.set_state(gst.STATE_PLAYING)
+
+    def onBuffer(self, sink):
+        # Streaming thread
+        self.put(sink.emit("pull-buffer"))
+        return gst.FLOW_OK
+
+    def onEOS(self, sink):
+        self.put(None)
+
+    def put(self, buf):
+        # Wait if we fall behind, but not once stopping or
+        # the pipeline could never shut down
+        while not self.stopping:
+            try:
+                self.frames.put(buf, True, ERROR_POLL)
+                return
+            except Queue.Full:
+                pass
+
+    def next(self):
+        """Next buffer, or None at end. Raises RuntimeError
+           if the pipeline fails"""
+        while True:
+            try:
+                buf = self.frames.get(True, ERROR_POLL)
+            except Queue.Empty:
+                message = self.bus.pop_filtered(gst.MESSAGE_ERROR)
+                if message is not None:
+                    err, debug = message.parse_error()
+                    raise RuntimeError("{0}: {1}".format(self.source, err))
+                continue
+            if buf is not None:
+                self.count += 1
+            else:
+                # Stay at end if called again
+                self.frames.put(None)
+            return buf
+
+    def stop(self):
+        self.stopping = True
+        self.pipeline.set_state(gst.STATE_NULL)
+
+
+class PairAnalysis(object):
+    """Per frame measurements of one left/right recording"""
+
+    def __init__(self, index, left, right, options):
+        self.index   = index
+        self.left    = left
+        self.right   = right
+        self.options = options
+        self.records = []
+        self.previous = [None, None]
+        # Per frame values, for the summary
+        self.dy = []
+        self.dx = []
+        self.rotation = []
+        self.scale = []
+        self.confidence = []
+        self.sharpness = ([], [])
+        self.means  = ([], [])
+        self.clipLow  = ([], [])
+        self.clipHigh = ([], [])
+        self.exposureMismatch = []
+        self.duplicates = [0, 0]
+
+    def run(self):
+        """Return list of result dicts, pair summary last"""
+        start = time.time()
+        readers = []
+        error = None
+        frame = 0
+        try:
+            for source in (self.left, self.right):
+                readers.append(FrameReader(source, self.options.pipeline))
+            while True:
+                bufs = [readers[0].next(), readers[1].next()]
+                if bufs[0] is None or bufs[1] is None:
+                    # Count the rest of the longer one
+                    for i in (0, 1):
+                        while bufs[i] is not None:
+                            bufs[i] = readers[i].next()
+                    break
+                self.measure(frame, bufs)
+                frame += 1
+        except (RuntimeError, gobject.GError) as e:
+            error = str(e)
+        finally:
+            for reader in readers:
+                reader.stop()
+        elapsed = time.time() - start
+        result = { "type": "pair", "pair": self.index,
+                   "left": self.left, "right": self.right,
+                   "frames": frame,
+                   "leftFrames": readers[0].count if len(readers) > 0 else 0,
+                   "rightFrames": readers[1].count if len(readers) > 1 else 0,
+                   "seconds": elapsed,
+                   "fps": frame / elapsed if elapsed > 0 else None,
+                   "error": error }
+        result.update(self.summarise())
+        self.records.append(result)
+        return self.records
+
+    def measure(self, frame, bufs):
+        options = self.options
+        # One conversion, sharpness needs the most pixels
+        fine = [frameToGray(buf.data, buf.caps, FOCUS_STEP) for buf in bufs]
+        sub = max(1, options.step // FOCUS_STEP)
+        images = [img[::sub, ::sub] for img in fine]
+        step = sub * FOCUS_STEP
+        record = { "type": "frame", "pair": self.index, "frame": frame, "time": None }
+        if bufs[0].timestamp != gst.CLOCK_TIME_NONE:
+            record["time"] = bufs[0].timestamp / gst.SECOND
+        # Alignment is by far the slowest
+        if frame % options.alignEvery == 0:
+            a = alignment.estimate(images[0], images[1])
+            height = bufs[0].caps[0]["height"]
+            a["dy"] *= step
+            a["dx"] *= step
+            a["dyPercent"] = 100.0 * a["dy"] / height
+            for key in a:
+                a[key] = finite(float(a[key]))
+            for key in ("dy", "dx", "rotation", "scale", "confidence"):
+                getattr(self, key).append(a[key])
+            record.update(a)
+        sharp = [finite(focus.sharpness(img)) for img in fine]
+        hists = [exposure.histogram(img) for img in images]
+        duplicate = []
+        for eye in (0, 1):
+            n = max(1, hists[eye].sum())
+            level = exposure.meanLevel(hists[eye])
+            low  = 100.0 * hists[eye][:exposure.CLIP_LOW + 1].sum() / n
+            high = 100.0 * hists[eye][exposure.CLIP_HIGH:].sum() / n
+            self.sharpness[eye].append(sharp[eye])
+            self.means[eye].append(level)
+            self.clipLow[eye].append(low)
+            self.clipHigh[eye].append(high)
+            prev = self.previous[eye]
+            same = (prev is not None and prev.shape == images[eye].shape and
+                    float(numpy.abs(images[eye] - prev).mean()) < options.duplicateLevel)
+            if same:
+                self.duplicates[eye] += 1
+            duplicate.append(same)
+            self.previous[eye] = images[eye]
+        mismatch = exposure.mismatch(hists[0], hists[1])
+        self.exposureMismatch.append(mismatch)
+        if options.frames:
+            record.update({ "sharpness": sharp,
+                            "means": [self.means[eye][-1] for eye in (0, 1)],
+                            "clipLow": [self.clipLow[eye][-1] for eye in (0, 1)],
+                            "clipHigh": [self.clipHigh[eye][-1] for eye in (0, 1)],
+                            "exposureMismatch": mismatch,
+                            "duplicate": duplicate })
+            self.records.append(record)
+
+    def summarise(self):
+        """Whole recording values for the pair record"""
+        def mean(values):
+            values = [v for v in values if v is not None]
+            return sum(values) / len(values) if values else None
+        sharp = [mean(self.sharpness[eye]) for eye in (0, 1)]
+        sharpMismatch = None
+        if None not in sharp and max(sharp) > 0:
+            sharpMismatch = 100.0 * abs(sharp[0] - sharp[1]) / max(sharp)
+        return {
+            "dy":           summary(self.dy),
+            "dx":           summary(self.dx),
+            "rotation":     summary(self.rotation),
+            "scale":        summary(self.scale, 1.0),
+            "confidence":   min([c for c in self.confidence if c is not None] or [None]),
+            "sharpness":    sharp,
+            "sharpnessMismatch": sharpMismatch,
+            "means":        [mean(self.means[eye]) for eye in (0, 1)],
+            "clipLow":      [max(self.clipLow[eye]) if self.clipLow[eye] else None
+                             for eye in (0, 1)],
+            "clipHigh":     [max(self.clipHigh[eye]) if self.clipHigh[eye] else None
+                             for eye in (0, 1)],
+            "exposureMismatch": summary(self.exposureMismatch),
+            "duplicates":   self.duplicates,
+        }
+
+
+##      Process pool
+
+
+def initWorker():
+    # appsink signals come from streaming threads
+    gobject.threads_init()
+
+def analyzePair(job):
+    """Run in pool process. Errors are reported, not raised,
+       so one bad file doesn't stop the batch"""
+    index, left, right, options = job
+    try:
+        return PairAnalysis(index, left, right, options).run()
+    except Exception as e:
+        return [{ "type": "pair", "pair": index, "left": left, "right": right,
+                  "error": "{0}: {1}".format(type(e).__name__, e) }]
+
+def readPairs(filename):
+    """Two file names per line, blank lines and # comments ignored"""
+    pairs = []
+    f = open(filename)
+    for line in f:
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+        names = line.split()
+        if len(names) != 2:
+            raise ValueError("Need left and right on each line: " + line)
+        pairs.append(tuple(names))
+    f.close()
+    return pairs
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description="StereoCamCheck batch analysis")
+    parser.add_argument("files", nargs="*", help="left right left right ...")
+    parser.add_argument("--list", help="File of left right pairs, one per line")
+    parser.add_argument("--pipeline", default=None,
+                        help="Pipeline string with {source}, default as the app")
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="Pairs to analyse at once")
+    parser.add_argument("--step", type=int, default=4,
+                        help="Decimation for alignment, exposure, duplicates")
+    parser.add_argument("--align-every", dest="alignEvery", type=int, default=1,
+                        help="Only estimate alignment every Nth frame")
+    parser.add_argument("--duplicate-level", dest="duplicateLevel", type=float,
+                        default=DUPLICATE_LEVEL,
+                        help="Mean grey level difference for a repeated frame")
+    parser.add_argument("--frames", action="store_true",
+                        help="Write a line per frame as well as per pair")
+    parser.add_argument("-o", "--output", default=None, help="Default stdout")
+    args = parser.parse_args(argv)
+    if len(args.files) % 2 != 0:
+        parser.error("Files must be in left right pairs")
+    args.alignEvery = max(1, args.alignEvery)
+    return args
+
+def main(argv):
+    args = parseArgs(argv)
+    pairs = list(zip(args.files[0::2], args.files[1::2]))
+    if args.list:
+        pairs += readPairs(args.list)
+    if not pairs:
+        print("Nothing to do, see --help", file=sys.stderr)
+        return 1
+    out = open(args.output, "w") if args.output else sys.stdout
+    jobs = [(i, left, right, args) for i, (left, right) in enumerate(pairs)]
+    start = time.time()
+    frames = 0
+    failed = 0
+    # New process per pair, so a crashing decoder only loses one
+    pool = multiprocessing.Pool(max(1, args.jobs), initWorker, maxtasksperchild=1)
+    try:
+        # Results as they finish, not in order
+        for records in pool.imap_unordered(analyzePair, jobs):
+            for record in records:
+                print(json.dumps(record), file=out)
+            out.flush()
+            pair = records[-1]
+            frames += pair.get("frames", 0)
+            if pair["error"]:
+                failed += 1
+                print("{0} {1}: {2}".format(pair["left"], pair["right"], pair["error"]),
+                      file=sys.stderr)
+        pool.close()
+    except BaseException:
+        # Ctrl-C or a failure here, don't wait for the rest
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    elapsed = time.time() - start
+    print("{0} pairs, {1} frames, {2} failed in {3:.1f} s, {4:.1f} frames/s".format(
+            len(pairs), frames, failed, elapsed, frames / max(elapsed, 1e-9)),
+          file=sys.stderr)
+    if out is not sys.stdout:
+        out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
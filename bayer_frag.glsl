@@ -0,0 +1,106 @@
+
+// Bayer demosaic fragment shader function
+// Written by Morgan McGuire, Williams College
+// From his paper "Efficient, High-Quality Bayer
+// Demosaic Filtering on GPUs"
+
+// Turned into a function so the video and composite
+// shaders can share it. Goes in front of the shader
+// that uses it, after the #version and #defines.
+
+// center, xCoord, yCoord come from the vertex shader:
+// see std_vert.glsl. binned() is a cheap alternative for
+// when the video is displayed at half size or less.
+
+vec4 demosaic(sampler2D image, vec4 center, vec4 xCoord, vec4 yCoord)
+{
+    #define fetch(x, y) texture2D(image, vec2((x), (y))).r
+
+    float C = texture2D(image, center.xy).r;
+    const vec4 kC = vec4(4.0, 6.0, 5.0, 5.0) / 8.0;
+
+    // Determine which of 4 elements in mosaic we are
+    vec2 alternate = mod(floor(center.zw), 2.0);
+
+    vec4 Dvec = vec4(
+        fetch(xCoord[1], yCoord[1]),    // (-1, -1)
+        fetch(xCoord[1], yCoord[2]),    // (-1, 1)
+        fetch(xCoord[2], yCoord[1]),    // (1, -1)
+        fetch(xCoord[2], yCoord[2]));   // (1, 1)
+
+    vec4 PATTERN = (kC.xyz * C).xyzz;
+
+    Dvec.xy += Dvec.zw;
+    Dvec.x  += Dvec.y;
+
+    vec4 value = vec4(
+        fetch(center.x, yCoord[0]),     // (0, -2)
+        fetch(center.x, yCoord[1]),     // (0, -1)
+        fetch(xCoord[0], center.y),     // (-1, 0)
+        fetch(xCoord[1], center.y));    // (-2, 0)
+
+    vec4 temp = vec4(
+        fetch(center.x, yCoord[3]),     // (0, 2)
+        fetch(center.x, yCoord[2]),     // (0, 1)
+        fetch(xCoord[3], center.y),     // (2, 0)
+        fetch(xCoord[2], center.y));    // (1, 0)
+    value += temp;
+
+    const vec4 kA = vec4(-1.0, -1.5,  0.5, -1.0) / 8.0;
+    const vec4 kB = vec4( 2.0,  0.0,  0.0,  4.0) / 8.0;
+    const vec4 kD = vec4( 0.0,  2.0, -1.0, -1.0) / 8.0;
+    #define kE (kA.xywz)
+    #define kF (kB.xywz)
+
+    // There are five filter patterns: identity, cross,
+    // checker, theta, phi. Precompute them all
+    #define A (value[0])
+    #define B (value[1])
+    #define D (Dvec[0])
+    #define E (value[2])
+    #define F (value[3])
+
+    // Avoid zero elements
+    PATTERN.yzw += (kD.yz * D).xyy;
+
+    PATTERN += (kA.xyz * A).xyzx + (kE.xyw * E).xyxz;
+    PATTERN.xw += kB.xw * B;
+    PATTERN.xz += kF.xz * F;
+
+    vec4 rgb = (alternate.y == 0) ?
+                ((alternate.x == 0) ?
+                    vec4(C, PATTERN.xy, 1) :
+                    vec4(PATTERN.z,C, PATTERN.w, 1)) :
+                ((alternate.x == 0) ?
+                    vec4(PATTERN.w, C, PATTERN.z, 1) :
+                    vec4(PATTERN.yx, C, 1));
+    return clamp(rgb, 0.0, 1.0);
+
+    // Don't leak into the shader that includes this
+    #undef fetch
+    #undef kE
+    #undef kF
+    #undef A
+    #undef B
+    #undef D
+    #undef E
+    #undef F
+}
+
+// Half resolution: each RGGB quad becomes one RGB pixel,
+// 4 fetches instead of 13. st is the texture coord, and
+// sourceSize, firstRed the same as for std_vert.glsl
+
+vec4 binned(sampler2D image, vec2 st, vec4 sourceSize, vec2 firstRed)
+{
+    // Texel that is the red corner of the quad st is in
+    vec2 red = floor((floor(st * sourceSize.xy) + firstRed) * 0.5) * 2.0 - firstRed;
+    // A quad cut off by the edge of the texture would read green
+    // as red or blue, so edge texels use the whole quad next door
+    red += 2.0 * (step(red, vec2(-0.5)) - step(sourceSize.xy - 1.5, red));
+    vec2 r = (red + 0.5) * sourceSize.zw;
+    vec2 d = sourceSize.zw;
+    float g = texture2D(image, r + vec2(d.x, 0.0)).r +
+              texture2D(image, r + vec2(0.0, d.y)).r;
+    return vec4(texture2D(image, r).r, 0.5 * g, texture2D(image, r + d).r, 1.0);
+}
@@ -0,0 +1,625 @@
+#!/usr/bin/python
+
+#       Display benchmark for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Runs the real StereoFrame and VideoTexture code with
+#       videotestsrc pipelines in every display mode, for
+#       several source formats and resolutions, and prints
+#       one table row per stream. Meant to be run headless,
+#       for example
+#           xvfb-run -s "-screen 0 1920x1080x24" \
+#               env LIBGL_ALWAYS_SOFTWARE=1 python benchmark.py
+#       which gets Mesa llvmpipe, but works on a desktop too.
+#       Needs the plugin built and GST_PLUGIN_PATH set, as
+#       for run.sh
+
+#       Columns are
+#           format width height mode setup bayer eye
+#           setup       shared or separate pipelines for the eyes,
+#                       or worker: each source decoded in its own
+#                       process, see decodeworker.py
+#           eye         left, right, or cam3 etc in grid mode
+#           bayer       full, half or auto resolution demosaic,
+#                       only for Bayer format
+#           paint_fps   window repaints per second
+#           upload_fps  frames uploaded to texture per second
+#           drops       frames dropped by the sink
+#           upload_ms   mean texture upload time
+#           upload_mbs  megabytes per second uploaded to texture
+#           latency_ms  mean time from frame timestamp to upload,
+#                       recent uploads
+#           stream_cpu  % of one core used by streaming thread
+#           process_cpu % of one core used by whole process
+#           worker_cpu  % of one core used by this eye's decode
+#                       worker process, worker setup only
+#           startup_ms  from creating the streams to first frame
+#                       on this eye's texture
+#           bayer_gain  paint_fps relative to the same run with
+#                       full resolution Bayer
+#
+#       With --reconnect, instead runs one RTSP stream from a local
+#       gst-rtsp-server (its test-launch example program) and kills
+#       and restarts the server, measuring how long the source
+#       supervisor takes to get frames back. Columns are
+#           outage      count
+#           down_ms     how long the server was down
+#           detect_ms   last frame to failure noticed
+#           reconnect_ms server back up to first new frame
+#           outage_ms   last frame before to first frame after
+#           attempts    reconnection attempts
+#           reason      why the supervisor decided it had failed
+#
+#       With --seek LEFT RIGHT, instead plays two video files and
+#       jumps both eyes to random positions, each one with and
+#       then without the keyframe index (see seeking.py), timing
+#       from the seek until both eyes show the new frame. One row
+#       per method, columns are
+#           method      index or plain
+#           seeks       seeks that completed
+#           mean_ms, median_ms, max_ms  seek latency
+#           index_ms    time to build the left index, when it was
+#                       built (not necessarily this run)
+#           cached      True if the indexes came from the disk cache
+
+from __future__ import division, print_function
+
+import sys, os, time, random, tempfile, argparse, json, ctypes, platform, subprocess
+
+progDir = os.path.dirname(__file__)
+if progDir:
+    os.chdir(progDir)
+
+import wx
+
+import app
+
+# Don't let benchmark runs change the user's prefs
+app.config = wx.FileConfig(localFilename=os.path.join(tempfile.mkdtemp(), "benchmark.cfg"))
+
+from renderer import MYID_BLENDED, MYID_ANAGLYPH, MYID_DIFFERENCE, MYID_GRID
+from renderer import MYID_BAYER_AUTO, MYID_BAYER_FULL, MYID_BAYER_HALF
+
+
+# Source formats. Each is the tail of a pipeline that starts
+# with videotestsrc producing the right size and rate
+FORMATS = {
+    "rgb":  "ffmpegcolorspace ! video/x-raw-rgb,bpp=24,depth=24,endianness=4321,"
+            "red_mask=16711680,green_mask=65280,blue_mask=255",
+    "bgrx": "ffmpegcolorspace ! video/x-raw-rgb,bpp=32,depth=24,endianness=4321,"
+            "red_mask=65280,green_mask=16711680,blue_mask=-16777216",
+    "gray": "ffmpegcolorspace ! video/x-raw-gray,bpp=8,depth=8",
+    "bayer": "ffmpegcolorspace ! video/x-raw-rgb,bpp=32,depth=32 ! "
+             "rgb2bayer ! video/x-raw-bayer,format=rggb",
+}
+
+SIZES = ((640, 480), (1280, 720), (1920, 1088), (2592, 1936))
+
+# Display mode name: (stereo, StereoFrame overlay value)
+MODES = {
+    "single":     (False, 0),
+    "split":      (True, 0),
+    "blended":    (True, MYID_BLENDED),
+    "anaglyph":   (True, MYID_ANAGLYPH),
+    "difference": (True, MYID_DIFFERENCE),
+    "grid":       (True, MYID_GRID),
+}
+
+# videotestsrc patterns for the extra cameras in grid mode
+GRID_PATTERNS = ("snow", "checkers-8", "circular", "zone-plate",
+                 "gamut", "smpte75", "chroma-zone-plate", "blink")
+
+SETUPS = ("shared", "separate", "worker")
+
+# Bayer preview name: StereoFrame bayerPreview value. In
+# this order so the full resolution result comes first
+BAYER_PREVIEWS = (
+    ("full", MYID_BAYER_FULL),
+    ("half", MYID_BAYER_HALF),
+    ("auto", MYID_BAYER_AUTO),
+)
+
+COLUMNS = ("format", "width", "height", "mode", "setup", "bayer", "eye",
+           "paint_fps", "upload_fps", "drops", "upload_ms", "upload_mbs", "latency_ms",
+           "stream_cpu", "process_cpu", "startup_ms", "bayer_gain", "worker_cpu")
+
+
+# gst-rtsp-server test-launch serves this on RTSP_URL
+RTSP_LAUNCH = "( videotestsrc is-live=true ! video/x-raw-yuv,width=%d,height=%d,framerate=%d/1 " \
+              "! jpegenc ! rtpjpegpay name=pay0 pt=96 )"
+RTSP_URL = "rtsp://127.0.0.1:8554/test"
+# Default RTSP pipe needs the Elphel jp462bayer plugin
+RTSP_PIPE = "rtspsrc location={source} latency=50 ! rtpjpegdepay ! jpegdec ! ffmpegcolorspace"
+
+RECONNECT_COLUMNS = ("outage", "down_ms", "detect_ms", "reconnect_ms", "outage_ms",
+                     "attempts", "reason")
+
+SEEK_COLUMNS = ("method", "seeks", "mean_ms", "median_ms", "max_ms", "index_ms", "cached")
+
+
+def testPipeline(fmt, w, h, fps):
+    """Pipeline string for StereoFrame. {source} becomes
+       the videotestsrc pattern, so the two eyes differ"""
+    head = "videotestsrc is-live=true pattern={source} ! " \
+           "video/x-raw-yuv,width=%d,height=%d,framerate=%d/1 ! " % (w, h, fps)
+    return head + FORMATS[fmt]
+
+
+##      Per thread CPU use, Linux only
+
+
+_gettid = { "x86_64": 186, "i686": 224, "i386": 224,
+            "aarch64": 178, "armv7l": 224 }
+
+def currentThreadID():
+    """OS thread id of caller, or None if don't know how"""
+    nr = _gettid.get(platform.machine())
+    if nr is None:
+        return None
+    return ctypes.CDLL(None).syscall(nr)
+
+def threadCPU(tid):
+    """CPU seconds used so far by thread, or None"""
+    try:
+        f = open("/proc/self/task/%d/stat" % tid)
+        stat = f.read()
+        f.close()
+    except (IOError, OSError, TypeError):
+        return None
+    # Thread name is in brackets and can contain spaces
+    fields = stat[stat.rindex(")") + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def processCPU():
+    t = os.times()
+    return t[0] + t[1]
+
+
+class StreamProbe(object):
+    """Find out which thread is streaming into a VideoTexture"""
+    def __init__(self, stream):
+        self.tid = None
+        self.pad = stream.sink.get_pad("sink")
+        self.probe = self.pad.add_buffer_probe(self.onBuffer)
+
+    def onBuffer(self, pad, buf):
+        if self.tid is None:
+            self.tid = currentThreadID()
+        return True
+
+    def remove(self):
+        if self.probe is not None:
+            self.pad.remove_buffer_probe(self.probe)
+            self.probe = None
+
+
+class Snapshot(object):
+    """Counters at one moment"""
+    def __init__(self, canvas, probes):
+        self.time    = time.time()
+        self.cpu     = processCPU()
+        self.paints  = canvas.scheduler.paints
+        self.streams = []
+        for stream, probe in probes:
+            m = stream.metrics()
+            m["cpu"] = threadCPU(probe.tid)
+            m["uploadTimes"] = stream.sink.get_property("upload_times")
+            m["latencies"] = stream.sink.get_property("latencies")
+            self.streams.append(m)
+
+
+class Benchmark(object):
+    """Step through configurations from within wx main loop"""
+
+    def __init__(self, frame, configs, fps, warmup, seconds, output, cameras=4):
+        self.frame   = frame
+        self.canvas  = frame.canvas
+        self.configs = list(configs)
+        self.fps     = fps
+        self.warmup  = warmup
+        self.seconds = seconds
+        self.output  = output
+        self.cameras = cameras
+        self.probes  = []
+        # Full resolution Bayer paint_fps, for comparison
+        self.fullFPS = {}
+
+    def start(self):
+        self.output.begin()
+        wx.CallLater(500, self.nextConfig)
+
+    def nextConfig(self):
+        self.stopStreams()
+        if len(self.configs) == 0:
+            self.output.end()
+            self.frame.Close()
+            return
+        self.current = self.configs.pop(0)
+        fmt, (w, h), mode, setup, bayer = self.current
+        stereo, overlay = MODES[mode]
+        self.canvas.overlay = overlay
+        self.canvas.bayerPreview = dict(BAYER_PREVIEWS).get(bayer, MYID_BAYER_AUTO)
+        app.config.Write("sharedPipeline", repr(setup != "separate"))
+        app.config.Write("decodeWorkers", repr(setup == "worker"))
+        pipeline = testPipeline(fmt, w, h, self.fps)
+        self.startTime = time.time()
+        if mode == "grid":
+            extra = [GRID_PATTERNS[i % len(GRID_PATTERNS)] for i in range(self.cameras - 2)]
+            self.frame.setVideoStreams("smpte", "ball", pipeline, extra=extra)
+        elif stereo:
+            self.frame.setVideoStreams("smpte", "ball", pipeline)
+        else:
+            self.frame.setVideoStreams("smpte", "", pipeline)
+        streams = self.canvas.allStreams()
+        self.probes = [(s, StreamProbe(s)) for s in streams]
+        self.canvas.positionStreams(True)
+        wx.CallLater(int(self.warmup * 1000), self.beginMeasure)
+
+    def beginMeasure(self):
+        self.before = Snapshot(self.canvas, self.probes)
+        wx.CallLater(int(self.seconds * 1000), self.endMeasure)
+
+    def endMeasure(self):
+        after = Snapshot(self.canvas, self.probes)
+        self.report(self.before, after)
+        wx.CallAfter(self.nextConfig)
+
+    def stopStreams(self):
+        for stream, probe in self.probes:
+            probe.remove()
+        self.probes = []
+        for stream in self.canvas.allStreams():
+            stream.stop()
+        self.canvas.left = self.canvas.right = None
+        self.canvas.extra = []
+
+    def report(self, before, after):
+        fmt, (w, h), mode, setup, bayer = self.current
+        elapsed = after.time - before.time
+        paintFPS = (after.paints - before.paints) / elapsed
+        key = (fmt, w, h, mode, setup)
+        if bayer == "full":
+            self.fullFPS[key] = paintFPS
+        if bayer is not None and self.fullFPS.get(key):
+            gain = paintFPS / self.fullFPS[key]
+        else:
+            gain = None
+        procCPU = 100.0 * (after.cpu - before.cpu) / elapsed
+        eyes = ["left", "right"] + ["cam" + str(i + 1) for i in range(2, len(after.streams))]
+        for i in range(len(after.streams)):
+            b = before.streams[i]
+            a = after.streams[i]
+            times = a["uploadTimes"]
+            if len(times) > 0:
+                uploadMS = sum(times) / len(times) / 1000.0
+            else:
+                uploadMS = None
+            lags = [t for t in a["latencies"] if t >= 0]
+            if len(lags) > 0:
+                latencyMS = sum(lags) / len(lags) / 1000.0
+            else:
+                latencyMS = None
+            if a["cpu"] is not None and b["cpu"] is not None:
+                streamCPU = 100.0 * (a["cpu"] - b["cpu"]) / elapsed
+            else:
+                streamCPU = None
+            if a["workerCPU"] is not None:
+                workerCPU = 100.0 * (a["workerCPU"] - b["workerCPU"]) / elapsed
+            else:
+                workerCPU = None
+            first = self.probes[i][0].firstFrameTime
+            if first is not None:
+                startupMS = (first - self.startTime) * 1000.0
+            else:
+                startupMS = None
+            self.output.row((fmt, w, h, mode, setup, bayer, eyes[i],
+                    paintFPS, (a["uploads"] - b["uploads"]) / elapsed,
+                    a["drops"] - b["drops"], uploadMS,
+                    (a["uploadBytes"] - b["uploadBytes"]) / elapsed / 1e6, latencyMS,
+                    streamCPU, procCPU, startupMS, gain, workerCPU))
+
+
+class ReconnectBenchmark(object):
+    """Kill and restart a local RTSP server under a live stream"""
+
+    # Give up waiting for frames after this many seconds
+    TIMEOUT = 30.0
+
+    def __init__(self, frame, server, size, fps, outages, downTime, warmup, output):
+        self.frame    = frame
+        self.canvas   = frame.canvas
+        self.command  = [server, RTSP_LAUNCH % (size[0], size[1], fps)]
+        self.outages  = outages
+        self.downTime = downTime
+        self.warmup   = warmup
+        self.output   = output
+        self.server   = None
+        self.count    = 0
+
+    def start(self):
+        self.output.begin()
+        self.startServer()
+        wx.CallLater(1000, self.connect)
+
+    def startServer(self):
+        self.server = subprocess.Popen(self.command)
+
+    def stopServer(self):
+        if self.server:
+            self.server.terminate()
+            self.server.wait()
+            self.server = None
+
+    def connect(self):
+        self.frame.setVideoStreams(RTSP_URL, "", RTSP_PIPE)
+        self.stream = self.canvas.left
+        if self.stream.supervisor is None:
+            print("No source supervisor, is the reconnect pref off?", file=sys.stderr)
+            self.finish()
+            return
+        wx.CallLater(int(self.warmup * 1000), self.outage)
+
+    def outage(self):
+        if self.count >= self.outages:
+            self.finish()
+            return
+        self.count += 1
+        self.before = self.stream.supervisor.stats()
+        self.stopServer()
+        self.killTime = time.time()
+        wx.CallLater(int(self.downTime * 1000), self.restart)
+
+    def restart(self):
+        self.startServer()
+        self.restartTime = time.time()
+        self.poll()
+
+    def poll(self):
+        supervisor = self.stream.supervisor
+        s = supervisor.stats()
+        if s["reconnects"] > self.before["reconnects"]:
+            self.output.row((self.count, (self.restartTime - self.killTime) * 1000.0,
+                    s["detect"], (supervisor.recoverTime - self.restartTime) * 1000.0,
+                    s["outage"], s["attempts"] - self.before["attempts"], s["reason"]))
+            wx.CallLater(int(self.warmup * 1000), self.outage)
+        elif time.time() - self.restartTime > self.TIMEOUT:
+            self.output.row((self.count, (self.restartTime - self.killTime) * 1000.0,
+                    s["detect"], None, None, s["attempts"] - self.before["attempts"],
+                    s["reason"]))
+            wx.CallLater(int(self.warmup * 1000), self.outage)
+        else:
+            wx.CallLater(10, self.poll)
+
+    def finish(self):
+        self.stopServer()
+        self.output.end()
+        self.frame.Close()
+
+
+class SeekBenchmark(object):
+    """Random jumps in a pair of files, with and without index"""
+
+    # Give up waiting for an index or a seek after this many seconds
+    TIMEOUT = 30.0
+
+    def __init__(self, frame, left, right, seeks, warmup, output):
+        self.frame   = frame
+        self.canvas  = frame.canvas
+        self.files   = (left, right)
+        self.seeks   = seeks
+        self.warmup  = warmup
+        self.output  = output
+        # Same positions every run
+        self.random  = random.Random(1)
+        self.targets = []
+        self.latencies = { True: [], False: [] }
+
+    def start(self):
+        self.output.begin()
+        app.config.Write("sharedPipeline", "True")
+        app.config.Write("decodeWorkers", "False")
+        self.frame.setVideoStreams(self.files[0], self.files[1], "")
+        self.seeker = self.canvas.seeker
+        if self.seeker is None:
+            print("Not seekable, need two files played through decodebin",
+                  file=sys.stderr)
+            self.finish()
+            return
+        self.waitStart = time.time()
+        wx.CallLater(int(self.warmup * 1000), self.waitIndex)
+
+    def waitIndex(self):
+        if self.seeker.builders and time.time() - self.waitStart < self.TIMEOUT:
+            wx.CallLater(100, self.waitIndex)
+            return
+        if not self.seeker.indexed():
+            print("No keyframe index, only measuring plain seeks", file=sys.stderr)
+        end = self.seeker.duration()
+        if end is None:
+            print("Unknown duration, can't seek", file=sys.stderr)
+            self.finish()
+            return
+        # Each position with both methods, alternating which
+        # goes first so neither always gets a warm cache
+        for i in range(self.seeks):
+            t = self.random.uniform(0, end)
+            if i % 2 == 0:
+                self.targets += [(t, True), (t, False)]
+            else:
+                self.targets += [(t, False), (t, True)]
+        self.next()
+
+    def next(self):
+        if not self.targets:
+            self.report()
+            self.finish()
+            return
+        t, indexed = self.targets.pop(0)
+        self.seeker.useIndex = indexed
+        # Jump, as page up/down do: to a keyframe if indexed
+        self.seeker.seek(t, True)
+        self.seekStart = time.time()
+        self.poll()
+
+    def poll(self):
+        if self.seeker.pending is None:
+            self.latencies[self.seeker.lastIndexed].append(self.seeker.lastLatency * 1000.0)
+            wx.CallLater(10, self.next)
+        elif time.time() - self.seekStart > self.TIMEOUT:
+            print("Seek timed out", file=sys.stderr)
+            self.seeker.pending = None
+            self.next()
+        else:
+            wx.CallLater(1, self.poll)
+
+    def report(self):
+        indexes = [self.seeker.index(s) for s in self.seeker.streams]
+        if all(indexes):
+            indexMS = indexes[0].buildTime * 1000.0
+            cached = all(index.cached for index in indexes)
+        else:
+            indexMS = None
+            cached = None
+        for indexed, name in ((True, "index"), (False, "plain")):
+            times = sorted(self.latencies[indexed])
+            if not times:
+                continue
+            self.output.row((name, len(times), sum(times) / len(times),
+                    times[len(times) // 2], times[-1], indexMS, cached))
+
+    def finish(self):
+        self.output.end()
+        self.frame.Close()
+
+
+class TableOutput(object):
+    """Tab separated, header line first"""
+    def __init__(self, f, columns=COLUMNS):
+        self.f = f
+        self.columns = columns
+    def begin(self):
+        print("\t".join(self.columns), file=self.f)
+    def row(self, values):
+        text = []
+        for v in values:
+            if v is None:
+                text.append("-")
+            elif isinstance(v, float):
+                text.append("%.2f" % v)
+            else:
+                text.append(str(v))
+        print("\t".join(text), file=self.f)
+        self.f.flush()
+    def end(self):
+        pass
+
+class JSONOutput(TableOutput):
+    """One JSON object per line"""
+    def begin(self):
+        pass
+    def row(self, values):
+        print(json.dumps(dict(zip(self.columns, values))), file=self.f)
+        self.f.flush()
+
+
+class BenchmarkApp(wx.App):
+    def __init__(self, benchArgs):
+        self.benchArgs = benchArgs
+        wx.App.__init__(self, redirect=False)
+
+    def OnInit(self):
+        import main
+        args = self.benchArgs
+        frame = main.CameraFrame(parent=None, id=wx.ID_ANY,
+                    title="StereoCamCheck benchmark",
+                    pos=wx.DefaultPosition, size=(args.width, args.height))
+        frame.Show()
+        self.SetTopWindow(frame)
+        # Measure what can be sustained, not the default cap
+        frame.canvas.scheduler.setMaxRate(0)
+        if args.reconnect:
+            if args.json:
+                output = JSONOutput(sys.stdout, RECONNECT_COLUMNS)
+            else:
+                output = TableOutput(sys.stdout, RECONNECT_COLUMNS)
+            self.bench = ReconnectBenchmark(frame, args.rtsp_server, args.sizes[0],
+                    min(args.fps, 30), args.outages, args.down, args.warmup, output)
+            self.bench.start()
+            return True
+        if args.seek:
+            if args.json:
+                output = JSONOutput(sys.stdout, SEEK_COLUMNS)
+            else:
+                output = TableOutput(sys.stdout, SEEK_COLUMNS)
+            self.bench = SeekBenchmark(frame, args.seek[0], args.seek[1],
+                    args.seeks, args.warmup, output)
+            self.bench.start()
+            return True
+        # Mono is always a pipeline of its own, or worker
+        bayers = [name for name, menuID in BAYER_PREVIEWS if name in args.bayer]
+        configs = [(f, s, m, p, b) for f in args.formats
+                                   for s in args.sizes
+                                   for m in args.modes
+                                   for p in args.setups
+                                   for b in (bayers if f == "bayer" else [None])
+                                   if MODES[m][0] or p != "shared"]
+        if args.json:
+            output = JSONOutput(sys.stdout)
+        else:
+            output = TableOutput(sys.stdout)
+        self.bench = Benchmark(frame, configs, args.fps,
+                               args.warmup, args.seconds, output, args.cameras)
+        self.bench.start()
+        return True
+
+
+def parseSize(text):
+    w, h = text.lower().split("x")
+    return (int(w), int(h))
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description="StereoCamCheck display benchmark")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS.keys()),
+                        default=["rgb", "bgrx", "gray", "bayer"])
+    parser.add_argument("--sizes", nargs="+", type=parseSize,
+                        default=list(SIZES), help="WxH, eg 1920x1088")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES.keys()),
+                        default=["single", "split", "blended", "anaglyph",
+                                 "difference", "grid"])
+    parser.add_argument("--setups", nargs="+", choices=SETUPS,
+                        default=list(SETUPS),
+                        help="One pipeline for both eyes, one each, or decode workers")
+    parser.add_argument("--bayer", nargs="+", choices=[b[0] for b in BAYER_PREVIEWS],
+                        default=["full", "half"],
+                        help="Bayer demosaic resolution(s) to compare")
+    parser.add_argument("--cameras", type=int, default=4,
+                        help="Streams in grid mode, at least 2")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="Source frame rate")
+    parser.add_argument("--warmup", type=float, default=2.0,
+                        help="Seconds before measuring")
+    parser.add_argument("--seconds", type=float, default=5.0,
+                        help="Seconds to measure each configuration")
+    parser.add_argument("--width", type=int, default=1280, help="Window width")
+    parser.add_argument("--height", type=int, default=800, help="Window height")
+    parser.add_argument("--reconnect", action="store_true",
+                        help="Measure RTSP reconnection instead, see top of file")
+    parser.add_argument("--rtsp-server", default="test-launch",
+                        help="gst-rtsp-server test-launch program")
+    parser.add_argument("--outages", type=int, default=5,
+                        help="Times to kill the server with --reconnect")
+    parser.add_argument("--down", type=float, default=2.0,
+                        help="Seconds the server stays down")
+    parser.add_argument("--seek", nargs=2, metavar=("LEFT", "RIGHT"),
+                        help="Measure seek latency in two video files instead")
+    parser.add_argument("--seeks", type=int, default=20,
+                        help="Positions to seek to with --seek")
+    parser.add_argument("--json", action="store_true",
+                        help="JSON lines instead of tab separated table")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    TheApp = BenchmarkApp(parseArgs(sys.argv[1:]))
+    TheApp.MainLoop()
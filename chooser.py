@@ -6,6 +6,7 @@
 #       The user can/must choose:
 #       Two video sources to display. These can be pre-recorded
 #       files or RTSP streams.
+#       Optional: more cameras, space separated, shown in a grid
 #       Optional: GStreamer pipeline to be applied to each
 #       source before display. This is necessary for any source
 #       that isn't type x-raw-rgb
@@ -36,6 +37,14 @@ class SourceDialog(wx.Dialog):
         row.Add(w, 1, wx.ALIGN_LEFT | wx.EXPAND)
         vert.Add(row, 0, wx.ALIGN_LEFT | wx.EXPAND | wx.ALL, 32)
         #
+        w = wx.StaticText(self, wx.ID_ANY, _("Other cameras, space separated"))
+        vert.Add(w, 0, wx.ALIGN_CENTRE)
+        self.extra = wx.ComboBox(self, wx.ID_ANY, choices=self.getStoredList("Other cameras"))
+        idx = self.getStoredInt("Other cameras")
+        if isinstance(idx, int):
+            self.extra.SetSelection(idx)
+        vert.Add(self.extra, 0, wx.ALIGN_LEFT | wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 32)
+        #
         w = wx.StaticText(self, wx.ID_ANY, _("GStreamer pipeline"))
         vert.Add(w, 0, wx.ALIGN_CENTRE)
         previous = self.getStoredList("pipeline")
@@ -62,6 +71,10 @@ class SourceDialog(wx.Dialog):
         """Return current source values from dialog box"""
         return (self.left.GetValue(), self.right.GetValue())
     
+    def getExtraSources(self):
+        """Return list of other camera sources"""
+        return self.extra.GetValue().split()
+    
     def getGSTPipeline(self):
         """Return pipeline from dialog box"""
         return self.pipeline.GetValue()
@@ -71,6 +84,7 @@ class SourceDialog(wx.Dialog):
         leftURI, rightURI = self.getVideoSources()
         self.storeListEntry("Left eye", leftURI)
         self.storeListEntry("Right eye", rightURI)
+        self.storeListEntry("Other cameras", " ".join(self.getExtraSources()))
         pipe = self.getGSTPipeline()
         if len(pipe) > 0:
             self.storeListEntry("pipeline", pipe, len(gstvideo.defaultPipes()))
@@ -0,0 +1,89 @@
+
+// Composite shader. Samples both eyes in one pass
+// instead of drawing each with blending or color masks
+
+// Define one of:
+// #define BLEND        weighted sum of eyes
+// #define ANAGLYPH     left gray in red, right in green-blue
+// #define DIFFERENCE   absolute difference, shows misalignment
+// and optionally, each eye on its own:
+// #define DEBAYER_LEFT     left texture is in Bayer form
+// #define DEBAYER_RIGHT    right texture is in Bayer form
+// #define BINNED           with either, half resolution
+
+// DO NOT put #version here, see video_frag.glsl
+
+// With either DEBAYER, bayer_frag.glsl must come first
+
+uniform sampler2D leftImage;    // GL_TEXTURE0
+uniform sampler2D rightImage;   // GL_TEXTURE1
+uniform vec2 eyeWeights;        // Zero if eye is hidden
+
+#ifdef DEBAYER_LEFT
+uniform vec4 sourceSizeLeft;    // w, h, 1/w, 1/h
+uniform vec2 firstRedLeft;
+#endif
+#ifdef DEBAYER_RIGHT
+uniform vec4 sourceSizeRight;
+uniform vec2 firstRedRight;
+#endif
+
+varying vec2 leftCoord;
+varying vec2 rightCoord;
+
+#if defined(DEBAYER_LEFT) || defined(DEBAYER_RIGHT)
+vec4 bayerColor(sampler2D image, vec2 st, vec4 sourceSize, vec2 firstRed)
+{
+#ifdef BINNED
+    return binned(image, st, sourceSize, firstRed);
+#else
+    // Same as std_vert.glsl, but per fragment because
+    // there aren't enough varyings for two eyes
+    vec4 center = vec4(st, st * sourceSize.st + firstRed);
+    vec2 invSize = sourceSize.zw;
+    vec4 xCoord = center.x + vec4(-2.0 * invSize.x, -invSize.x,
+                                  invSize.x, 2.0 * invSize.x);
+    vec4 yCoord = center.y + vec4(-2.0 * invSize.y, -invSize.y,
+                                  invSize.y, 2.0 * invSize.y);
+    return demosaic(image, center, xCoord, yCoord);
+#endif
+}
+#endif
+
+float inside(vec2 st)
+{
+    // Eye is black outside its own box
+    return (all(greaterThanEqual(st, vec2(0.0))) &&
+            all(lessThanEqual(st, vec2(1.0)))) ? 1.0 : 0.0;
+}
+
+float gray(vec4 rgb)
+{
+    return 0.2125 * rgb.r + 0.71546 * rgb.g + 0.0721 * rgb.b;
+}
+
+void main ()
+{
+#ifdef DEBAYER_LEFT
+    vec4 left  = bayerColor(leftImage, leftCoord, sourceSizeLeft, firstRedLeft);
+#else
+    vec4 left  = texture2D(leftImage, leftCoord);
+#endif
+#ifdef DEBAYER_RIGHT
+    vec4 right = bayerColor(rightImage, rightCoord, sourceSizeRight, firstRedRight);
+#else
+    vec4 right = texture2D(rightImage, rightCoord);
+#endif
+    float wl = eyeWeights.x * inside(leftCoord);
+    float wr = eyeWeights.y * inside(rightCoord);
+
+    vec4 rgb;
+#if defined(ANAGLYPH)
+    rgb = vec4(gray(left) * wl, gray(right) * wr, gray(right) * wr, 1.0);
+#elif defined(DIFFERENCE)
+    rgb = vec4(abs(left.rgb * wl - right.rgb * wr), 1.0);
+#else
+    rgb = vec4(left.rgb * wl + right.rgb * wr, 1.0);
+#endif
+    gl_FragColor = rgb;
+}
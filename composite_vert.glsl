@@ -0,0 +1,25 @@
+
+// Composite vertex shader. One quad covering both eyes,
+// texture coords for each eye worked out from position
+
+// DO NOT put #version here, see video_frag.glsl
+
+uniform vec4 leftBox;       // x, y, w, h of eye on screen
+uniform vec4 rightBox;
+
+varying vec2 leftCoord;
+varying vec2 rightCoord;
+
+vec2 boxCoord(vec4 box)
+{
+    // Texture origin is top left as in GStreamer
+    return vec2((gl_Vertex.x - box.x) / box.z,
+                1.0 - (gl_Vertex.y - box.y) / box.w);
+}
+
+void main ()
+{
+    leftCoord  = boxCoord(leftBox);
+    rightCoord = boxCoord(rightBox);
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+}
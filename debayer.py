@@ -0,0 +1,226 @@
+
+#       CPU Bayer demosaic for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Same filter as the GPU version in bayer_frag.glsl,
+#       which is from Morgan McGuire's paper "Efficient,
+#       High-Quality Bayer Demosaic Filtering on GPUs".
+#       This one is for machines without a usable GPU and
+#       for offline analysis. Everything is done with whole
+#       array NumPy operations: there are no per-pixel loops
+#       except in the slow reference used for checking.
+
+#       Run this file directly to check the NumPy version
+#       against the shader and print a benchmark.
+
+from __future__ import division, print_function
+
+import sys, time
+
+import numpy
+
+# Location of first red pixel in the mosaic, exactly as the
+# firstRed uniform in std_vert.glsl. A pixel at column x and
+# row y (origin top left, as GStreamer) is red when both
+# x + firstRed[0] and y + firstRed[1] are even.
+# This is the RGGB ordering that works with Elphel
+ELPHEL_FIRST_RED = (1, 0)
+
+# Typical Elphel frame sizes, for benchmarking
+ELPHEL_SIZES = ((2592, 1936), (1920, 1088), (1280, 720))
+
+
+def _asBatch(frames):
+    """Return frames as N x H x W uint8 and whether input was single"""
+    frames = numpy.asarray(frames)
+    if frames.dtype != numpy.uint8:
+        raise ValueError("Bayer frames must be uint8, not " + str(frames.dtype))
+    if frames.ndim == 2:
+        return frames[numpy.newaxis], True
+    elif frames.ndim == 3:
+        return frames, False
+    else:
+        raise ValueError("Bayer frames must be H x W or N x H x W")
+
+def _tap(padded, py, px, dy, dx, h, w):
+    """Texels at offset dy, dx from every pixel of one mosaic
+       phase. padded has a two texel clamped border"""
+    y0 = 2 + py + dy
+    x0 = 2 + px + dx
+    return padded[:, y0:y0 + 2 * h - 1:2, x0:x0 + 2 * w - 1:2]
+
+def demosaic(frames, firstRed=ELPHEL_FIRST_RED):
+    """Demosaic Bayer frames, H x W or N x H x W uint8.
+       Returns RGB as H x W x 3 or N x H x W x 3 uint8"""
+    batch, single = _asBatch(frames)
+    n, H, W = batch.shape
+    out = numpy.empty((n, H, W, 3), numpy.uint8)
+    if H == 0 or W == 0:
+        return out[0] if single else out
+    # GL_CLAMP with GL_NEAREST repeats the edge texels
+    padded = numpy.pad(batch, ((0, 0), (2, 2), (2, 2)), mode="edge").astype(numpy.int16)
+    # Each of the four mosaic phases only needs some of the
+    # five filter patterns, so work on one phase at a time.
+    # Patterns are computed as 16 times the shader values
+    # so everything stays in exact integer arithmetic.
+    for py in (0, 1):
+        h = (H - py + 1) // 2
+        if h <= 0:
+            continue
+        for px in (0, 1):
+            w = (W - px + 1) // 2
+            if w <= 0:
+                continue
+            tap = lambda dy, dx: _tap(padded, py, px, dy, dx, h, w)
+            C = tap(0, 0)
+            A = tap(-2, 0) + tap(2, 0)      # Vertical, 2 away
+            B = tap(-1, 0) + tap(1, 0)      # Vertical, adjacent
+            E = tap(0, -2) + tap(0, 2)      # Horizontal, 2 away
+            F = tap(0, -1) + tap(0, 1)      # Horizontal, adjacent
+            altX = (px + firstRed[0]) % 2
+            altY = (py + firstRed[1]) % 2
+            dest = out[:, py::2, px::2]
+            if altX == altY:
+                # Red or blue pixel: cross for green, checker for other
+                D = tap(-1, -1) + tap(-1, 1) + tap(1, -1) + tap(1, 1)
+                cross   = 8 * C - 2 * A - 2 * E + 4 * B + 4 * F
+                checker = 12 * C + 4 * D - 3 * A - 3 * E
+                if altY == 0:
+                    rgb = (16 * C, cross, checker)
+                else:
+                    rgb = (checker, cross, 16 * C)
+            else:
+                # Green pixel: theta is horizontal, phi vertical
+                D = tap(-1, -1) + tap(-1, 1) + tap(1, -1) + tap(1, 1)
+                theta = 10 * C - 2 * D + A - 2 * E + 8 * F
+                phi   = 10 * C - 2 * D - 2 * A + E + 8 * B
+                if altY == 0:
+                    rgb = (theta, 16 * C, phi)
+                else:
+                    rgb = (phi, 16 * C, theta)
+            for i in range(3):
+                # Round to nearest, as float to framebuffer conversion
+                v = (rgb[i] + 8) >> 4
+                numpy.clip(v, 0, 255, out=v)
+                dest[..., i] = v
+    if single:
+        return out[0]
+    return out
+
+
+##      Checking against the GPU code
+
+
+def shaderReference(frame, firstRed=ELPHEL_FIRST_RED):
+    """Slow per-pixel transliteration of bayer_frag.glsl and
+       std_vert.glsl with exact arithmetic. Only for checking"""
+    from fractions import Fraction
+    frame = numpy.asarray(frame)
+    H, W = frame.shape
+    def fetch(x, y):
+        x = min(max(x, 0), W - 1)
+        y = min(max(y, 0), H - 1)
+        return Fraction(int(frame[y, x]), 255)
+    kC = [Fraction(k, 8) for k in (4, 6, 5, 5)]
+    kA = [Fraction(k, 8) for k in (-1, Fraction(-3, 2), Fraction(1, 2), -1)]
+    kB = [Fraction(k, 8) for k in (2, 0, 0, 4)]
+    kD = [Fraction(k, 8) for k in (0, 2, -1, -1)]
+    kE = [kA[0], kA[1], kA[3], kA[2]]
+    kF = [kB[0], kB[1], kB[3], kB[2]]
+    out = numpy.empty((H, W, 3), numpy.uint8)
+    for y in range(H):
+        for x in range(W):
+            C = fetch(x, y)
+            # Texel centre, so floor(center.zw) is this
+            alternate = ((x + firstRed[0]) % 2, (y + firstRed[1]) % 2)
+            Dvec = [fetch(x - 1, y - 1), fetch(x - 1, y + 1),
+                    fetch(x + 1, y - 1), fetch(x + 1, y + 1)]
+            PATTERN = [kC[0] * C, kC[1] * C, kC[2] * C, kC[2] * C]
+            Dvec[0] += Dvec[2]
+            Dvec[1] += Dvec[3]
+            Dvec[0] += Dvec[1]
+            value = [fetch(x, y - 2), fetch(x, y - 1),
+                     fetch(x - 2, y), fetch(x - 1, y)]
+            temp = [fetch(x, y + 2), fetch(x, y + 1),
+                    fetch(x + 2, y), fetch(x + 1, y)]
+            value = [value[i] + temp[i] for i in range(4)]
+            A, B, D, E, F = value[0], value[1], Dvec[0], value[2], value[3]
+            PATTERN[1] += kD[1] * D
+            PATTERN[2] += kD[2] * D
+            PATTERN[3] += kD[2] * D
+            kAA = [kA[0] * A, kA[1] * A, kA[2] * A]
+            kEE = [kE[0] * E, kE[1] * E, kE[3] * E]
+            PATTERN[0] += kAA[0] + kEE[0]
+            PATTERN[1] += kAA[1] + kEE[1]
+            PATTERN[2] += kAA[2] + kEE[0]
+            PATTERN[3] += kAA[0] + kEE[2]
+            PATTERN[0] += kB[0] * B
+            PATTERN[3] += kB[3] * B
+            PATTERN[0] += kF[0] * F
+            PATTERN[2] += kF[2] * F
+            if alternate[1] == 0:
+                if alternate[0] == 0:
+                    rgb = (C, PATTERN[0], PATTERN[1])
+                else:
+                    rgb = (PATTERN[2], C, PATTERN[3])
+            else:
+                if alternate[0] == 0:
+                    rgb = (PATTERN[3], C, PATTERN[2])
+                else:
+                    rgb = (PATTERN[1], PATTERN[0], C)
+            for i in range(3):
+                v = min(max(rgb[i], 0), 1) * 255
+                out[y, x, i] = int(v + Fraction(1, 2))
+    return out
+
+def checkShader(size=(37, 23), trials=4, seed=1):
+    """Compare demosaic against shader reference on random
+       frames, including odd sizes. Returns True if identical"""
+    rand = numpy.random.RandomState(seed)
+    w, h = size
+    for t in range(trials):
+        frame = rand.randint(0, 256, (h, w)).astype(numpy.uint8)
+        # Saturated frames exercise the clamping
+        if t == 1:
+            frame = numpy.where(frame > 127, 255, 0).astype(numpy.uint8)
+        for firstRed in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            expected = shaderReference(frame, firstRed)
+            actual = demosaic(frame, firstRed)
+            if not numpy.array_equal(expected, actual):
+                bad = numpy.argwhere(expected != actual)[0]
+                print("Mismatch firstRed", firstRed, "at", tuple(bad),
+                      expected[tuple(bad)], actual[tuple(bad)])
+                return False
+    # Batch must give same result as one at a time
+    batch = rand.randint(0, 256, (3, h, w)).astype(numpy.uint8)
+    result = demosaic(batch)
+    for i in range(len(batch)):
+        if not numpy.array_equal(result[i], demosaic(batch[i])):
+            print("Batch mismatch on frame", i)
+            return False
+    return True
+
+def benchmark(sizes=ELPHEL_SIZES, batch=4, repeat=3):
+    """Return list of (width, height, megapixels/sec)"""
+    rand = numpy.random.RandomState(0)
+    results = []
+    for w, h in sizes:
+        frames = rand.randint(0, 256, (batch, h, w)).astype(numpy.uint8)
+        best = None
+        for r in range(repeat):
+            t0 = time.time()
+            demosaic(frames)
+            elapsed = time.time() - t0
+            if best is None or elapsed < best:
+                best = elapsed
+        results.append((w, h, batch * w * h / 1.0e6 / max(best, 1e-9)))
+    return results
+
+
+if __name__ == "__main__":
+    ok = checkShader()
+    print("Shader check:", "OK" if ok else "FAILED")
+    for w, h, mps in benchmark():
+        print("{0:5d} x {1:4d}  {2:8.1f} Mpixel/s".format(w, h, mps))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,304 @@
+#!/usr/bin/python
+
+#       Decode worker processes for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Normally the whole source pipeline, depayloading, JPEG
+#       decoding and Bayer conversion, runs in the app process
+#       along with the wx main loop that does the texture
+#       uploads and repaints, so a burst of decoding and any
+#       Python work compete for the same CPU and the GIL. With
+#       the decodeWorkers pref on, each source pipeline instead
+#       runs in a worker process of its own (this file, run as
+#       a program) which ends in a shmsink. The decoded frames
+#       are written into a shared memory area that the worker
+#       and the app both have mapped, and the app side of the
+#       stream is just a shmsrc feeding the gltexturesink. The
+#       buffers shmsrc pushes point into the shared area, so
+#       the texture is uploaded straight from it without any
+#       copy in the app. Space in the area is reused once the
+#       sink has finished with a frame.
+#
+#       Only the frames themselves go through shared memory.
+#       shmsrc timestamps them as they arrive, by the app's
+#       clock, so they can be paired and their latency measured
+#       like frames decoded in the app. The caps go separately:
+#       the worker prints them on stdout once negotiated, and
+#       until then the app holds its shmsrc back. The caps then
+#       go on a capsfilter after the shmsrc. If the format ever
+#       changes the worker quits, and the restart gets the new
+#       caps.
+#
+#       The worker quits when stdin closes, so it never outlives
+#       the app. The app doesn't wait for that, but kills any
+#       worker that hasn't gone a little later.
+
+from __future__ import division, print_function
+
+import sys, os, tempfile, subprocess, threading, argparse, atexit
+
+import pygst
+pygst.require("0.10")
+import gst
+import gobject
+
+
+def workerPipeline(pipeline, socketPath, shmSize, sync=True):
+    """Worker pipeline string: source pipeline, with source
+       already filled in, sending frames to shared memory"""
+    return "{0} ! shmsink name=workersink socket-path={1} shm-size={2} sync={3}".format(
+            pipeline.strip(), socketPath, int(shmSize), "true" if sync else "false")
+
+def shmChain(socketPath):
+    """App side pipeline string, reading frames from worker.
+       Caps are set on the capsfilter once the worker sends them"""
+    return "shmsrc socket-path={0} is-live=true do-timestamp=true ! capsfilter".format(
+            socketPath)
+
+def removeSocket(socketPath):
+    # Left behind if a worker was killed
+    if os.path.exists(socketPath):
+        os.remove(socketPath)
+
+# Workers told to stop that may not have yet
+stopping = set()
+
+def killStopping():
+    """Don't leave hung workers behind when the app quits
+       before their timeout has run"""
+    for process in list(stopping):
+        if process.poll() is None:
+            process.terminate()
+        removeSocket(process.socketPath)
+
+atexit.register(killStopping)
+
+def processCPU(pid):
+    """CPU seconds used so far by process, all threads, or
+       None. Linux only"""
+    try:
+        f = open("/proc/%d/stat" % pid)
+        stat = f.read()
+        f.close()
+    except (IOError, OSError, TypeError):
+        return None
+    # Process name is in brackets and can contain spaces
+    fields = stat[stat.rindex(")") + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class DecodeWorker(object):
+    """App side of a worker process running one source"""
+    instCounter = 0
+
+    # How long to let a worker shut down by itself, seconds
+    STOP_TIMEOUT = 1.0
+
+    def __init__(self, source, pipeline, shmSize, sync=True):
+        DecodeWorker.instCounter += 1
+        self.source = source
+        self.pipeline = pipeline
+        self.shmSize = shmSize
+        self.sync = sync
+        # Each start has its own socket, as the last worker may
+        # still be shutting down
+        self.basePath = os.path.join(tempfile.gettempdir(),
+                "scc-decode-{0}-{1}".format(os.getpid(), DecodeWorker.instCounter))
+        self.socketPath = self.basePath
+        self.process = None
+        self.ready   = False
+        self.caps    = None
+        # shmsrc elements held back until worker is ready
+        self.waiting = []
+        # capsfilters of the current chain
+        self.filters = []
+        self.starts  = 0
+        # CPU used by earlier, stopped, processes
+        self.pastCPU = 0.0
+        # Called if the process exits by itself
+        self.onExit  = None
+        self.exitStatus = None
+
+    @property
+    def description(self):
+        """Pipeline string for the app side"""
+        return shmChain(self.socketPath)
+
+    def start(self):
+        """Start, or restart, the worker process"""
+        self.stop()
+        self.starts += 1
+        self.socketPath = "{0}-{1}".format(self.basePath, self.starts)
+        removeSocket(self.socketPath)
+        command = [sys.executable, os.path.abspath(__file__),
+                   "--socket", self.socketPath, "--shm-size", str(int(self.shmSize))]
+        if not self.sync:
+            command.append("--no-sync")
+        command += [self.source, self.pipeline]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, close_fds=True)
+        self.process.socketPath = self.socketPath
+        reader = threading.Thread(target=self.readStatus, args=(self.process,))
+        reader.daemon = True
+        reader.start()
+
+    def readStatus(self, process):
+        # Own thread, it just blocks on the worker output
+        for line in iter(process.stdout.readline, ""):
+            words = line.split(None, 1)
+            if len(words) == 2 and words[0] == "caps":
+                gobject.idle_add(self.onCaps, process, words[1].strip())
+        process.wait()
+        gobject.idle_add(self.onExited, process)
+
+    def onCaps(self, process, caps):
+        # Main loop. Might be from a worker since replaced
+        if process is self.process:
+            self.caps = gst.caps_from_string(caps)
+            for f in self.filters:
+                f.set_property("caps", self.caps)
+            self.ready = True
+            for src in self.waiting:
+                src.set_locked_state(False)
+                src.sync_state_with_parent()
+            self.waiting = []
+        return False
+
+    def onExited(self, process):
+        # Main loop. Not if stopped by us
+        stopping.discard(process)
+        if process is self.process:
+            self.exitStatus = process.returncode
+            if self.onExit:
+                self.onExit()
+        return False
+
+    def attach(self, chain):
+        """Point any shmsrc in chain, a gst.Bin, at the current
+           worker and hold it back until the worker has sent its
+           caps. Call before changing chain state"""
+        self.filters = []
+        for e in chain.recurse():
+            name = e.get_factory().get_name()
+            if name == "shmsrc":
+                e.set_property("socket-path", self.socketPath)
+                if not self.ready:
+                    e.set_locked_state(True)
+                    self.waiting.append(e)
+            elif name == "capsfilter":
+                self.filters.append(e)
+                if self.caps is not None:
+                    e.set_property("caps", self.caps)
+
+    def stop(self):
+        """Tell worker process to shut down. Doesn't wait: if it
+           is still running after STOP_TIMEOUT it is killed.
+           Stop app side pipeline first"""
+        self.ready = False
+        self.caps = None
+        self.waiting = []
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        cpu = processCPU(process.pid)
+        if cpu is not None:
+            self.pastCPU += cpu
+        # Closing stdin lets the worker clean up shared memory
+        process.stdin.close()
+        stopping.add(process)
+        gobject.timeout_add(int(self.STOP_TIMEOUT * 1000), self.kill, process)
+
+    def kill(self, process):
+        # Main loop
+        if process.poll() is None:
+            process.terminate()
+            removeSocket(process.socketPath)
+        stopping.discard(process)
+        return False
+
+    def cpu(self):
+        """CPU seconds used by worker processes for this
+           source so far, including any restarts"""
+        total = self.pastCPU
+        if self.process:
+            cpu = processCPU(self.process.pid)
+            if cpu is not None:
+                total += cpu
+        return total
+
+
+##      Worker process
+
+
+def run(source, pipeline, socketPath, shmSize, sync):
+    """Run source pipeline into shared memory until stdin
+       closes. Return exit status"""
+    gobject.threads_init()
+    loop = gobject.MainLoop()
+    status = [0]
+    try:
+        pipe = gst.parse_launch(workerPipeline(pipeline.format(source=source),
+                                               socketPath, shmSize, sync))
+    except Exception as e:
+        print("{0}: {1}".format(source, e), file=sys.stderr)
+        return 1
+
+    def onError(bus, message):
+        err, debug = message.parse_error()
+        print("{0}: {1}".format(source, err), file=sys.stderr)
+        status[0] = 1
+        loop.quit()
+
+    def onInput(fd, condition):
+        # Only ever sent EOF
+        if not os.read(fd, 1024):
+            loop.quit()
+            return False
+        return True
+
+    def onCaps(pad, pspec):
+        # Streaming thread
+        caps = pad.get_negotiated_caps()
+        if caps is None:
+            return
+        if sent[0] is None:
+            sent[0] = caps.to_string()
+            print("caps", sent[0])
+            sys.stdout.flush()
+        elif caps.to_string() != sent[0]:
+            # App has the old caps, a restart will get the new
+            print("{0}: video format changed".format(source), file=sys.stderr)
+            status[0] = 1
+            loop.quit()
+
+    bus = pipe.get_bus()
+    bus.add_signal_watch()
+    bus.connect("message::error", onError)
+    sent = [None]
+    pipe.get_by_name("workersink").get_pad("sink").connect("notify::caps", onCaps)
+    # Files reach EOS, but keep the last frame available
+    gobject.io_add_watch(sys.stdin.fileno(), gobject.IO_IN | gobject.IO_HUP, onInput)
+    # shmsink creates the socket and shared memory in READY
+    if pipe.set_state(gst.STATE_READY) == gst.STATE_CHANGE_FAILURE:
+        print("{0}: cannot create shared memory {1}".format(source, socketPath),
+              file=sys.stderr)
+        return 1
+    pipe.set_state(gst.STATE_PLAYING)
+    loop.run()
+    pipe.set_state(gst.STATE_NULL)
+    return status[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StereoCamCheck decode worker")
+    parser.add_argument("--socket", required=True, help="shmsink socket path")
+    parser.add_argument("--shm-size", type=int, default=64000000,
+                        help="Shared memory bytes")
+    parser.add_argument("--no-sync", action="store_true",
+                        help="Don't wait for the clock, for live monitor mode")
+    parser.add_argument("source")
+    parser.add_argument("pipeline", help="Pipeline string with {source}")
+    args = parser.parse_args()
+    sys.exit(run(args.source, args.pipeline, args.socket, args.shm_size,
+                 not args.no_sync))
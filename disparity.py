@@ -0,0 +1,209 @@
+#       Disparity map for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       The blended and difference views show that the eyes
+#       differ, but not by how much where. For convergence and
+#       the depth budget what matters is the horizontal
+#       parallax of everything in the scene: how far right of
+#       its left eye position each point appears in the right
+#       eye, as a percentage of image width (which is screen
+#       width when shown full screen). Zero is at the screen,
+#       positive behind it, negative in front.
+#
+#       Block matching on small greyscale frames: for every
+#       candidate parallax the absolute difference of the
+#       shifted images is summed over a square block with a
+#       box filter, all vectorized in NumPy, and each pixel
+#       takes the candidate with the lowest cost. Pixels in
+#       flat areas, or where the best match is not clearly
+#       better than some other parallax, are left out.
+#
+#       Candidates are tried from zero outwards, and if the
+#       time budget runs out the search stops where it is,
+#       so a result always turns up on time even if it only
+#       covers smaller parallaxes. The analyzer then works on
+#       smaller frames next time.
+
+from __future__ import division, print_function
+
+import time
+
+import numpy
+
+from analysis import Analyzer
+
+# Block is 2 * BLOCK_RADIUS + 1 pixels square
+BLOCK_RADIUS = 3
+# Grey level standard deviation of block worth matching
+MIN_TEXTURE = 4.0
+# Best cost must be this fraction of any other match
+UNIQUENESS = 0.85
+# Percentiles reported, as well as min and max
+PERCENTILES = (5, 50, 95)
+# Overlay transparency of matched pixels
+OVERLAY_ALPHA = 0.6
+
+
+def boxSum(img, r):
+    """Sum over (2r+1) square around each pixel. Result is
+       smaller by r on every side"""
+    k = 2 * r + 1
+    c = numpy.zeros((img.shape[0], img.shape[1] + 1), numpy.float32)
+    c[:, 1:] = numpy.cumsum(img, axis=1)
+    rows = c[:, k:] - c[:, :-k]
+    c = numpy.zeros((rows.shape[0] + 1, rows.shape[1]), numpy.float32)
+    c[1:] = numpy.cumsum(rows, axis=0)
+    return c[k:] - c[:-k]
+
+def searchOrder(maxParallax):
+    """Candidate parallaxes, nearest zero first"""
+    return sorted(range(-maxParallax, maxParallax + 1), key=lambda p: (abs(p), p))
+
+def matchCosts(left, right, maxParallax, deadline=None, r=BLOCK_RADIUS):
+    """Block matching cost volume: costs[p + maxParallax, y, x]
+       is sum of absolute differences between left block at
+       x and right block at x + p. Candidates not tried before
+       deadline (time.time) are infinite. Returns (costs,
+       largest parallax tried in both directions)"""
+    h, w = left.shape
+    n = 2 * maxParallax + 1
+    costs = numpy.empty((n, h - 2 * r, w - 2 * r), numpy.float32)
+    costs.fill(numpy.inf)
+    searched = 0
+    diff = numpy.empty((h, w), numpy.float32)
+    for p in searchOrder(maxParallax):
+        # Always try no parallax and a little either side
+        if deadline is not None and abs(p) > 1 and time.time() > deadline:
+            break
+        # Off the edge counts as a bad match
+        diff.fill(255.0)
+        if p >= 0:
+            numpy.subtract(left[:, :w - p], right[:, p:], out=diff[:, :w - p])
+        else:
+            numpy.subtract(left[:, -p:], right[:, :w + p], out=diff[:, -p:])
+        numpy.abs(diff, out=diff)
+        costs[p + maxParallax] = boxSum(diff, r)
+        # Negative first, so both directions done up to here
+        if p >= 0:
+            searched = p
+    return costs, searched
+
+def texture(img, r=BLOCK_RADIUS):
+    """Grey level standard deviation of block around each
+       pixel, same size as boxSum"""
+    n = (2 * r + 1) ** 2
+    mean = boxSum(img, r) / n
+    var = boxSum(img * img, r) / n - mean * mean
+    return numpy.sqrt(numpy.maximum(var, 0))
+
+def bestParallax(costs):
+    """Parallax with lowest cost for each pixel, sub pixel,
+       and whether it's a unique match. Parallax is relative
+       to index 0 of costs"""
+    n, h, w = costs.shape
+    best = numpy.argmin(costs, axis=0)
+    ys, xs = numpy.indices((h, w))
+    c = costs[best, ys, xs]
+    # Parabola through neighbouring costs
+    lo = numpy.maximum(best - 1, 0)
+    hi = numpy.minimum(best + 1, n - 1)
+    cm = costs[lo, ys, xs]
+    cp = costs[hi, ys, xs]
+    d = cm - 2 * c + cp
+    inside = (best > 0) & (best < n - 1) & numpy.isfinite(d) & (d > 0)
+    offset = numpy.zeros((h, w), numpy.float32)
+    numpy.divide(0.5 * (cm - cp), d, out=offset, where=inside)
+    # Next best, not counting next door. If there isn't one
+    # there's nothing to say the match is any good
+    idx = numpy.arange(n).reshape(n, 1, 1)
+    others = numpy.where(numpy.abs(idx - best) <= 1, numpy.inf, costs).min(axis=0)
+    unique = numpy.isfinite(others) & (c < UNIQUENESS * others)
+    return best + offset, unique
+
+def estimate(left, right, maxParallax, deadline=None):
+    """Parallax of right relative to left greyscale images,
+       in pixels, NaN where unknown. Same size as left.
+       Returns (parallax, largest parallax searched)"""
+    h = min(left.shape[0], right.shape[0])
+    w = min(left.shape[1], right.shape[1])
+    left = left[:h, :w]
+    right = right[:h, :w]
+    maxParallax = max(1, min(maxParallax, w // 2))
+    costs, searched = matchCosts(left, right, maxParallax, deadline)
+    parallax, valid = bestParallax(costs)
+    parallax -= maxParallax
+    valid &= texture(left) >= MIN_TEXTURE
+    # Best at the limit of the search may not be the true match
+    valid &= numpy.abs(parallax) < searched
+    r = BLOCK_RADIUS
+    result = numpy.empty((h, w), numpy.float32)
+    result.fill(numpy.nan)
+    result[r:h - r, r:w - r] = numpy.where(valid, parallax, numpy.nan)
+    return result, searched
+
+def colorMap(parallax, limit):
+    """RGBA bytes for parallax array: blue in front of
+       screen, white at it, red behind, clear if unknown"""
+    t = numpy.clip(numpy.nan_to_num(parallax) / limit, -1.0, 1.0)
+    rgba = numpy.empty(parallax.shape + (4,), numpy.uint8)
+    rgba[..., 0] = 255 * (1.0 + numpy.minimum(t, 0))
+    rgba[..., 1] = 255 * (1.0 - numpy.abs(t))
+    rgba[..., 2] = 255 * (1.0 - numpy.maximum(t, 0))
+    rgba[..., 3] = numpy.where(numpy.isnan(parallax), 0, int(255 * OVERLAY_ALPHA))
+    return rgba
+
+
+class DisparityAnalyzer(Analyzer):
+    """Background parallax map of left/right pair"""
+
+    def __init__(self, left, right, onResult=None, budget=0.03, maxRate=4.0,
+                 searchRange=5.0):
+        Analyzer.__init__(self, (left, right), onResult, budget, maxRate,
+                          minStep=2, maxStep=32, step=8)
+        # Largest parallax searched, percent of width either way
+        self.searchRange = searchRange
+        self.deadline = None
+
+    def process(self, buffers):
+        # Budget includes converting the frames
+        self.deadline = time.time() + self.budget
+        return Analyzer.process(self, buffers)
+
+    def analyze(self, images, step, buffers):
+        w = images[0].shape[1]
+        maxParallax = int(numpy.ceil(w * self.searchRange / 100.0))
+        parallax, searched = estimate(images[0], images[1], maxParallax, self.deadline)
+        # Percent of width, independent of decimation
+        percent = parallax * (100.0 / w)
+        known = percent[numpy.isfinite(percent)]
+        result = { "parallax": percent, "step": step,
+                   "searched": 100.0 * searched / w, "range": self.searchRange,
+                   "valid": 100.0 * known.size / max(1, percent.size),
+                   "min": None, "max": None, "percentiles": {} }
+        if known.size > 0:
+            result["min"] = float(known.min())
+            result["max"] = float(known.max())
+            for p, v in zip(PERCENTILES, numpy.percentile(known, PERCENTILES)):
+                result["percentiles"][p] = float(v)
+        result["overlay"] = colorMap(percent, self.searchRange)
+        return result
+
+
+def statusText(result):
+    """Short summary for status bar"""
+    if result["min"] is None:
+        text = "parallax no match"
+    else:
+        pc = result["percentiles"]
+        text = "parallax {0:+.2f}..{1:+.2f}% p{2} {3:+.2f} p{4} {5:+.2f} p{6} {7:+.2f}".format(
+                result["min"], result["max"],
+                PERCENTILES[0], pc[PERCENTILES[0]], PERCENTILES[1], pc[PERCENTILES[1]],
+                PERCENTILES[2], pc[PERCENTILES[2]])
+        text += " ({0:.0f}% px)".format(result["valid"])
+    if result["searched"] < result["range"]:
+        text += " searched {0:.1f}%".format(result["searched"])
+    text += "  {0:.1f}/{1:.0f} ms".format(result["time"], result["budget"])
+    if result["overBudget"]:
+        text += " over {0}".format(result["overBudget"])
+    return text
@@ -0,0 +1,137 @@
+#       Exposure measurement for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Luminance histogram of each eye, how much of each is
+#       clipped to black or white, and how different the two
+#       exposures are. The anaglyph view converts to grey,
+#       which hides an exposure mismatch, so this puts a
+#       number on it instead.
+#
+#       The frame is divided into horizontal bands, each with
+#       its own histogram, and the eye's histogram is the sum.
+#       Each update converts and counts only some bands of the
+#       latest frame, round robin, so the work per frame stays
+#       within the time budget whatever the frame size. How
+#       many bands depends on how long the last update took.
+
+from __future__ import division, print_function
+
+import math
+
+import numpy
+
+from analysis import Analyzer, frameToGray
+
+# Levels at or beyond these count as clipped
+CLIP_LOW  = 2
+CLIP_HIGH = 253
+# Percentages worth pointing out
+CLIP_WARN = 1.0
+MISMATCH_WARN = 10.0
+# Bins in result histograms, for drawing
+DISPLAY_BINS = 64
+
+
+def histogram(img):
+    """256 bin luminance histogram of greyscale float image"""
+    levels = numpy.clip(img, 0, 255).astype(numpy.uint8)
+    return numpy.bincount(levels.ravel(), minlength=256)
+
+def mismatch(h1, h2):
+    """Percentage of pixels that would have to change level
+       for histograms to match (total variation distance)"""
+    n1 = h1.sum()
+    n2 = h2.sum()
+    if n1 == 0 or n2 == 0:
+        return None
+    return 50.0 * float(numpy.abs(h1 / n1 - h2 / n2).sum())
+
+def meanLevel(h):
+    n = h.sum()
+    if n == 0:
+        return 0.0
+    return float((h * numpy.arange(len(h))).sum() / n)
+
+
+class ExposureAnalyzer(Analyzer):
+    """Background histogram and clipping for each stream"""
+
+    def __init__(self, streams, onResult=None, bands=8, step=4,
+                 budget=0.005, maxRate=10.0):
+        # Histograms don't need every pixel, and decimation is
+        # kept fixed so bands from different updates add up.
+        # The budget controls how many bands are done instead.
+        Analyzer.__init__(self, streams, onResult, budget, maxRate,
+                          minStep=step, maxStep=step, step=step)
+        self.nBands = bands
+        self.bandsPerRun = bands
+        self.nextBand = 0
+        self.counts = [[None] * bands for t in self.taps]
+
+    def adapt(self, over):
+        if over:
+            self.bandsPerRun = max(1, self.bandsPerRun // 2)
+        else:
+            self.bandsPerRun = min(self.nBands, self.bandsPerRun * 2)
+
+    def process(self, buffers):
+        """Convert and count only this run's bands"""
+        which = [(self.nextBand + i) % self.nBands for i in range(self.bandsPerRun)]
+        self.nextBand = (self.nextBand + self.bandsPerRun) % self.nBands
+        for eye in range(len(buffers)):
+            buf = buffers[eye]
+            for b in which:
+                band = (0.0, b / self.nBands, 1.0, 1.0 / self.nBands)
+                img = frameToGray(buf.data, buf.caps, self.step, band)
+                self.counts[eye][b] = histogram(img)
+        return self.analyze(None, self.step, buffers)
+
+    def analyze(self, images, step, buffers):
+        result = { "histograms": [], "clipLow": [], "clipHigh": [],
+                   "means": [], "complete": True,
+                   "mismatch": None, "stops": None }
+        totals = []
+        for eye in range(len(self.counts)):
+            known = [c for c in self.counts[eye] if c is not None]
+            if len(known) < self.nBands:
+                result["complete"] = False
+            if known:
+                total = numpy.sum(known, axis=0)
+            else:
+                total = numpy.zeros(256, numpy.int64)
+            totals.append(total)
+            n = max(1, total.sum())
+            result["clipLow"].append(100.0 * total[:CLIP_LOW + 1].sum() / n)
+            result["clipHigh"].append(100.0 * total[CLIP_HIGH:].sum() / n)
+            result["means"].append(meanLevel(total))
+            display = total.reshape(DISPLAY_BINS, -1).sum(axis=1)
+            result["histograms"].append(display / n)
+        if len(totals) == 2:
+            result["mismatch"] = mismatch(totals[0], totals[1])
+            l, r = result["means"]
+            if l > 0 and r > 0:
+                # Positive is left brighter
+                result["stops"] = math.log(l / r, 2)
+        return result
+
+
+def statusText(result):
+    """Short summary for status bar"""
+    names = ("L", "R")
+    parts = []
+    for eye in range(len(result["means"])):
+        text = "{0} {1:.0f}".format(names[eye], result["means"][eye])
+        if result["clipLow"][eye] >= CLIP_WARN or result["clipHigh"][eye] >= CLIP_WARN:
+            text += " clip {0:.1f}/{1:.1f}%".format(result["clipLow"][eye],
+                                                    result["clipHigh"][eye])
+        parts.append(text)
+    text = "exposure " + " ".join(parts)
+    if result["mismatch"] is not None:
+        text += "  diff {0:.0f}%".format(result["mismatch"])
+        if result["stops"] is not None and result["mismatch"] >= MISMATCH_WARN:
+            text += " {0:+.2f} EV".format(result["stops"])
+    text += "  {0:.1f}/{1:.0f} ms".format(result["time"], result["budget"])
+    if result["overBudget"]:
+        text += " over {0}".format(result["overBudget"])
+    return text
@@ -0,0 +1,158 @@
+
+#       Focus measurement for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Sharpness of each eye, so focusing can be done by
+#       numbers instead of squinting at the preview. Higher
+#       is sharper. Either the variance of the Laplacian or
+#       Tenengrad (Sobel gradient energy), both scaled by the
+#       mean brightness so an exposure difference between the
+#       eyes doesn't look like a focus difference.
+#
+#       The frame, or a region chosen by the user, is divided
+#       into tiles. Each update only measures some of them,
+#       in a thread pool, and reuses the last value for the
+#       rest. How many depends on the time budget, so the
+#       work per frame stays bounded even for big frames.
+
+from __future__ import division, print_function
+
+import collections
+from multiprocessing.pool import ThreadPool
+
+import numpy
+
+from analysis import Analyzer
+
+# Difference between eyes, percent, worth pointing out
+MISMATCH_WARN = 10.0
+
+
+def laplacianVariance(img):
+    """Variance of 4 neighbour Laplacian"""
+    lap = (img[:-2, 1:-1] + img[2:, 1:-1] + img[1:-1, :-2] + img[1:-1, 2:] -
+           4.0 * img[1:-1, 1:-1])
+    return float(lap.var())
+
+def tenengrad(img):
+    """Mean squared Sobel gradient magnitude"""
+    gx = (img[:-2, 2:] + 2.0 * img[1:-1, 2:] + img[2:, 2:] -
+          img[:-2, :-2] - 2.0 * img[1:-1, :-2] - img[2:, :-2])
+    gy = (img[2:, :-2] + 2.0 * img[2:, 1:-1] + img[2:, 2:] -
+          img[:-2, :-2] - 2.0 * img[:-2, 1:-1] - img[:-2, 2:])
+    return float((gx * gx + gy * gy).mean())
+
+METRICS = { "laplacian": laplacianVariance, "tenengrad": tenengrad }
+
+def sharpness(img, metric=laplacianVariance):
+    """Metric normalised to mean brightness of 128"""
+    if img.shape[0] < 3 or img.shape[1] < 3:
+        return float("nan")
+    mean = img.mean()
+    if mean < 1.0:
+        return 0.0
+    return metric(img * (128.0 / mean))
+
+def tiles(img, grid):
+    """Split image into grid rows x cols of tiles"""
+    rows, cols = grid
+    h, w = img.shape
+    result = []
+    for r in range(rows):
+        for c in range(cols):
+            result.append(img[r * h // rows:(r + 1) * h // rows,
+                              c * w // cols:(c + 1) * w // cols])
+    return result
+
+
+class FocusAnalyzer(Analyzer):
+    """Background sharpness measure for each stream"""
+
+    def __init__(self, streams, onResult=None, metric="laplacian",
+                 grid=(4, 4), history=150, threads=2,
+                 budget=0.03, maxRate=10.0):
+        # Decimating changes the metric, so keep it fixed.
+        # The budget controls how many tiles are done instead.
+        Analyzer.__init__(self, streams, onResult, budget, maxRate,
+                          minStep=2, maxStep=2, step=2)
+        self.metric = METRICS[metric]
+        self.grid   = grid
+        self.nTiles = grid[0] * grid[1]
+        self.tilesPerRun = self.nTiles
+        self.nextTile = 0
+        self.historyLength = history
+        self.pool   = ThreadPool(threads)
+        self.resetWanted = False
+        self.reset()
+
+    def reset(self):
+        self.scores  = [numpy.empty(self.nTiles) for t in self.taps]
+        for s in self.scores:
+            s.fill(numpy.nan)
+        self.history = [collections.deque(maxlen=self.historyLength) for t in self.taps]
+
+    def setRegion(self, region):
+        """x, y, w, h as fractions of frame, or None for all"""
+        self.region = region
+        self.resetWanted = True
+
+    def stop(self):
+        Analyzer.stop(self)
+        self.pool.close()
+
+    def adapt(self, over):
+        if over:
+            self.tilesPerRun = max(1, self.tilesPerRun // 2)
+        else:
+            self.tilesPerRun = min(self.nTiles, self.tilesPerRun * 2)
+
+    def analyze(self, images, step, buffers):
+        if self.resetWanted:
+            self.resetWanted = False
+            self.reset()
+        # Which tiles this time, round robin
+        which = [(self.nextTile + i) % self.nTiles for i in range(self.tilesPerRun)]
+        self.nextTile = (self.nextTile + self.tilesPerRun) % self.nTiles
+        jobs = []
+        for eye in range(len(images)):
+            eyeTiles = tiles(images[eye], self.grid)
+            for t in which:
+                jobs.append((eye, t, eyeTiles[t]))
+        metric = self.metric
+        values = self.pool.map(lambda job: sharpness(job[2], metric), jobs)
+        for (eye, t, tile), v in zip(jobs, values):
+            self.scores[eye][t] = v
+        result = { "scores": [], "peaks": [], "complete": True,
+                   "mismatch": None, "sharper": None }
+        for eye in range(len(images)):
+            known = self.scores[eye][~numpy.isnan(self.scores[eye])]
+            if len(known) < self.nTiles:
+                result["complete"] = False
+            if len(known) == 0:
+                score = 0.0
+            else:
+                score = float(known.mean())
+            self.history[eye].append(score)
+            result["scores"].append(score)
+            result["peaks"].append(max(self.history[eye]))
+        if len(images) == 2:
+            l, r = result["scores"]
+            if max(l, r) > 0:
+                result["mismatch"] = 100.0 * abs(l - r) / max(l, r)
+                result["sharper"] = 0 if l > r else 1
+        return result
+
+
+def statusText(result):
+    """Short summary for status bar"""
+    names = ("L", "R")
+    parts = []
+    for eye in range(len(result["scores"])):
+        parts.append("{0} {1:.0f} ({2:.0f})".format(
+                names[eye], result["scores"][eye], result["peaks"][eye]))
+    text = "focus " + " ".join(parts)
+    if result["mismatch"] is not None and result["mismatch"] >= MISMATCH_WARN:
+        text += "  {0} sharper {1:.0f}%".format(names[result["sharper"]],
+                                                result["mismatch"])
+    return text
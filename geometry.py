@@ -0,0 +1,204 @@
+
+#       Vertex buffer geometry for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Everything drawn is a handful of quads and lines, but
+#       building Python tuples for them and passing those as
+#       client arrays every paint means PyOpenGL converts them
+#       every paint too. Instead all the shapes live in one
+#       vertex buffer object, and a shape is only copied again
+#       when it changes, which is only when the layout does.
+#
+#       Run this file directly for a micro benchmark of Python
+#       time per paint, old client arrays versus VBO. Needs a
+#       display, but xvfb-run with LIBGL_ALWAYS_SOFTWARE works.
+
+from __future__ import division, print_function
+
+import ctypes
+
+import numpy
+
+import OpenGL
+from OpenGL import GL
+from OpenGL.GL import *
+
+# Each vertex is x, y, s, t
+VERTEX_FLOATS = 4
+VERTEX_BYTES  = VERTEX_FLOATS * 4
+
+
+class GeometryBuffer(object):
+    """Fixed set of named shapes in one VBO"""
+
+    def __init__(self):
+        self.shapes = {}    # name: (first vertex, count, GL mode)
+        self.total  = 0
+        self.data   = numpy.zeros((0, VERTEX_FLOATS), numpy.float32)
+        self.vbo    = None
+        self.dirty  = False
+        # Stats
+        self.updates = 0
+        self.uploads = 0
+
+    def add(self, name, mode, count):
+        """Reserve space for shape of count vertices"""
+        self.shapes[name] = (self.total, count, mode)
+        self.total += count
+        self.data = numpy.resize(self.data, (self.total, VERTEX_FLOATS))
+        self.data[self.total - count:] = 0
+        # Size has changed, will need a new buffer
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+
+    def set(self, name, verts):
+        """Replace vertices of shape. verts is a sequence of
+           (x, y) or (x, y, s, t)"""
+        first, count, mode = self.shapes[name]
+        verts = numpy.asarray(verts, numpy.float32).reshape(count, -1)
+        self.data[first:first + count, :verts.shape[1]] = verts
+        self.dirty = True
+        self.updates += 1
+
+    def setQuad(self, name, x, y, w, h, s=1.0, t=1.0):
+        """Textured rectangle as triangle strip. Texture
+           origin is top left as in GStreamer"""
+        self.set(name, ((x, y + h, 0, 0),
+                        (x, y, 0, t),
+                        (x + w, y + h, s, 0),
+                        (x + w, y, s, t)))
+
+    def begin(self):
+        """Bind buffer, copying changes to GPU, and set
+           vertex and texture coordinate arrays"""
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_DYNAMIC_DRAW)
+            self.dirty = False
+            self.uploads += 1
+        else:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if self.dirty:
+            # Tiny, so just copy the lot
+            glBufferSubData(GL_ARRAY_BUFFER, 0, self.data.nbytes, self.data)
+            self.dirty = False
+            self.uploads += 1
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(2, GL_FLOAT, VERTEX_BYTES, ctypes.c_void_p(0))
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_BYTES, ctypes.c_void_p(8))
+
+    def draw(self, name):
+        first, count, mode = self.shapes[name]
+        glDrawArrays(mode, first, count)
+
+    def end(self):
+        """Back to client arrays for anyone else"""
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+
+
+##      Micro benchmark
+
+
+def clientArrayPaint(boxes):
+    """What StereoFrame did per paint before VBOs: side
+       by side view, two textured quads and separator"""
+    glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+    for x, y, w, h in boxes:
+        verts = (
+            x, y + h,
+            x, y,
+            x + w, y + h,
+            x + w, y,
+        )
+        texCoords = (
+            0, 0,
+            0, 1.0,
+            1.0, 0,
+            1.0, 1.0,
+        )
+        glVertexPointer(2, GL_FLOAT, 0, verts)
+        glTexCoordPointer(2, GL_FLOAT, 0, texCoords)
+        glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+    glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+    glEnableClientState(GL_COLOR_ARRAY)
+    glVertexPointer(2, GL_FLOAT, 0, ((0, -0.5),(0, 0.5)))
+    glColorPointer(3, GL_FLOAT, 0, ((0, 0, 0), (0, 0, 0)))
+    glDrawArrays(GL_LINES, 0, 2)
+    glDisableClientState(GL_COLOR_ARRAY)
+
+def bufferPaint(geom):
+    """Same again from GeometryBuffer"""
+    geom.begin()
+    geom.draw("left")
+    geom.draw("right")
+    glColor3f(0, 0, 0)
+    geom.draw("separator")
+    geom.end()
+
+def timePaints(func, arg, paints):
+    """Seconds of Python time per paint. glFinish keeps
+       driver work out of the measurement as far as possible"""
+    import time
+    glFinish()
+    total = 0.0
+    for i in range(paints):
+        start = time.time()
+        func(arg)
+        total += time.time() - start
+        glFinish()
+    return total / paints
+
+def benchmark(paints=5000):
+    import wx
+    from wx.glcanvas import GLCanvas, WX_GL_RGBA, WX_GL_DOUBLEBUFFER
+
+    class BenchCanvas(GLCanvas):
+        def __init__(self, parent):
+            GLCanvas.__init__(self, parent, wx.ID_ANY,
+                              attribList=[WX_GL_RGBA, WX_GL_DOUBLEBUFFER])
+            self.done = False
+            self.Bind(wx.EVT_PAINT, self.OnPaint)
+
+        def OnPaint(self, event):
+            self.DC = wx.PaintDC(self)
+            if self.done:
+                return
+            self.done = True
+            self.SetCurrent()
+            glEnableClientState(GL_VERTEX_ARRAY)
+            boxes = ((-0.9, -0.3, 0.8, 0.6), (0.1, -0.3, 0.8, 0.6))
+            geom = GeometryBuffer()
+            geom.add("left", GL_TRIANGLE_STRIP, 4)
+            geom.add("right", GL_TRIANGLE_STRIP, 4)
+            geom.add("separator", GL_LINES, 2)
+            for name, box in zip(("left", "right"), boxes):
+                geom.setQuad(name, *box)
+            geom.set("separator", ((0, -0.5), (0, 0.5)))
+            before = timePaints(clientArrayPaint, boxes, paints)
+            after = timePaints(bufferPaint, geom, paints)
+            print("Python time per paint, {0} paints".format(paints))
+            print("  client arrays  {0:8.1f} usec".format(before * 1e6))
+            print("  vertex buffer  {0:8.1f} usec".format(after * 1e6))
+            print("  VBO uploads    {0:8d}".format(geom.uploads))
+            geom.delete()
+            wx.CallAfter(self.GetParent().Close)
+
+    app = wx.App(redirect=False)
+    frame = wx.Frame(None, wx.ID_ANY, "geometry benchmark", size=(320, 240))
+    BenchCanvas(frame)
+    frame.Show()
+    app.MainLoop()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -5,10 +5,15 @@
 
 from __future__ import division, print_function
 
+import os, time, struct, hashlib, tempfile, ctypes
 
 import OpenGL
 from OpenGL import GL
 from OpenGL.GL import *
+try:
+    from OpenGL.GL.ARB import get_program_binary as _binary
+except ImportError:
+    _binary = None
 
 _currentProgram = 0
 
@@ -54,8 +59,9 @@ def loadShaderFile(kind, fileName, cppDefs=[]):
     f.close()
     return result
 
-def newProgram(vert, frag, geom=None):
-    """Create program from shaders."""
+def newProgram(vert, frag, geom=None, retrievable=False):
+    """Create program from shaders. retrievable True if
+       glGetProgramBinary will be used afterwards"""
     if not vert and not frag and not geom:
         raise RuntimeError("newShaderProgram without any shaders!");
 
@@ -66,6 +72,9 @@ def newProgram(vert, frag, geom=None):
         glAttachShader(prog, frag)
     if geom:
         glAttachShader(prog, geom)
+    if retrievable:
+        _binary.glProgramParameteri(prog,
+                _binary.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
     # Now check they play nice with each other 
     glLinkProgram(prog)
     if not glGetProgramiv(prog, GL_LINK_STATUS):
@@ -97,3 +106,139 @@ def getUniform(program, name):
     if h < 0:
         raise RuntimeError(name + ": No such uniform in shader")
     return h
+
+
+class ProgramCache(object):
+    """Shader programs built from source files with lists
+       of #version/#define lines prepended. Each variant is
+       only compiled the first time it is asked for. If the
+       driver has GL_ARB_get_program_binary, linked programs
+       are saved in cacheDir and loaded from there next run,
+       keyed by driver and source so any change to either
+       just means compiling again."""
+    
+    def __init__(self, cacheDir=None):
+        self.programs = {}
+        self.sources  = {}
+        self.cacheDir = cacheDir
+        self.driver   = None
+        # Stats
+        self.hits     = 0
+        self.compiles = 0
+        self.diskHits = 0
+        self.compileTime = 0.0
+        self.loadTime = 0.0
+    
+    def source(self, fileName):
+        """Text of file. A tuple of file names is joined in
+           order, for shaders that use functions from others"""
+        if isinstance(fileName, tuple):
+            return "".join(self.source(f) for f in fileName)
+        if fileName not in self.sources:
+            f = open(fileName, 'r')
+            self.sources[fileName] = f.read()
+            f.close()
+        return self.sources[fileName]
+    
+    def binaryOK(self):
+        """Can save and load program binaries?"""
+        if self.cacheDir is None or _binary is None:
+            return False
+        if self.driver is None:
+            # Only ask once, context must be current
+            if _binary.glInitGetProgramBinaryARB():
+                self.driver = "\n".join(str(glGetString(e)) for e in
+                                (GL_VENDOR, GL_RENDERER, GL_VERSION))
+            else:
+                self.driver = ""
+        return self.driver != ""
+    
+    def cacheFile(self, vertFile, fragFile, vertDefs, fragDefs):
+        h = hashlib.sha1()
+        for text in ([self.driver, self.source(vertFile)] + list(vertDefs) +
+                     [self.source(fragFile)] + list(fragDefs)):
+            h.update(text.encode("utf-8"))
+            h.update(b"\0")
+        return os.path.join(self.cacheDir, h.hexdigest() + ".bin")
+    
+    def load(self, path):
+        """Program from binary file, or None"""
+        try:
+            f = open(path, "rb")
+            data = f.read()
+            f.close()
+        except (IOError, OSError):
+            return None
+        if len(data) <= 4:
+            return None
+        fmt = struct.unpack("<I", data[:4])[0]
+        blob = data[4:]
+        prog = glCreateProgram()
+        _binary.glProgramBinary(prog, fmt, blob, len(blob))
+        # Driver is allowed to refuse, eg after an update
+        if not glGetProgramiv(prog, GL_LINK_STATUS):
+            glDeleteProgram(prog)
+            return None
+        useProgram(prog)
+        return prog
+    
+    def save(self, prog, path):
+        size = glGetProgramiv(prog, _binary.GL_PROGRAM_BINARY_LENGTH)
+        if size <= 0:
+            return
+        blob = (ctypes.c_ubyte * size)()
+        length = GLsizei(0)
+        fmt = GLenum(0)
+        _binary.glGetProgramBinary(prog, size, ctypes.byref(length),
+                                   ctypes.byref(fmt), blob)
+        try:
+            if not os.path.isdir(self.cacheDir):
+                os.makedirs(self.cacheDir)
+            # Write then rename, so never a half written file
+            fd, tmp = tempfile.mkstemp(dir=self.cacheDir)
+            f = os.fdopen(fd, "wb")
+            f.write(struct.pack("<I", fmt.value))
+            f.write(ctypes.string_at(blob, length.value))
+            f.close()
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            pass
+    
+    def program(self, vertFile, fragFile, vertDefs=[], fragDefs=[], setup=None):
+        """Return program for this variant, building it if
+           necessary. setup(prog) is called once for new
+           programs, with the program current, to set uniforms"""
+        key = (vertFile, fragFile, tuple(vertDefs), tuple(fragDefs))
+        prog = self.programs.get(key)
+        if prog is not None:
+            self.hits += 1
+            return prog
+        start = time.time()
+        path = None
+        if self.binaryOK():
+            path = self.cacheFile(vertFile, fragFile, vertDefs, fragDefs)
+            prog = self.load(path)
+        if prog is not None:
+            self.diskHits += 1
+            self.loadTime += time.time() - start
+        else:
+            vert = compileShader(GL_VERTEX_SHADER, self.source(vertFile), vertDefs)
+            frag = compileShader(GL_FRAGMENT_SHADER, self.source(fragFile), fragDefs)
+            prog = newProgram(vert, frag, retrievable=path is not None)
+            if path is not None:
+                self.save(prog, path)
+            self.compiles += 1
+            self.compileTime += time.time() - start
+        if setup:
+            setup(prog)
+        self.programs[key] = prog
+        return prog
+    
+    def stats(self):
+        """Return dict of counters, times in milliseconds"""
+        return { "programs":    len(self.programs),
+                 "hits":        self.hits,
+                 "compiles":    self.compiles,
+                 "diskHits":    self.diskHits,
+                 "compileTime": self.compileTime * 1000.0,
+                 "loadTime":    self.loadTime * 1000.0 }
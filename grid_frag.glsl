@@ -0,0 +1,94 @@
+
+// Grid shader. Up to CELLS streams drawn in one pass, each
+// texture on its own unit, instead of a quad per stream
+
+// Optionally define:
+// #define DEBAYER      if any stream is Bayer
+// #define BINNED       with DEBAYER, half resolution
+
+// DO NOT put #version here, see video_frag.glsl
+
+// With DEBAYER, bayer_frag.glsl must come first
+
+#define CELLS 8
+
+// Samplers can't be indexed by a variable in GLSL 1.20
+uniform sampler2D image0;       // GL_TEXTURE0
+uniform sampler2D image1;
+uniform sampler2D image2;
+uniform sampler2D image3;
+uniform sampler2D image4;
+uniform sampler2D image5;
+uniform sampler2D image6;
+uniform sampler2D image7;
+
+uniform vec4 box[CELLS];        // x, y, w, h of stream, w 0 if unused
+
+#ifdef DEBAYER
+uniform float bayerCell[CELLS]; // 1 if Bayer, 0 if not
+uniform vec4 sourceSize[CELLS]; // w, h, 1/w, 1/h
+uniform vec2 firstRed[CELLS];
+#endif
+
+varying vec2 position;
+
+vec4 cellColor(sampler2D image, int i, vec2 st)
+{
+#ifdef DEBAYER
+    if (bayerCell[i] > 0.5) {
+#ifdef BINNED
+        return binned(image, st, sourceSize[i], firstRed[i]);
+#else
+        // As composite_frag.glsl
+        vec4 center = vec4(st, st * sourceSize[i].st + firstRed[i]);
+        vec2 invSize = sourceSize[i].zw;
+        vec4 xCoord = center.x + vec4(-2.0 * invSize.x, -invSize.x,
+                                      invSize.x, 2.0 * invSize.x);
+        vec4 yCoord = center.y + vec4(-2.0 * invSize.y, -invSize.y,
+                                      invSize.y, 2.0 * invSize.y);
+        return demosaic(image, center, xCoord, yCoord);
+#endif
+    }
+#endif
+    return texture2D(image, st);
+}
+
+void main ()
+{
+    // First box containing this pixel
+    int cell = -1;
+    vec2 st = vec2(0.0);
+    for (int i = 0; i < CELLS; i++) {
+        vec4 b = box[i];
+        if (cell < 0 && b.z > 0.0) {
+            vec2 f = (position - b.xy) / b.zw;
+            if (all(greaterThanEqual(f, vec2(0.0))) &&
+                all(lessThanEqual(f, vec2(1.0)))) {
+                cell = i;
+                // Texture origin is top left as in GStreamer
+                st = vec2(f.x, 1.0 - f.y);
+            }
+        }
+    }
+    if (cell < 0)
+        discard;
+
+    vec4 rgb;
+    if (cell == 0)
+        rgb = cellColor(image0, 0, st);
+    else if (cell == 1)
+        rgb = cellColor(image1, 1, st);
+    else if (cell == 2)
+        rgb = cellColor(image2, 2, st);
+    else if (cell == 3)
+        rgb = cellColor(image3, 3, st);
+    else if (cell == 4)
+        rgb = cellColor(image4, 4, st);
+    else if (cell == 5)
+        rgb = cellColor(image5, 5, st);
+    else if (cell == 6)
+        rgb = cellColor(image6, 6, st);
+    else
+        rgb = cellColor(image7, 7, st);
+    gl_FragColor = vec4(rgb.rgb, 1.0);
+}
@@ -0,0 +1,13 @@
+
+// Grid vertex shader. One quad covering every stream,
+// the fragment shader works out which one from position
+
+// DO NOT put #version here, see video_frag.glsl
+
+varying vec2 position;
+
+void main ()
+{
+    position = gl_Vertex.xy;
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+}
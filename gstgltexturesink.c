@@ -37,6 +37,7 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #include <gst/gst.h>
 
 #include <GL/gl.h>
+#include <GL/glext.h>
 #include <GL/glx.h>
 
 #ifdef EMBEDDED_PYTHON
@@ -57,9 +58,41 @@ enum
     PROP_WIDTH,
     PROP_HEIGHT,
     PROP_IS_BAYER,
-    PROP_STATS,
+    PROP_FRAMES,
+    PROP_DROPS,
+    PROP_UPLOADS,
+    PROP_UPLOAD_TIME,
+    PROP_UPLOAD_TIMES,
+    PROP_SINCE_LAST_FRAME,
+    PROP_USE_PBO,
+    PROP_PBO_ACTIVE,
+    PROP_DROP_POLICY,
+    PROP_QUEUE_SIZE,
+    PROP_QUEUE_DEPTH,
+    PROP_MAX_QUEUE_DEPTH,
+    PROP_PAIRED,
+    PROP_QUEUED_TIMESTAMPS,
+    PROP_TIMESTAMP,
+    PROP_TARGET_WIDTH,
+    PROP_TARGET_HEIGHT,
+    PROP_DECIMATION,
+    PROP_UPLOAD_WIDTH,
+    PROP_UPLOAD_HEIGHT,
+    PROP_UPLOAD_BYTES,
+    PROP_LATENCY,
+    PROP_LATENCIES,
 };
 
+enum
+{
+    SIGNAL_TEXTURE_UPDATED,
+    SIGNAL_FRAME_QUEUED,
+    SIGNAL_UPLOAD,
+    LAST_SIGNAL
+};
+
+static guint gltxs_signals[LAST_SIGNAL] = { 0 };
+
 static GstStaticPadTemplate sink_factory = GST_STATIC_PAD_TEMPLATE(
     "sink",
     GST_PAD_SINK,
@@ -98,6 +131,11 @@ static GstStateChangeReturn gst_gltexture_sink_change_state(
                 GstElement * element, GstStateChange transition);
 static GstFlowReturn gst_gltexture_sink_preroll(GstBaseSink * self, GstBuffer * buffer);
 static GstFlowReturn gst_gltexture_sink_render(GstBaseSink * self, GstBuffer * buffer);
+static gboolean gst_gltexture_sink_unlock(GstBaseSink * base);
+static gboolean gst_gltexture_sink_unlock_stop(GstBaseSink * base);
+static gboolean gst_gltexture_sink_event(GstBaseSink * base, GstEvent * event);
+static void gst_gltexture_sink_finalize(GObject * object);
+static gboolean gltxs_upload(GstGLTextureSink * self, gint64 timestamp);
 
 #define GLTextureSinkDescription \
           "Upload video to OpenGL texture map"
@@ -130,6 +168,7 @@ static void gst_gltexture_sink_class_init(GstGLTextureSinkClass * klass)
 
     gobject_class->set_property = gst_gltexture_sink_set_property;
     gobject_class->get_property = gst_gltexture_sink_get_property;
+    gobject_class->finalize     = gst_gltexture_sink_finalize;
 
     g_object_class_install_property(gobject_class, PROP_TEXTURE,
             g_param_spec_uint("texture", "Texture", "OpenGL Texture id",
@@ -146,11 +185,127 @@ static void gst_gltexture_sink_class_init(GstGLTextureSinkClass * klass)
     g_object_class_install_property(gobject_class, PROP_IS_BAYER,
             g_param_spec_boolean("is_bayer", "Is Bayer", "Source data is Bayer",
             FALSE, G_PARAM_READABLE));
+    /* Statistics, all read only */
+    g_object_class_install_property(gobject_class, PROP_FRAMES,
+            g_param_spec_uint("frames", "Frames", "Frames received",
+            0, UINT_MAX, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_DROPS,
+            g_param_spec_uint("drops", "Drops", "Frames replaced before upload",
+            0, UINT_MAX, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_UPLOADS,
+            g_param_spec_uint("uploads", "Uploads", "Frames uploaded to texture",
+            0, UINT_MAX, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_UPLOAD_TIME,
+            g_param_spec_uint("upload_time", "Upload time",
+            "Duration of last upload, microseconds",
+            0, UINT_MAX, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_UPLOAD_TIMES,
+            g_param_spec_value_array("upload_times", "Upload times",
+            "Most recent upload durations, microseconds, oldest first",
+            g_param_spec_uint("upload_time", "Upload time", "Microseconds",
+                0, UINT_MAX, 0, G_PARAM_READABLE),
+            G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_SINCE_LAST_FRAME,
+            g_param_spec_int64("since_last_frame", "Since last frame",
+            "Microseconds since last frame received, -1 if none yet",
+            -1, G_MAXINT64, -1, G_PARAM_READABLE));
+    
+    g_object_class_install_property(gobject_class, PROP_USE_PBO,
+            g_param_spec_boolean("use_pbo", "Use PBO",
+            "Upload through double buffered pixel buffer objects",
+            FALSE, G_PARAM_READWRITE));
+    g_object_class_install_property(gobject_class, PROP_PBO_ACTIVE,
+            g_param_spec_boolean("pbo_active", "PBO active",
+            "Pixel buffer objects actually in use",
+            FALSE, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_DROP_POLICY,
+            g_param_spec_uint("drop_policy", "Drop policy",
+            "0 keep latest frame only, 1 FIFO dropping oldest, 2 block upstream",
+            GLTXS_DROP_LATEST, GLTXS_DROP_BLOCK, GLTXS_DROP_LATEST, G_PARAM_READWRITE));
+    g_object_class_install_property(gobject_class, PROP_QUEUE_SIZE,
+            g_param_spec_uint("queue_size", "Queue size",
+            "Frames waiting for upload, FIFO and block policies only",
+            1, GLTXS_MAX_QUEUE, 1, G_PARAM_READWRITE));
+    g_object_class_install_property(gobject_class, PROP_QUEUE_DEPTH,
+            g_param_spec_uint("queue_depth", "Queue depth",
+            "Frames currently waiting for upload",
+            0, GLTXS_MAX_QUEUE, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_MAX_QUEUE_DEPTH,
+            g_param_spec_uint("max_queue_depth", "Max queue depth",
+            "Most frames ever waiting for upload",
+            0, GLTXS_MAX_QUEUE, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_PAIRED,
+            g_param_spec_boolean("paired", "Paired",
+            "Frames are only uploaded when app asks, with upload action",
+            FALSE, G_PARAM_READWRITE));
+    g_object_class_install_property(gobject_class, PROP_QUEUED_TIMESTAMPS,
+            g_param_spec_value_array("queued_timestamps", "Queued timestamps",
+            "Clock times of frames waiting for upload, microseconds, oldest first",
+            g_param_spec_int64("timestamp", "Timestamp", "Microseconds",
+                -1, G_MAXINT64, -1, G_PARAM_READABLE),
+            G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_TIMESTAMP,
+            g_param_spec_int64("timestamp", "Timestamp",
+            "Clock time of frame in texture, microseconds, -1 if none",
+            -1, G_MAXINT64, -1, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_TARGET_WIDTH,
+            g_param_spec_uint("target_width", "Target width",
+            "Display width in pixels, 0 for full size upload",
+            0, G_MAXINT, 0, G_PARAM_READWRITE));
+    g_object_class_install_property(gobject_class, PROP_TARGET_HEIGHT,
+            g_param_spec_uint("target_height", "Target height",
+            "Display height in pixels, 0 for full size upload",
+            0, G_MAXINT, 0, G_PARAM_READWRITE));
+    g_object_class_install_property(gobject_class, PROP_DECIMATION,
+            g_param_spec_uint("decimation", "Decimation",
+            "Upload every Nth pixel (Bayer quad) and row",
+            1, GLTXS_MAX_DECIMATION, 1, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_UPLOAD_WIDTH,
+            g_param_spec_uint("upload_width", "Upload width",
+            "Width of texture data after decimation",
+            0, G_MAXINT, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_UPLOAD_HEIGHT,
+            g_param_spec_uint("upload_height", "Upload height",
+            "Height of texture data after decimation",
+            0, G_MAXINT, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_UPLOAD_BYTES,
+            g_param_spec_uint64("upload_bytes", "Upload bytes",
+            "Total bytes uploaded to texture",
+            0, G_MAXUINT64, 0, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_LATENCY,
+            g_param_spec_int64("latency", "Latency",
+            "Frame clock time to upload, microseconds, -1 if unknown",
+            -1, G_MAXINT64, -1, G_PARAM_READABLE));
+    g_object_class_install_property(gobject_class, PROP_LATENCIES,
+            g_param_spec_value_array("latencies", "Latencies",
+            "Array of recent latencies, microseconds, oldest first",
+            g_param_spec_int64("latency", "Latency", "Microseconds",
+                -1, G_MAXINT64, -1, G_PARAM_READABLE),
+            G_PARAM_READABLE));
+    
+    /* Emitted from the main loop after each upload, so the
+       app only needs to redraw when there is something new */
+    gltxs_signals[SIGNAL_TEXTURE_UPDATED] = g_signal_new("texture-updated",
+            G_TYPE_FROM_CLASS(klass), G_SIGNAL_RUN_LAST, 0,
+            NULL, NULL, g_cclosure_marshal_VOID__VOID, G_TYPE_NONE, 0);
+    /* Paired mode: frames are waiting, app decides which */
+    gltxs_signals[SIGNAL_FRAME_QUEUED] = g_signal_new("frame-queued",
+            G_TYPE_FROM_CLASS(klass), G_SIGNAL_RUN_LAST, 0,
+            NULL, NULL, g_cclosure_marshal_VOID__VOID, G_TYPE_NONE, 0);
+    gltxs_signals[SIGNAL_UPLOAD] = g_signal_new("upload",
+            G_TYPE_FROM_CLASS(klass), G_SIGNAL_RUN_LAST | G_SIGNAL_ACTION,
+            G_STRUCT_OFFSET(GstGLTextureSinkClass, upload),
+            NULL, NULL, g_cclosure_marshal_generic,
+            G_TYPE_BOOLEAN, 1, G_TYPE_INT64);
+    klass->upload = gltxs_upload;
     
     gstelement_class->change_state = GST_DEBUG_FUNCPTR(gst_gltexture_sink_change_state);
     gstbasesink_class->preroll   = GST_DEBUG_FUNCPTR(gst_gltexture_sink_preroll);
     gstbasesink_class->render    = GST_DEBUG_FUNCPTR(gst_gltexture_sink_render);
     gstbasesink_class->get_times = GST_DEBUG_FUNCPTR(gst_gltexture_sink_get_times);
+    gstbasesink_class->unlock    = GST_DEBUG_FUNCPTR(gst_gltexture_sink_unlock);
+    gstbasesink_class->unlock_stop = GST_DEBUG_FUNCPTR(gst_gltexture_sink_unlock_stop);
+    gstbasesink_class->event     = GST_DEBUG_FUNCPTR(gst_gltexture_sink_event);
     
     klass->instances = 0;
 }
@@ -160,7 +315,6 @@ static void gst_gltexture_sink_init(GstGLTextureSink * self,
 {
     GstPad * pad;
     
-    printf("gst_gltexture_sink_init\n");
     pad = GST_BASE_SINK_PAD(self);
     gst_pad_set_setcaps_function(pad, gst_gltexture_sink_setcaps);
     
@@ -176,13 +330,43 @@ static void gst_gltexture_sink_init(GstGLTextureSink * self,
     self->srcFormat = 0;
     self->texW      = 0;
     self->texH      = 0;
+    self->target_width  = 0;
+    self->target_height = 0;
+    self->decimation = 1;
+    self->upW       = 0;
+    self->upH       = 0;
+    self->scratch   = NULL;
+    self->scratchSize = 0;
     
-    self->currentFrame = NULL;
+    self->drop_policy  = GLTXS_DROP_LATEST;
+    self->queue_size   = 1;
+    self->queueHead    = 0;
+    self->queueCount   = 0;
+    self->maxQueueDepth = 0;
+    self->lock         = g_mutex_new();
+    self->space        = g_cond_new();
+    self->unlocked     = FALSE;
     self->callbackTag  = 0;
+    self->paired       = FALSE;
+    self->frameTime    = -1;
+    
+    self->use_pbo   = FALSE;
+    self->pbo[0]    = 0;
+    self->pbo[1]    = 0;
+    self->pboNext   = 0;
+    self->pboPending = FALSE;
+    self->pboPrimed = FALSE;
+    self->pboFrameTime = -1;
+    self->eos       = FALSE;
     
-    self->stats  = 1;
     self->frames = 0;
     self->drops  = 0;
+    self->uploads = 0;
+    self->lastFrameTime = 0;
+    self->uploadNext = 0;
+    self->uploadBytes = 0;
+    memset(self->uploadTimes, 0, sizeof(self->uploadTimes));
+    memset(self->latencies, 0, sizeof(self->latencies));
     
     gclass->instances += 1;
     self->instance = gclass->instances;
@@ -225,6 +409,97 @@ static void gltxs_saveCurrentContext(GstGLTextureSink * self)
     self->xDraw   = glXGetCurrentDrawable();
 }
 
+/*  Upload times and latencies are kept in a small ring buffer,
+    and are only recorded. All summarizing is done by whoever
+    reads the properties, so nothing extra happens per frame */
+
+static gint64 gltxs_clockNow(GstGLTextureSink * self);
+
+static void gltxs_recordUpload(GstGLTextureSink * self, gint64 start)
+{
+    gint64  now;
+    guint   i;
+    
+    i = self->uploadNext % GLTXS_UPLOAD_HISTORY;
+    self->uploadTimes[i] = (guint)(g_get_monotonic_time() - start);
+    /* How old the frame just uploaded is */
+    now = gltxs_clockNow(self);
+    if (now >= 0 && self->frameTime >= 0)
+        self->latencies[i] = now - self->frameTime;
+    else
+        self->latencies[i] = -1;
+    self->uploadNext += 1;
+    self->uploads += 1;
+}
+
+static guint gltxs_lastUploadTime(GstGLTextureSink * self)
+{
+    if (self->uploadNext == 0)
+        return 0;
+    return self->uploadTimes[(self->uploadNext - 1) % GLTXS_UPLOAD_HISTORY];
+}
+
+static gint64 gltxs_lastLatency(GstGLTextureSink * self)
+{
+    if (self->uploadNext == 0)
+        return -1;
+    return self->latencies[(self->uploadNext - 1) % GLTXS_UPLOAD_HISTORY];
+}
+
+static GValueArray * gltxs_latencies(GstGLTextureSink * self)
+{
+    GValueArray *   result;
+    GValue          v = { 0 };
+    guint           i, n, first;
+    
+    n = MIN(self->uploadNext, GLTXS_UPLOAD_HISTORY);
+    first = self->uploadNext - n;
+    result = g_value_array_new(n);
+    g_value_init(&v, G_TYPE_INT64);
+    for (i = 0; i < n; i++) {
+        g_value_set_int64(&v, self->latencies[(first + i) % GLTXS_UPLOAD_HISTORY]);
+        g_value_array_append(result, &v);
+    }
+    g_value_unset(&v);
+    return result;
+}
+
+static GValueArray * gltxs_uploadTimes(GstGLTextureSink * self)
+{
+    GValueArray *   result;
+    GValue          v = { 0 };
+    guint           i, n, first;
+    
+    n = MIN(self->uploadNext, GLTXS_UPLOAD_HISTORY);
+    first = self->uploadNext - n;
+    result = g_value_array_new(n);
+    g_value_init(&v, G_TYPE_UINT);
+    for (i = 0; i < n; i++) {
+        g_value_set_uint(&v, self->uploadTimes[(first + i) % GLTXS_UPLOAD_HISTORY]);
+        g_value_array_append(result, &v);
+    }
+    g_value_unset(&v);
+    return result;
+}
+
+static GValueArray * gltxs_queuedTimes(GstGLTextureSink * self)
+{
+    GValueArray *   result;
+    GValue          v = { 0 };
+    guint           i;
+    
+    g_mutex_lock(self->lock);
+    result = g_value_array_new(self->queueCount);
+    g_value_init(&v, G_TYPE_INT64);
+    for (i = 0; i < self->queueCount; i++) {
+        g_value_set_int64(&v, self->queueTimes[(self->queueHead + i) % GLTXS_MAX_QUEUE]);
+        g_value_array_append(result, &v);
+    }
+    g_mutex_unlock(self->lock);
+    g_value_unset(&v);
+    return result;
+}
+
 static void gst_gltexture_sink_set_property(GObject * object, guint prop_id,
                     const GValue * value, GParamSpec * pspec)
 {
@@ -238,8 +513,34 @@ static void gst_gltexture_sink_set_property(GObject * object, guint prop_id,
         case PROP_TEXTURE_FORMAT:
             self->texture_format = g_value_get_uint(value);
             break;
-        case PROP_STATS:
-            self->stats = g_value_get_uint(value);
+        case PROP_USE_PBO:
+            /* Takes effect when texture is next initialized */
+            self->use_pbo = g_value_get_boolean(value);
+            break;
+        case PROP_DROP_POLICY:
+            g_mutex_lock(self->lock);
+            self->drop_policy = g_value_get_uint(value);
+            g_cond_broadcast(self->space);
+            g_mutex_unlock(self->lock);
+            break;
+        case PROP_QUEUE_SIZE:
+            g_mutex_lock(self->lock);
+            self->queue_size = g_value_get_uint(value);
+            g_cond_broadcast(self->space);
+            g_mutex_unlock(self->lock);
+            break;
+        case PROP_PAIRED:
+            g_mutex_lock(self->lock);
+            self->paired = g_value_get_boolean(value);
+            g_cond_broadcast(self->space);
+            g_mutex_unlock(self->lock);
+            break;
+        case PROP_TARGET_WIDTH:
+            /* Takes effect on next upload */
+            self->target_width = g_value_get_uint(value);
+            break;
+        case PROP_TARGET_HEIGHT:
+            self->target_height = g_value_get_uint(value);
             break;
         default:
             G_OBJECT_WARN_INVALID_PROPERTY_ID(object, prop_id, pspec);
@@ -268,8 +569,78 @@ static void gst_gltexture_sink_get_property(GObject * object, guint prop_id,
         case PROP_IS_BAYER:
             g_value_set_boolean(value, self->is_bayer);
             break;
-        case PROP_STATS:
-            g_value_set_uint(value, self->stats);
+        case PROP_FRAMES:
+            g_value_set_uint(value, self->frames);
+            break;
+        case PROP_DROPS:
+            g_value_set_uint(value, self->drops);
+            break;
+        case PROP_UPLOADS:
+            g_value_set_uint(value, self->uploads);
+            break;
+        case PROP_UPLOAD_TIME:
+            g_value_set_uint(value, gltxs_lastUploadTime(self));
+            break;
+        case PROP_UPLOAD_TIMES:
+            g_value_take_boxed(value, gltxs_uploadTimes(self));
+            break;
+        case PROP_SINCE_LAST_FRAME:
+            if (self->lastFrameTime == 0)
+                g_value_set_int64(value, -1);
+            else
+                g_value_set_int64(value, g_get_monotonic_time() - self->lastFrameTime);
+            break;
+        case PROP_USE_PBO:
+            g_value_set_boolean(value, self->use_pbo);
+            break;
+        case PROP_PBO_ACTIVE:
+            g_value_set_boolean(value, self->pbo[0] != 0);
+            break;
+        case PROP_DROP_POLICY:
+            g_value_set_uint(value, self->drop_policy);
+            break;
+        case PROP_QUEUE_SIZE:
+            g_value_set_uint(value, self->queue_size);
+            break;
+        case PROP_QUEUE_DEPTH:
+            g_value_set_uint(value, self->queueCount);
+            break;
+        case PROP_MAX_QUEUE_DEPTH:
+            g_value_set_uint(value, self->maxQueueDepth);
+            break;
+        case PROP_PAIRED:
+            g_value_set_boolean(value, self->paired);
+            break;
+        case PROP_QUEUED_TIMESTAMPS:
+            g_value_take_boxed(value, gltxs_queuedTimes(self));
+            break;
+        case PROP_TIMESTAMP:
+            g_value_set_int64(value, self->frameTime);
+            break;
+        case PROP_TARGET_WIDTH:
+            g_value_set_uint(value, self->target_width);
+            break;
+        case PROP_TARGET_HEIGHT:
+            g_value_set_uint(value, self->target_height);
+            break;
+        case PROP_DECIMATION:
+            g_value_set_uint(value, self->decimation);
+            break;
+        case PROP_UPLOAD_WIDTH:
+            g_value_set_uint(value, self->upW);
+            break;
+        case PROP_UPLOAD_HEIGHT:
+            g_value_set_uint(value, self->upH);
+            break;
+        case PROP_UPLOAD_BYTES:
+            g_value_set_uint64(value, self->uploadBytes);
+            break;
+        case PROP_LATENCY:
+            g_value_set_int64(value, gltxs_lastLatency(self));
+            break;
+        case PROP_LATENCIES:
+            g_value_take_boxed(value, gltxs_latencies(self));
+            break;
         default:
             G_OBJECT_WARN_INVALID_PROPERTY_ID(object, prop_id, pspec);
             break;
@@ -315,40 +686,487 @@ static GLint gltxs_GstFormatToGL (GstCaps * caps)
     
     My solution is for the preroll/render to save the buffer contents
     and use g_idle_add for for a one-shot callback to actually do
-    something. There's a possibility that a frame will get overwritten
-    before the idle callback executes, but I don't think it's worth
-    worrying about, it's equivalent to dropping frames under load */
+    something. Frames wait in a small queue until then, and what
+    happens when the queue is full depends on drop_policy:
+    
+    LATEST  Only ever keep the newest frame. Lowest latency, and
+            equivalent to dropping frames under load.
+    FIFO    Keep up to queue_size frames, dropping the oldest.
+    BLOCK   Keep up to queue_size frames, and make the streaming
+            thread wait for space. Nothing is ever dropped, so
+            upstream will slow down instead.
+    
+    For FIFO and BLOCK the upload callback takes only one frame at a
+    time, at a lower priority than window redraws, so every frame
+    gets a chance to be drawn. The lock protects the queue and the
+    callback tag, which are used by both threads
+    
+    In paired mode the callback doesn't upload anything, it just
+    tells the app there are frames waiting. The app picks one with
+    the upload action, usually matching timestamps with another
+    sink. The queue then works like FIFO (or BLOCK) regardless.
+    With LATEST the upload action throws away anything older than
+    the frame picked. With FIFO or BLOCK it only ever takes the
+    oldest frame, so nothing is lost, and if more are waiting the
+    app is told again once the window has had a chance to redraw. */
 
-static void gltxs_saveBuffer(GstGLTextureSink * self, GstBuffer * buf, int w, int h)
+static GstBuffer * gltxs_popFrame(GstGLTextureSink * self)
+{
+    GstBuffer * buf;
+    
+    /* Lock must be held */
+    if (self->queueCount == 0)
+        return NULL;
+    buf = self->queue[self->queueHead];
+    self->queue[self->queueHead] = NULL;
+    self->queueHead = (self->queueHead + 1) % GLTXS_MAX_QUEUE;
+    self->queueCount -= 1;
+    g_cond_signal(self->space);
+    return buf;
+}
+
+static void gltxs_flushQueue(GstGLTextureSink * self)
+{
+    GstBuffer * buf;
+    
+    g_mutex_lock(self->lock);
+    while ((buf = gltxs_popFrame(self)) != NULL)
+        gst_buffer_unref(buf);
+    g_mutex_unlock(self->lock);
+}
+
+static guint gltxs_queueLimit(GstGLTextureSink * self)
+{
+    if (self->drop_policy == GLTXS_DROP_LATEST && ! self->paired)
+        return 1;
+    return self->queue_size;
+}
+
+static gint64 gltxs_clockNow(GstGLTextureSink * self)
+{
+    GstClock *  clock;
+    gint64      result;
+    
+    /* Pipeline clock, microseconds, -1 if none yet */
+    result = -1;
+    clock = gst_element_get_clock(GST_ELEMENT(self));
+    if (clock != NULL) {
+        result = (gint64)(gst_clock_get_time(clock) / GST_USECOND);
+        gst_object_unref(clock);
+    }
+    return result;
+}
+
+static gint64 gltxs_clockTime(GstGLTextureSink * self, GstBuffer * buf)
+{
+    GstBaseSink *   base;
+    GstClockTime    ts, running;
+    
+    /* When buffer should be shown by the pipeline clock. For live
+       sources that's near enough when it was captured */
+    base = GST_BASE_SINK(self);
+    ts = GST_BUFFER_TIMESTAMP(buf);
+    if (GST_CLOCK_TIME_IS_VALID(ts)) {
+        running = gst_segment_to_running_time(&base->segment, GST_FORMAT_TIME, ts);
+        if (GST_CLOCK_TIME_IS_VALID(running))
+            return (gint64)((gst_element_get_base_time(GST_ELEMENT(self)) + running)
+                            / GST_USECOND);
+    }
+    /* No timestamp, use arrival time */
+    return gltxs_clockNow(self);
+}
+
+static GstFlowReturn gltxs_saveBuffer(GstGLTextureSink * self, GstBuffer * buf, int w, int h)
 {
     GstBuffer * prev;
+    int         tail;
     
-    printf("gltxs_saveBuffer\n");
-    prev = self->currentFrame;
-    gst_buffer_ref(buf);
-    self->currentFrame = buf;
-    self->fw = w;
-    self->fh = h;
+    /* Lock must be held */
+    self->eos = FALSE;
     self->frames += 1;
-    if (prev) {
-        /* We're decoding faster than window updating? */
-        /* g_debug("GLTextureSink: decode overrun detected"); */
+    self->lastFrameTime = g_get_monotonic_time();
+    if (self->drop_policy == GLTXS_DROP_BLOCK) {
+        while (self->queueCount >= gltxs_queueLimit(self) && ! self->unlocked)
+            g_cond_wait(self->space, self->lock);
+        if (self->unlocked)
+            return GST_FLOW_WRONG_STATE;
+    }
+    while (self->queueCount >= gltxs_queueLimit(self)) {
+        /* We're decoding faster than window updating */
+        prev = gltxs_popFrame(self);
         gst_buffer_unref(prev);
         self->drops += 1;
     }
-    /* Debugging info */
-    if (self->stats && (self->frames % 24) == 0) {
-        printf("gltxs #%d frames %d dropped %d\n",
-            self->instance, self->frames, self->drops);
+    tail = (self->queueHead + self->queueCount) % GLTXS_MAX_QUEUE;
+    self->queue[tail] = gst_buffer_ref(buf);
+    self->queueTimes[tail] = gltxs_clockTime(self, buf);
+    self->queueCount += 1;
+    if (self->queueCount > self->maxQueueDepth)
+        self->maxQueueDepth = self->queueCount;
+    self->fw = w;
+    self->fh = h;
+    return GST_FLOW_OK;
+}
+
+static GstBuffer * gltxs_nextFrame(GstGLTextureSink * self)
+{
+    GstBuffer * buf;
+    
+    g_mutex_lock(self->lock);
+    if (self->queueCount > 0)
+        self->frameTime = self->queueTimes[self->queueHead];
+    buf = gltxs_popFrame(self);
+    g_mutex_unlock(self->lock);
+    return buf;
+}
+
+static gboolean gltxs_updateTexture(GstGLTextureSink * self);
+
+static void gltxs_scheduleUpdate(GstGLTextureSink * self)
+{
+    /* Lock must be held. After EOS the last frame may still
+       be waiting in a PBO, so that counts as something to do */
+    if (self->callbackTag != 0)
+        return;
+    if (self->queueCount == 0 && ! (self->eos && self->pboPending))
+        return;
+    if (self->drop_policy == GLTXS_DROP_LATEST && ! self->paired)
+        self->callbackTag = g_idle_add_full(G_PRIORITY_HIGH_IDLE,
+                            (GSourceFunc)gltxs_updateTexture, self, NULL);
+    else
+        /* Lower priority than redraw, so each frame can be seen */
+        self->callbackTag = g_idle_add_full(G_PRIORITY_DEFAULT_IDLE,
+                            (GSourceFunc)gltxs_updateTexture, self, NULL);
+}
+
+static void gltxs_uploadDone(GstGLTextureSink * self)
+{
+    /* End of idle callback: more frames may be waiting */
+    g_mutex_lock(self->lock);
+    self->callbackTag = 0;
+    gltxs_scheduleUpdate(self);
+    g_mutex_unlock(self->lock);
+    g_signal_emit(self, gltxs_signals[SIGNAL_TEXTURE_UPDATED], 0);
+}
+
+/*  Pixel buffer object upload. Copying the frame into a PBO is
+    just a memcpy into driver memory, and glTexSubImage2D from a
+    PBO returns straight away with the DMA done asynchronously.
+    Two PBOs are used as a pipeline: each upload first starts the
+    transfer to the texture from the PBO filled last time, then
+    copies the new frame into the other one while that transfer
+    runs. The texture is therefore one frame behind. The first
+    frame after (re)initializing goes straight through, and at
+    EOS the frame still waiting in a PBO is flushed, so a paused
+    or finished stream shows its last frame. The buffer functions
+    are GL 1.5 so have to be looked up at run time. */
+
+static PFNGLGENBUFFERSPROC      gltxs_glGenBuffers    = NULL;
+static PFNGLDELETEBUFFERSPROC   gltxs_glDeleteBuffers = NULL;
+static PFNGLBINDBUFFERPROC      gltxs_glBindBuffer    = NULL;
+static PFNGLBUFFERDATAPROC      gltxs_glBufferData    = NULL;
+static PFNGLMAPBUFFERPROC       gltxs_glMapBuffer     = NULL;
+static PFNGLUNMAPBUFFERPROC     gltxs_glUnmapBuffer   = NULL;
+
+static void * gltxs_getProc(const char * name)
+{
+    char    arbName[64];
+    void *  proc;
+    
+    proc = (void *)glXGetProcAddressARB((const GLubyte *)name);
+    if (proc == NULL) {
+        snprintf(arbName, sizeof(arbName), "%sARB", name);
+        proc = (void *)glXGetProcAddressARB((const GLubyte *)arbName);
+    }
+    return proc;
+}
+
+static gboolean gltxs_loadBufferProcs(void)
+{
+    if (gltxs_glGenBuffers != NULL)
+        return TRUE;
+    gltxs_glDeleteBuffers = (PFNGLDELETEBUFFERSPROC)gltxs_getProc("glDeleteBuffers");
+    gltxs_glBindBuffer    = (PFNGLBINDBUFFERPROC)gltxs_getProc("glBindBuffer");
+    gltxs_glBufferData    = (PFNGLBUFFERDATAPROC)gltxs_getProc("glBufferData");
+    gltxs_glMapBuffer     = (PFNGLMAPBUFFERPROC)gltxs_getProc("glMapBuffer");
+    gltxs_glUnmapBuffer   = (PFNGLUNMAPBUFFERPROC)gltxs_getProc("glUnmapBuffer");
+    if (gltxs_glDeleteBuffers && gltxs_glBindBuffer && gltxs_glBufferData &&
+            gltxs_glMapBuffer && gltxs_glUnmapBuffer) {
+        /* Set last, it's the flag for all loaded */
+        gltxs_glGenBuffers = (PFNGLGENBUFFERSPROC)gltxs_getProc("glGenBuffers");
+    }
+    return gltxs_glGenBuffers != NULL;
+}
+
+static void gltxs_initPBO(GstGLTextureSink * self)
+{
+    /* Context must be current. Leaves PBOs zero if not wanted
+       or not available, which means use direct upload */
+    if (self->pbo[0] != 0) {
+        gltxs_glDeleteBuffers(2, self->pbo);
+        self->pbo[0] = self->pbo[1] = 0;
+    }
+    if (! self->use_pbo)
+        return;
+    if (! strstr((char *)glGetString(GL_EXTENSIONS), "GL_ARB_pixel_buffer_object")
+            || ! gltxs_loadBufferProcs()) {
+        g_warning("GLTextureSink: No pixel buffer objects, using direct upload");
+        return;
+    }
+    gltxs_glGenBuffers(2, self->pbo);
+    self->pboNext = 0;
+    self->pboPending = FALSE;
+    self->pboPrimed = FALSE;
+}
+
+/*  Decimation. When the video is shown at 1/2, 1/3, etc of its
+    size, GL_NEAREST sampling throws away most of the texels, so
+    there is no point uploading them. Instead only every Nth pixel
+    of every Nth row is copied, as part of the copy that has to be
+    done anyway into the PBO (or a scratch buffer if no PBOs.) For
+    Bayer it's every Nth 2x2 quad, so the texture is still a valid
+    Bayer mosaic with the same first red for the shader. */
+
+static int gltxs_pixelBytes(GstGLTextureSink * self)
+{
+    switch (self->srcFormat) {
+        case GL_LUMINANCE:
+            return 1;
+        case GL_RGB:
+        case GL_BGR:
+            return 3;
+        default:
+            return 4;
     }
 }
 
+static guint gltxs_wantedDecimation(GstGLTextureSink * self)
+{
+    guint   n;
+    
+    if (self->target_width == 0 || self->target_height == 0)
+        return 1;
+    n = MIN(self->width / self->target_width, self->height / self->target_height);
+    return CLAMP(n, 1, GLTXS_MAX_DECIMATION);
+}
+
+static void gltxs_setUploadSize(GstGLTextureSink * self)
+{
+    int     n;
+    
+    self->decimation = gltxs_wantedDecimation(self);
+    n = self->decimation;
+    if (n == 1) {
+        self->upW = self->width;
+        self->upH = self->height;
+    } else if (self->is_bayer) {
+        /* Quads, starting from the first */
+        self->upW = 2 * ((self->width / 2 + n - 1) / n);
+        self->upH = 2 * ((self->height / 2 + n - 1) / n);
+    } else {
+        self->upW = (self->width + n - 1) / n;
+        self->upH = (self->height + n - 1) / n;
+    }
+}
+
+static void gltxs_decimate(GstGLTextureSink * self, GstBuffer * frame, guchar * dest)
+{
+    const guchar *  src;
+    const guchar *  row;
+    int             stride, bpp, n, x, y, sx, sy;
+    
+    /* Rows may be padded, so work stride out from buffer */
+    stride = GST_BUFFER_SIZE(frame) / self->fh;
+    bpp = gltxs_pixelBytes(self);
+    n = self->decimation;
+    src = GST_BUFFER_DATA(frame);
+    for (y = 0; y < self->upH; y++) {
+        if (self->is_bayer)
+            sy = (y / 2) * 2 * n + (y & 1);
+        else
+            sy = y * n;
+        row = src + sy * stride;
+        if (self->is_bayer) {
+            for (x = 0; x < self->upW; x++)
+                *dest++ = row[(x / 2) * 2 * n + (x & 1)];
+        } else if (bpp == 1) {
+            for (x = 0; x < self->upW; x++)
+                *dest++ = row[x * n];
+        } else {
+            for (x = 0; x < self->upW; x++) {
+                sx = x * n * bpp;
+                memcpy(dest, row + sx, bpp);
+                dest += bpp;
+            }
+        }
+    }
+}
+
+static gsize gltxs_fillPBO(GstGLTextureSink * self, GstBuffer * frame, GLuint pbo)
+{
+    GLvoid *    dest;
+    gsize       size;
+    
+    /* Leaves pbo bound. Returns bytes copied, 0 if it can't be mapped */
+    if (self->decimation > 1)
+        size = self->upW * self->upH * gltxs_pixelBytes(self);
+    else
+        size = GST_BUFFER_SIZE(frame);
+    gltxs_glBindBuffer(GL_PIXEL_UNPACK_BUFFER_ARB, pbo);
+    /* Orphan the old contents, so no waiting for the driver */
+    gltxs_glBufferData(GL_PIXEL_UNPACK_BUFFER_ARB, size,
+                NULL, GL_STREAM_DRAW_ARB);
+    dest = gltxs_glMapBuffer(GL_PIXEL_UNPACK_BUFFER_ARB, GL_WRITE_ONLY_ARB);
+    if (dest == NULL)
+        return 0;
+    if (self->decimation > 1)
+        gltxs_decimate(self, frame, dest);
+    else
+        memcpy(dest, GST_BUFFER_DATA(frame), size);
+    gltxs_glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER_ARB);
+    return size;
+}
+
+static void gltxs_drawPBO(GstGLTextureSink * self, GLuint pbo)
+{
+    /* Start transfer from PBO to texture. Data pointer is
+       an offset into the bound PBO */
+    gltxs_glBindBuffer(GL_PIXEL_UNPACK_BUFFER_ARB, pbo);
+    glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
+            self->upW, self->upH, self->srcFormat,
+            GL_UNSIGNED_BYTE, (GLvoid *)0);
+}
+
+static void gltxs_flushPBO(GstGLTextureSink * self)
+{
+    /* Texture must be bound. Upload any frame still waiting */
+    if (! self->pboPending)
+        return;
+    gltxs_drawPBO(self, self->pbo[1 - self->pboNext]);
+    gltxs_glBindBuffer(GL_PIXEL_UNPACK_BUFFER_ARB, 0);
+    self->frameTime = self->pboFrameTime;
+    self->pboPending = FALSE;
+}
+
+static gboolean gltxs_uploadPBO(GstGLTextureSink * self, GstBuffer * frame)
+{
+    GLuint      fill;
+    gsize       size;
+    gint64      newTime;
+    gboolean    uploaded;
+    
+    newTime = self->frameTime;
+    uploaded = FALSE;
+    /* Previous frame to the texture first, so its transfer
+       overlaps copying this one */
+    if (self->pboPending) {
+        gltxs_drawPBO(self, self->pbo[1 - self->pboNext]);
+        self->frameTime = self->pboFrameTime;
+        self->pboPending = FALSE;
+        uploaded = TRUE;
+    }
+    fill = self->pbo[self->pboNext];
+    size = gltxs_fillPBO(self, frame, fill);
+    if (size == 0) {
+        gltxs_glBindBuffer(GL_PIXEL_UNPACK_BUFFER_ARB, 0);
+        if (uploaded)
+            return TRUE;
+        /* Caller falls back to direct upload */
+        self->frameTime = newTime;
+        return FALSE;
+    }
+    if (! self->pboPrimed) {
+        /* Nothing in the texture yet, don't wait for a next frame */
+        gltxs_drawPBO(self, fill);
+        self->frameTime = newTime;
+        self->pboPrimed = TRUE;
+    } else {
+        self->pboPending = TRUE;
+        self->pboFrameTime = newTime;
+        self->pboNext = 1 - self->pboNext;
+    }
+    gltxs_glBindBuffer(GL_PIXEL_UNPACK_BUFFER_ARB, 0);
+    self->uploadBytes += size;
+    return TRUE;
+}
+
+static void gltxs_uploadDirect(GstGLTextureSink * self, GstBuffer * frame)
+{
+    gsize   size;
+    
+    if (self->decimation == 1) {
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
+                self->fw, self->fh, self->srcFormat,
+                GL_UNSIGNED_BYTE, GST_BUFFER_DATA(frame));
+        self->uploadBytes += GST_BUFFER_SIZE(frame);
+        return;
+    }
+    size = self->upW * self->upH * gltxs_pixelBytes(self);
+    if (self->scratchSize < size) {
+        g_free(self->scratch);
+        self->scratch = g_malloc(size);
+        self->scratchSize = size;
+    }
+    gltxs_decimate(self, frame, self->scratch);
+    glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
+            self->upW, self->upH, self->srcFormat,
+            GL_UNSIGNED_BYTE, self->scratch);
+    self->uploadBytes += size;
+}
+
+static void gltxs_allocTexture(GstGLTextureSink * self);
+
+static void gltxs_uploadFrame(GstGLTextureSink * self, GstBuffer * frame)
+{
+    gint64  start;
+    
+    /* Texture must be bound */
+    start = g_get_monotonic_time();
+    /* Display size changed enough to need a different texture? */
+    if (gltxs_wantedDecimation(self) != self->decimation) {
+        gltxs_allocTexture(self);
+        /* Waiting frame is the old size */
+        self->pboPending = FALSE;
+        self->pboPrimed = FALSE;
+    }
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1);
+    if (self->pbo[0] == 0 || ! gltxs_uploadPBO(self, frame))
+        gltxs_uploadDirect(self, frame);
+    gltxs_recordUpload(self, start);
+}
+
+static void gltxs_allocTexture(GstGLTextureSink * self)
+{
+    /* Context must be current. Texture is empty afterwards */
+    gltxs_setUploadSize(self);
+    if (strstr((char *)glGetString(GL_EXTENSIONS), "GL_ARB_texture_non_power_of_two")) {
+        self->texW = self->upW;
+        self->texH = self->upH;
+    } else {
+        /* Ancient graphics card. Nearest power of 2 dimensions */
+        g_warning("Ancient OpenGL detected: rounding dimensions to power of 2");
+        self->texW = 2;
+        while (self->texW < self->upW)
+            self->texW *= 2;
+        self->texH = 2;
+        while (self->texH < self->upH)
+            self->texH *= 2;
+    }
+    glBindTexture(GL_TEXTURE_2D, self->texture);
+    /* Video data may not be nicely aligned */
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1);
+    glTexImage2D(GL_TEXTURE_2D, 0, self->texture_format,
+                self->texW, self->texH, 0,
+                self->texture_format, GL_UNSIGNED_BYTE, NULL);
+}
+
 static gboolean gltxs_initTexture(GstGLTextureSink * self)
 {
+    GstBuffer * frame;
+    
     /* Used in PREROLL. Would also be necessary if the
        video source size changes during execution. */
 
-    printf("gltxs_initTexture...\n");
     if (self->texture == 0) {
         g_warning("GLTextureSink: No texture ID");
         return FALSE;
@@ -361,19 +1179,6 @@ static gboolean gltxs_initTexture(GstGLTextureSink * self)
     self->width = self->fw;
     self->height = self->fh;
     
-    if (strstr((char *)glGetString(GL_EXTENSIONS), "GL_ARB_texture_non_power_of_two")) {
-        self->texW = self->width;
-        self->texH = self->height;
-    } else {
-        /* Ancient graphics card. Nearest power of 2 dimensions */
-        g_warning("Ancient OpenGL detected: rounding dimensions to power of 2");
-        self->texW = 2;
-        while (self->texW < self->width)
-            self->texW *= 2;
-        self->texH = 2;
-        while (self->texH < self->height)
-            self->texH *= 2;
-    }
     /* Initialize empty */
     glBindTexture(GL_TEXTURE_2D, self->texture);
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP);
@@ -382,30 +1187,46 @@ static gboolean gltxs_initTexture(GstGLTextureSink * self)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST);
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST);
     
-    /* Video data may not be nicely aligned */
-    glPixelStorei(GL_UNPACK_ALIGNMENT, 1);
-    
-    glTexImage2D(GL_TEXTURE_2D, 0, self->texture_format,
-                self->texW, self->texH, 0,
-                self->texture_format, GL_UNSIGNED_BYTE, NULL);
+    gltxs_allocTexture(self);
+    gltxs_initPBO(self);
     
     /* And upload first frame */
-    glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
-            self->fw, self->fh, self->srcFormat,
-            GL_UNSIGNED_BYTE, GST_BUFFER_DATA(self->currentFrame));
-       
-    gst_buffer_unref(self->currentFrame);
-    self->currentFrame = NULL;
-    self->callbackTag  = 0;
-
-    printf("end gltxs_initTexture\n");
+    frame = gltxs_nextFrame(self);
+    if (frame != NULL) {
+        gltxs_uploadFrame(self, frame);
+        gst_buffer_unref(frame);
+    }
+    
+    gltxs_uploadDone(self);
     return FALSE;
 }
 
 static gboolean gltxs_updateTexture(GstGLTextureSink * self)
 {
+    GstBuffer * frame;
+    gboolean    flush;
+    
     /* Used to RENDER frame, by uploading to OpenGL */
-    printf("gltxs_updateTexture...\n");
+    g_mutex_lock(self->lock);
+    flush = self->eos && self->queueCount == 0;
+    g_mutex_unlock(self->lock);
+    if (flush && self->pboPending) {
+        /* Nothing more coming, show the frame waiting in a PBO */
+        if (glXMakeContextCurrent(self->dpy, self->xDraw, self->xDraw, self->context)) {
+            glBindTexture(GL_TEXTURE_2D, self->texture);
+            gltxs_flushPBO(self);
+        }
+        gltxs_uploadDone(self);
+        return FALSE;
+    }
+    if (self->paired) {
+        g_mutex_lock(self->lock);
+        self->callbackTag = 0;
+        g_mutex_unlock(self->lock);
+        g_signal_emit(self, gltxs_signals[SIGNAL_FRAME_QUEUED], 0);
+        return FALSE;
+    }
+    
     if (self->texture == 0) {
         g_error("GLTextureSink: No texture ID");
         return FALSE;
@@ -417,23 +1238,69 @@ static gboolean gltxs_updateTexture(GstGLTextureSink * self)
         return FALSE;
     }
     
-    if (self->currentFrame == NULL) {
-        g_error("GLTextureSink: NULL currentFrame");
-        return FALSE;
+    frame = gltxs_nextFrame(self);
+    if (frame != NULL) {
+        glBindTexture(GL_TEXTURE_2D, self->texture);
+        gltxs_uploadFrame(self, frame);
+        gst_buffer_unref(frame);
     }
     
-    glBindTexture(GL_TEXTURE_2D, self->texture);
-    glPixelStorei(GL_UNPACK_ALIGNMENT, 1);
-    glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0,
-            self->fw, self->fh, self->srcFormat,
-            GL_UNSIGNED_BYTE, GST_BUFFER_DATA(self->currentFrame));
+    gltxs_uploadDone(self);
+    return FALSE;
+}
+
+static gboolean gltxs_upload(GstGLTextureSink * self, gint64 timestamp)
+{
+    GstBuffer * frame, * prev;
+    gint64      t;
     
-    gst_buffer_unref(self->currentFrame);
-    self->currentFrame = NULL;
-    self->callbackTag  = 0;
+    /* Paired mode action, on main loop. Texture must already
+       have been set up by first frame */
+    if (self->texture == 0 || self->texW == 0)
+        return FALSE;
+    frame = NULL;
+    t = -1;
+    g_mutex_lock(self->lock);
+    if (self->drop_policy != GLTXS_DROP_LATEST) {
+        /* Never drop, so only ever the oldest */
+        if (self->queueCount > 0 &&
+                (timestamp < 0 || self->queueTimes[self->queueHead] <= timestamp)) {
+            t = self->queueTimes[self->queueHead];
+            frame = gltxs_popFrame(self);
+        }
+    } else {
+        while (self->queueCount > 0) {
+            if (timestamp >= 0 && self->queueTimes[self->queueHead] > timestamp)
+                break;
+            prev = frame;
+            t = self->queueTimes[self->queueHead];
+            frame = gltxs_popFrame(self);
+            if (prev != NULL) {
+                gst_buffer_unref(prev);
+                self->drops += 1;
+            }
+            if (t == timestamp)
+                break;
+        }
+    }
+    if (frame != NULL)
+        self->frameTime = t;
+    /* Frames still waiting get another frame-queued */
+    gltxs_scheduleUpdate(self);
+    g_mutex_unlock(self->lock);
+    if (frame == NULL)
+        return FALSE;
     
-    printf("end gltxs_updateTexture\n");
-    return FALSE;
+    if (! glXMakeContextCurrent(self->dpy, self->xDraw, self->xDraw, self->context)) {
+        g_warning("GLTextureSink: glXMakeContextCurrent");
+        gst_buffer_unref(frame);
+        return FALSE;
+    }
+    glBindTexture(GL_TEXTURE_2D, self->texture);
+    gltxs_uploadFrame(self, frame);
+    gst_buffer_unref(frame);
+    g_signal_emit(self, gltxs_signals[SIGNAL_TEXTURE_UPDATED], 0);
+    return TRUE;
 }
 
 static gboolean gst_gltexture_sink_setcaps(GstPad * pad, GstCaps * caps)
@@ -462,8 +1329,12 @@ static GstStateChangeReturn gst_gltexture_sink_change_state(
     self = GST_GLTEXTURESINK(element);
 
     if (transition == GST_STATE_CHANGE_READY_TO_NULL) {
+        g_mutex_lock(self->lock);
         if (self->callbackTag > 0)
             g_source_remove(self->callbackTag);
+        self->callbackTag = 0;
+        g_mutex_unlock(self->lock);
+        gltxs_flushQueue(self);
     }
     return GST_ELEMENT_CLASS(parent_class)->change_state(element, transition);
 }
@@ -475,8 +1346,8 @@ static GstFlowReturn gst_gltexture_sink_preroll(GstBaseSink * base, GstBuffer *
     const gchar *       mimeType;
     GstVideoFormat      format;
     gint                w, h;
+    GstFlowReturn       result;
     
-    printf("gst_gltexture_sink_preroll...\n");
     if (GST_BUFFER_SIZE(buf) <= 0)
         return GST_FLOW_OK;
         
@@ -494,13 +1365,18 @@ static GstFlowReturn gst_gltexture_sink_preroll(GstBaseSink * base, GstBuffer *
     }
     
     gst_video_format_parse_caps(caps, &format, &w, &h);
-    gltxs_saveBuffer(self, buf, w, h);
-
-    self->callbackTag = g_idle_add_full(G_PRIORITY_HIGH_IDLE,
+    g_mutex_lock(self->lock);
+    result = gltxs_saveBuffer(self, buf, w, h);
+    if (result == GST_FLOW_OK) {
+        /* Texture setup replaces any pending upload */
+        if (self->callbackTag > 0)
+            g_source_remove(self->callbackTag);
+        self->callbackTag = g_idle_add_full(G_PRIORITY_HIGH_IDLE,
                             (GSourceFunc)gltxs_initTexture, self, NULL);
+    }
+    g_mutex_unlock(self->lock);
 
-    printf("end gst_gltexture_sink_preroll\n");
-    return GST_FLOW_OK;
+    return result;
 }
 
 static GstFlowReturn gst_gltexture_sink_render(GstBaseSink * base, GstBuffer * buf)
@@ -509,8 +1385,8 @@ static GstFlowReturn gst_gltexture_sink_render(GstBaseSink * base, GstBuffer * b
     GstCaps *           caps;
     GstVideoFormat      format;
     gint                w, h;
+    GstFlowReturn       result;
     
-    printf("gst_gltexture_sink_render...\n");
     if (GST_BUFFER_SIZE(buf) <= 0)
         return GST_FLOW_OK;
     
@@ -519,13 +1395,69 @@ static GstFlowReturn gst_gltexture_sink_render(GstBaseSink * base, GstBuffer * b
     caps = gst_buffer_get_caps(buf);
     gst_video_format_parse_caps(caps, &format, &w, &h);
     /* printf("Render %d x %d = %d bytes\n", w, h, GST_BUFFER_SIZE(buf)); */
-    gltxs_saveBuffer(self, buf, w, h);
-    if (self->callbackTag == 0)
-        self->callbackTag = g_idle_add_full(G_PRIORITY_HIGH_IDLE,
-                            (GSourceFunc)gltxs_updateTexture, self, NULL);
+    g_mutex_lock(self->lock);
+    result = gltxs_saveBuffer(self, buf, w, h);
+    if (result == GST_FLOW_OK)
+        gltxs_scheduleUpdate(self);
+    g_mutex_unlock(self->lock);
 
-    printf("end gst_gltexture_sink_render\n");
-    return GST_FLOW_OK;
+    return result;
+}
+
+static gboolean gst_gltexture_sink_unlock(GstBaseSink * base)
+{
+    GstGLTextureSink *  self;
+    
+    /* Flushing or shutting down: wake streaming thread
+       if it is waiting for queue space */
+    self = GST_GLTEXTURESINK(base);
+    g_mutex_lock(self->lock);
+    self->unlocked = TRUE;
+    g_cond_broadcast(self->space);
+    g_mutex_unlock(self->lock);
+    return TRUE;
+}
+
+static gboolean gst_gltexture_sink_unlock_stop(GstBaseSink * base)
+{
+    GstGLTextureSink *  self;
+    
+    self = GST_GLTEXTURESINK(base);
+    g_mutex_lock(self->lock);
+    self->unlocked = FALSE;
+    g_mutex_unlock(self->lock);
+    return TRUE;
+}
+
+static gboolean gst_gltexture_sink_event(GstBaseSink * base, GstEvent * event)
+{
+    GstGLTextureSink *  self;
+    
+    /* At EOS the last frame may still be waiting in a PBO,
+       so the main loop has to be woken to upload it */
+    self = GST_GLTEXTURESINK(base);
+    if (GST_EVENT_TYPE(event) == GST_EVENT_EOS) {
+        g_mutex_lock(self->lock);
+        self->eos = TRUE;
+        if (self->callbackTag == 0)
+            self->callbackTag = g_idle_add_full(G_PRIORITY_HIGH_IDLE,
+                                (GSourceFunc)gltxs_updateTexture, self, NULL);
+        g_mutex_unlock(self->lock);
+    }
+    /* Base class still handles it */
+    return TRUE;
+}
+
+static void gst_gltexture_sink_finalize(GObject * object)
+{
+    GstGLTextureSink *  self;
+    
+    self = GST_GLTEXTURESINK(object);
+    gltxs_flushQueue(self);
+    g_free(self->scratch);
+    g_cond_free(self->space);
+    g_mutex_free(self->lock);
+    G_OBJECT_CLASS(parent_class)->finalize(object);
 }
 
 /* For use as Python module */
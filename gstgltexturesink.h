@@ -48,6 +48,18 @@ G_BEGIN_DECLS
 typedef struct _GstGLTextureSink      GstGLTextureSink;
 typedef struct _GstGLTextureSinkClass GstGLTextureSinkClass;
 
+/* How many upload durations to remember */
+#define GLTXS_UPLOAD_HISTORY 64
+
+/* Longest frame queue, and what to do when it is full */
+#define GLTXS_MAX_QUEUE     32
+#define GLTXS_DROP_LATEST   0
+#define GLTXS_DROP_FIFO     1
+#define GLTXS_DROP_BLOCK    2
+
+/* Most source pixels that will be skipped per uploaded pixel */
+#define GLTXS_MAX_DECIMATION 8
+
 
 /*  IMPORTANT: This plugin can NOT be used from gst-launch. It uploads
     data to an OpenGL texture map, so the client program must have a
@@ -71,6 +83,86 @@ typedef struct _GstGLTextureSinkClass GstGLTextureSinkClass;
     width, height   (Read only) Pixel dimensions of video source
     
     is_bayer    (Read only) True if source data is Bayer mosaic
+    
+    use_pbo     Upload through a pair of pixel buffer objects so
+                the copy to the GPU is asynchronous and overlaps
+                copying the next frame, at the cost of the texture
+                being one frame behind. Default False.
+                Falls back to direct upload if PBOs aren't available.
+    
+    pbo_active  (Read only) True if PBOs are actually being used
+    
+    drop_policy What to do if frames arrive faster than they can be
+                uploaded. 0 keep only the latest (default), 1 FIFO
+                queue dropping the oldest, 2 block upstream
+    
+    queue_size  Max frames waiting for upload with FIFO or block
+                policy, 1 to 32. Default 1
+    
+    queue_depth, max_queue_depth (Read only) Frames waiting for
+                upload now, and the most there have ever been
+    
+    frames, drops, uploads  (Read only) Frames received, frames
+                replaced by a newer one before upload, and uploads
+    
+    upload_time (Read only) Duration of last upload, microseconds
+    
+    upload_times (Read only) Array of most recent upload durations,
+                microseconds, oldest first
+    
+    since_last_frame (Read only) Microseconds since last frame was
+                received, or -1 if none yet
+    
+    paired      Don't upload frames automatically. Frames wait in the
+                queue (up to queue_size, dropping the oldest) until the
+                app asks for one with the upload action signal, so two
+                sinks can be kept in step. Default False.
+    
+    queued_timestamps (Read only) Array of clock times of the frames
+                waiting for upload, microseconds, oldest first
+    
+    timestamp   (Read only) Clock time of frame in texture, microseconds,
+                or -1 if none yet. Clock time is base time + running time
+                of the buffer timestamp, so is comparable between sinks in
+                different pipelines if they use the same (system) clock
+    
+    target_width, target_height  Size the video is displayed at, in
+                pixels. If the video is at least twice as big, frames are
+                decimated when uploaded: only every Nth pixel and row,
+                or for Bayer every Nth 2x2 quad so the result is still a
+                Bayer mosaic. The texture is reallocated when N changes.
+                Zero (default) means upload everything.
+    
+    decimation  (Read only) N, as above. 1 is full size
+    
+    upload_width, upload_height  (Read only) Size of the texture data
+                actually uploaded, which is width, height / decimation
+    
+    upload_bytes (Read only) Total bytes uploaded to the texture
+    
+    latency     (Read only) Clock time at last upload minus the clock
+                time of that frame, microseconds, or -1 if not known.
+                For live sources this is how stale the texture is:
+                from capture timestamp to upload
+    
+    latencies   (Read only) Array of recent latencies as above, same
+                order as upload_times, -1 where not known
+
+    SIGNALS
+
+    texture-updated  Emitted from the main loop (idle callback)
+                after a new frame has been uploaded to the texture.
+    
+    frame-queued Paired mode only. Emitted from the main loop when
+                new frames are waiting for upload.
+    
+    upload      Action signal, paired mode. Argument is a timestamp
+                from queued_timestamps: that frame is uploaded and any
+                older ones dropped. -1 uploads the latest. With FIFO or
+                block drop_policy nothing is dropped: only the oldest
+                frame is uploaded, if it's no newer than the timestamp,
+                and -1 uploads the oldest. Returns True if a frame was
+                uploaded. Main loop only.
 */
 
 struct _GstGLTextureSink
@@ -88,22 +180,50 @@ struct _GstGLTextureSink
     GLXDrawable xDraw;
     int         srcFormat;          /* OpenGL version of source format */
     int         texW, texH;
-    /* Most recent frame. We can't upload buffers to the OpenGL
-       texture without a valid context, this is the most recently
-       'rendered' frame for use by code that actually does glTexImage. */
-    GstBuffer * currentFrame;
+    guint       target_width, target_height;
+    guint       decimation;
+    int         upW, upH;           /* Decimated frame size */
+    guchar *    scratch;            /* Decimated frame, if no PBO */
+    gsize       scratchSize;
+    gboolean    use_pbo;
+    GLuint      pbo[2];             /* Zero if not in use */
+    int         pboNext;            /* PBO to fill next */
+    gboolean    pboPending;         /* Other PBO has frame to upload */
+    gboolean    pboPrimed;          /* Texture has a frame since init */
+    gint64      pboFrameTime;       /* Clock time of pending frame */
+    gboolean    eos;                /* No more frames until flush */
+    /* Recent frames. We can't upload buffers to the OpenGL
+       texture without a valid context, these are the 'rendered'
+       frames waiting for the code that actually does glTexImage. */
+    guint       drop_policy;
+    guint       queue_size;
+    GstBuffer * queue[GLTXS_MAX_QUEUE];
+    gint64      queueTimes[GLTXS_MAX_QUEUE];    /* Clock time, usec */
+    guint       queueHead, queueCount;
+    guint       maxQueueDepth;
+    GMutex *    lock;
+    GCond *     space;              /* Signalled when frame removed */
+    gboolean    unlocked;           /* Flushing, don't wait */
+    gboolean    paired;             /* App chooses frames to upload */
+    gint64      frameTime;          /* Of frame in texture */
     int         fw, fh;
     guint       callbackTag;
-    /* Debugging stuff */
-    int         stats;          /* Set to 1 for various messages */
+    /* Statistics. Only counted here, no logging */
     int         instance;       /* 1st, 2nd, etc */
-    int         frames, drops;
+    guint       frames, drops, uploads;
+    gint64      lastFrameTime;  /* g_get_monotonic_time */
+    guint       uploadTimes[GLTXS_UPLOAD_HISTORY];
+    gint64      latencies[GLTXS_UPLOAD_HISTORY];
+    guint       uploadNext;
+    guint64     uploadBytes;
 };
 
 struct _GstGLTextureSinkClass 
 {
     GstBaseSinkClass parent_class;
     int     instances;
+    /* Action signal */
+    gboolean (* upload) (GstGLTextureSink * self, gint64 timestamp);
 };
 
 GType gst_gltexture_sink_get_type(void);
@@ -12,6 +12,7 @@ import pygst
 pygst.require("0.10")
 import gst
 
+import app
 from app import _
 
 import gstgltexturesink
@@ -24,6 +25,18 @@ _jpegPipe   = "filesrc location={source} ! jpegdec ! ffmpegcolorspace"
 _rtspPipe   = "rtspsrc location={source} latency=50 ! rtpjpegdepay ! jpegdec ! queue ! jp462bayer "
 _moviePipe  = "filesrc location={source} ! decodebin ! ffmpegcolorspace "
 
+# Live monitor mode. Queues hold one buffer and throw away the
+# oldest rather than letting a backlog build up, the jitter
+# buffer waits as little as possible, and the sink doesn't wait
+# for the clock, so what is on screen is always the newest frame
+_leakyQueue = "queue max-size-buffers=1 max-size-bytes=0 max-size-time=0 leaky=downstream"
+_rtspMonitorPipe = ("rtspsrc location={source} latency=0 drop-on-latency=true ! rtpjpegdepay ! " +
+                    _leakyQueue + " ! jpegdec ! " + _leakyQueue + " ! jp462bayer ")
+
+# Elements that mean the source is live, so not waiting for
+# the clock won't just play a file as fast as it can decode
+_liveSources = ("rtspsrc", "v4l2src", "udpsrc", "dv1394src", "is-live=true")
+
 def defaultPipes():
     return [ _moviePipe, _rtspPipe, _pngPipe, ]
 
@@ -37,27 +50,74 @@ def defaultPipeline(source):
     else:
         return _moviePipe
 
-def configSink(glSink, pipeline):
-    """Apply any glTextureSink parameters to sink object
-       and strip that component from the string"""
+def isLive(pipeline):
+    """Does pipeline string start with a live source?"""
+    return any(name in pipeline for name in _liveSources)
+
+def monitorMode(pipeline):
+    """True if pipeline should be run as a live monitor: the
+       liveMonitor pref is on and the source is live"""
+    return eval(app.config.Read("liveMonitor", "False")) and isLive(pipeline)
+
+def decodeWorkers():
+    """True if sources should be decoded in worker processes,
+       see decodeworker.py"""
+    return eval(app.config.Read("decodeWorkers", "False"))
+
+def liveMonitor(pipeline):
+    """Low latency version of pipeline string. The default RTSP
+       pipe gets an extra queue so decoding has its own thread,
+       for others existing queues and rtspsrc are changed"""
+    if pipeline == _rtspPipe:
+        return _rtspMonitorPipe
+    components = []
+    for c in pipeline.split('!'):
+        words = c.split()
+        if words and words[0] == "queue":
+            c = " " + _leakyQueue + " "
+        elif words and words[0] == "rtspsrc":
+            words = [w for w in words if not w.startswith("latency=")
+                                      and not w.startswith("drop-on-latency=")]
+            c = " " + " ".join(words + ["latency=0", "drop-on-latency=true"]) + " "
+        components.append(c)
+    return '!'.join(components)
+
+def splitSinkParams(pipeline):
+    """Remove any final gstgltexturesink component from
+       pipeline string. Return remaining string and list of
+       name=value parameters for the sink"""
     gstComponents = pipeline.split('!')
     final = gstComponents[-1].strip()
+    params = []
     if final.startswith("gstgltexturesink"):
         # Since we've already created the sink, remove from
         # string that will be used to build video source
         del gstComponents[-1]
-        # But apply any parameter specs requested by user
-        params = final.split()[1:]
-        for p in params:
-            p = p.strip()
-            try:
-                name,value=p.split('=')
-                glSink.set_property(name, eval(value))
-            except:
-                wx.MessageBox(_("Cannot set property on GLTextureSink\n") + p,
-                      _("Error creating GST pipeline"),
-                      wx.OK | wx.ICON_ERROR, None)
-    return '!'.join(gstComponents)
+        params = [p.strip() for p in final.split()[1:]]
+    return '!'.join(gstComponents), params
+
+def configSink(glSink, pipeline):
+    """Apply any glTextureSink parameters to sink object
+       and strip that component from the string"""
+    pipeline, params = splitSinkParams(pipeline)
+    # But apply any parameter specs requested by user
+    for p in params:
+        try:
+            name,value=p.split('=')
+            glSink.set_property(name, eval(value))
+        except:
+            wx.MessageBox(_("Cannot set property on GLTextureSink\n") + p,
+                  _("Error creating GST pipeline"),
+                  wx.OK | wx.ICON_ERROR, None)
+    return pipeline
+
+def pipelineError(pipeline):
+    wx.MessageBox(_("Unable to create GStreamer pipeline\n") +
+                  pipeline + "\n" +
+                  _("Suggest testing with gst-launch"),
+                  _("Error creating GST pipeline"),
+                  wx.OK | wx.ICON_ERROR, None)
+    raise RuntimeError("Unable to create GStreamer pipeline " + pipeline)
 
 def createPipeline(source, pipeline):
     """GStreamer pipeline that generates video"""
@@ -66,14 +126,19 @@ def createPipeline(source, pipeline):
     try:
         pipe = gst.parse_launch(pipeline)
     except:
-        wx.MessageBox(_("Unable to create GStreamer pipeline\n") +
-                      pipeline + "\n" +
-                      _("Suggest testing with gst-launch"),
-                      _("Error creating GST pipeline"),
-                      wx.OK | wx.ICON_ERROR, None)
-        raise RuntimeError("Unable to create GStreamer pipeline " + pipeline)
+        pipelineError(pipeline)
     #
     return pipe
 
+def createBin(source, pipeline):
+    """Same as createPipeline, but a bin that can be added
+       to a shared pipeline along with others"""
+    pipeline = pipeline.format(source=source)
+    try:
+        chain = gst.parse_bin_from_description(pipeline, False)
+    except:
+        pipelineError(pipeline)
+    return chain
+
 
     
@@ -6,7 +6,8 @@
 #       Distributed under MIT/X11 license: see file COPYING
 
 #       Application structure is very simple:
-#       1. Ask user for two video streams to display
+#       1. Ask user for two video streams to display,
+#       or more for a grid of several rigs
 #       2. Show them. User can change the view a bit,
 #       but that's all. Once they're happy, they quit.
 
@@ -24,7 +25,7 @@ if progDir:
 
 import wx
 
-import app, chooser, renderer
+import app, chooser, preroll, renderer
 from app import _
 
 
@@ -41,7 +42,8 @@ class CameraFrame(wx.Frame):
         self.canvas = renderer.StereoFrame(self)
         self.dlg = None
         self.makeMenuBar()
-        self.CreateStatusBar()
+        # Sources or statistics; analysis results
+        self.CreateStatusBar(2)
         self.Bind(wx.EVT_CLOSE, self.OnClose, self)
         
     def makeMenuBar (self):
@@ -66,16 +68,16 @@ class CameraFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self.OnAbout, id=wx.ID_ABOUT)
         self.Bind(wx.EVT_MENU, self.OnQuit, id=wx.ID_EXIT)
         
-    def setVideoStreams(self, left, right, pipeline):
+    def setVideoStreams(self, left, right, pipeline, preroller=None, extra=()):
         # Renderer does most of the work
         if not left:
             # Swap with right
             left  = right
             right = ""
-        self.SetStatusText(str(left) + " : " + str(right))
+        self.SetStatusText(" : ".join([str(left), str(right)] + list(extra)), 0)
         if pipeline == "":
             pipeline = None
-        self.canvas.setVideoStreams(left, right, pipeline)
+        self.canvas.setVideoStreams(left, right, pipeline, preroller, extra)
     
     def OnAbout(self, event):
         wx.MessageBox(
@@ -118,17 +120,27 @@ class StereoCheckApp(wx.App):
     
     def chooseInput(self):
         dlg = chooser.SourceDialog()
+        # Most of the time the user picks the same sources
+        # as last time, so start those connecting now
+        prerolled = preroll.Preroller()
+        if eval(app.config.Read("preroll", "True")):
+            src = dlg.getVideoSources()
+            prerolled.start(src[0], src[1], dlg.getGSTPipeline(),
+                            eval(app.config.Read("sharedPipeline", "True")))
         result = dlg.ShowModal()
         if result != wx.ID_OK:
             # If cancelled, quit straight away
+            prerolled.clear()
             dlg.Destroy()
             raise SystemExit
         src = dlg.getVideoSources()
         # Need at least one input
         if not (src[0] or src[1]):
+            prerolled.clear()
             dlg.Destroy()
             raise SystemExit
-        self.frame.setVideoStreams(src[0], src[1], dlg.getGSTPipeline())
+        self.frame.setVideoStreams(src[0], src[1], dlg.getGSTPipeline(), prerolled,
+                                   dlg.getExtraSources())
         # Remember config for next time
         dlg.saveChoices()
         dlg.Destroy()
@@ -0,0 +1,183 @@
+
+#       Left/right frame pairing for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Left and right are separate pipelines, and by default
+#       each texture sink uploads whatever frame arrived last,
+#       so the pair on screen can be a frame or more apart.
+#       The pairer puts both sinks in paired mode, where new
+#       frames wait in a small queue, and looks at the clock
+#       times of the waiting frames. When there is a left and
+#       a right frame close enough together, both are uploaded
+#       and anything older thrown away. If no match turns up
+#       within the timeout, the latest of each is shown anyway
+#       so a dead or badly out of step camera can't freeze the
+#       display. If matching keeps failing, the pairer stops
+#       waiting at all until there is a match again.
+#
+#       With a FIFO or block drop policy, where every frame is
+#       meant to be seen, nothing is thrown away. The oldest
+#       left and right frames are shown together if they match.
+#       If they don't, the older one's partner has already gone
+#       by, so it is shown alone. The sinks then only ever give
+#       up their oldest frame.
+#
+#       Either way the difference in time between the two
+#       frames shown, the skew, is recorded. With genlocked
+#       cameras it should stay near zero.
+
+from __future__ import division, print_function
+
+import collections
+
+import wx
+
+from videotexture import DROP_LATEST
+
+
+class FramePairer(object):
+    """Keep left and right VideoTextures showing frames
+       captured at the same time"""
+
+    # Fallbacks in a row before giving up waiting
+    MAX_MISSES = 3
+
+    def __init__(self, left, right, tolerance=None, timeout=0.1,
+                 depth=4, history=100):
+        self.left     = left
+        self.right    = right
+        self.tolerance = tolerance  # Milliseconds, None to guess
+        self.timeout  = timeout     # Seconds
+        self.timer    = None
+        self.stopped  = False
+        self.skews    = collections.deque(maxlen=history)
+        self.misses   = 0
+        # Stats
+        self.matched   = 0
+        self.fallbacks = 0
+        # Every frame to be shown, oldest first
+        self.lossless = any(s.sink.get_property("drop_policy") != DROP_LATEST
+                            for s in (left, right))
+        for stream in (left, right):
+            stream.sink.set_property("queue_size",
+                    max(depth, stream.sink.get_property("queue_size")))
+            stream.sink.set_property("paired", True)
+            stream.sink.connect("frame-queued", lambda sink: self.check())
+
+    def stop(self):
+        self.stopped = True
+        if self.timer:
+            self.timer.Stop()
+            self.timer = None
+
+    def frameTolerance(self, times):
+        """Half the frame interval, in microseconds"""
+        if self.tolerance is not None:
+            return self.tolerance * 1000
+        gaps = [b - a for a, b in zip(times, times[1:]) if b > a]
+        if len(gaps) == 0:
+            return 20000
+        gaps.sort()
+        return gaps[len(gaps) // 2] // 2
+
+    def match(self, leftTimes, rightTimes):
+        """Newest left, right pair of clock times that are
+           within tolerance, or None"""
+        tolerance = max(self.frameTolerance(leftTimes),
+                        self.frameTolerance(rightTimes))
+        for lt in reversed(leftTimes):
+            if lt < 0:
+                continue
+            rt = min(rightTimes, key=lambda t: abs(t - lt))
+            if rt >= 0 and abs(rt - lt) <= tolerance:
+                return lt, rt
+        return None
+
+    def matchOldest(self, leftTimes, rightTimes):
+        """Oldest left and right clock times if within tolerance.
+           If not, the older of the two with None for the other
+           eye, as its partner would have been older still"""
+        tolerance = max(self.frameTolerance(leftTimes),
+                        self.frameTolerance(rightTimes))
+        lt = leftTimes[0]
+        rt = rightTimes[0]
+        if lt >= 0 and rt >= 0 and abs(rt - lt) <= tolerance:
+            return lt, rt
+        if lt < rt:
+            return lt, None
+        return None, rt
+
+    def check(self):
+        """Called on main loop when either sink has a new frame"""
+        if self.stopped:
+            return
+        leftTimes = list(self.left.sink.get_property("queued_timestamps"))
+        rightTimes = list(self.right.sink.get_property("queued_timestamps"))
+        if len(leftTimes) == 0 and len(rightTimes) == 0:
+            return
+        pair = None
+        if len(leftTimes) > 0 and len(rightTimes) > 0:
+            if self.lossless:
+                pair = self.matchOldest(leftTimes, rightTimes)
+            else:
+                pair = self.match(leftTimes, rightTimes)
+        if pair is None:
+            if self.misses >= self.MAX_MISSES:
+                self.expired()
+            # Wait for the other eye, but not forever
+            elif self.timer is None:
+                self.timer = wx.CallLater(max(1, int(self.timeout * 1000)), self.expired)
+            return
+        if self.timer:
+            self.timer.Stop()
+            self.timer = None
+        if pair[0] is not None and pair[1] is not None:
+            self.matched += 1
+            self.misses = 0
+        else:
+            self.fallbacks += 1
+        for stream, t in zip((self.left, self.right), pair):
+            if t is not None:
+                stream.sink.emit("upload", t)
+        self.record()
+
+    def expired(self):
+        """Timeout, show whatever is latest"""
+        if self.timer:
+            self.timer.Stop()
+        self.timer = None
+        if self.stopped:
+            return
+        # Latest, or oldest if lossless
+        self.left.sink.emit("upload", -1)
+        self.right.sink.emit("upload", -1)
+        self.fallbacks += 1
+        self.misses += 1
+        self.record()
+
+    def record(self):
+        lt = self.left.sink.get_property("timestamp")
+        rt = self.right.sink.get_property("timestamp")
+        if lt >= 0 and rt >= 0:
+            self.skews.append((rt - lt) / 1000.0)
+
+    def skew(self):
+        """Right minus left time of frames on screen, ms,
+           or None if not known yet"""
+        if len(self.skews) == 0:
+            return None
+        return self.skews[-1]
+
+    def stats(self):
+        """Return dict of counters, skews in milliseconds"""
+        skews = list(self.skews)
+        result = { "matched":   self.matched,
+                   "fallbacks": self.fallbacks,
+                   "skew":      self.skew(),
+                   "meanSkew":  None,
+                   "maxSkew":   None }
+        if len(skews) > 0:
+            result["meanSkew"] = sum(skews) / len(skews)
+            result["maxSkew"] = max(abs(s) for s in skews)
+        return result
@@ -0,0 +1,135 @@
+
+#       Background pre-roll of video sources for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Opening an RTSP stream from the Elphels takes several
+#       seconds, and the user is usually going to pick the same
+#       sources as last time. So while the source chooser is up,
+#       the remembered sources are built and set to PAUSED,
+#       which does the connecting and negotiating. There can't
+#       be a GL texture sink yet, so each source ends in a
+#       fakesink. If the user picks the same source and
+#       pipeline the VideoTexture takes over the warm chain,
+#       swapping the fakesink for its own sink. Anything not
+#       taken, or that has been waiting too long, is thrown away.
+#
+#       Only live sources are warmed up. A file or image source
+#       prerolls its first buffer into the fakesink, and taking
+#       the fakesink away then leaves its streaming thread
+#       stopped for good. They open quickly anyway.
+
+from __future__ import division, print_function
+
+import time
+
+import pygst
+pygst.require("0.10")
+import gst
+
+import gstvideo
+
+
+class WarmSource(object):
+    """Source chain in a pipeline, ready to play"""
+
+    def __init__(self, source, description, container):
+        self.source      = source
+        self.description = description
+        self.pipeline    = container
+        self.startTime   = time.time()
+        self.chain = gst.parse_bin_from_description(
+                        description.format(source=source), False)
+        self.fake = gst.element_factory_make("fakesink")
+        self.fake.set_property("sync", False)
+        self.pipeline.add(self.chain, self.fake)
+        self.last().link(self.fake)
+
+    def last(self):
+        """Final element of source chain"""
+        return self.chain.sorted()[0]
+
+    def release(self):
+        """Remove fakesink so real sink can be linked"""
+        self.last().unlink(self.fake)
+        self.fake.set_state(gst.STATE_NULL)
+        self.pipeline.remove(self.fake)
+        self.fake = None
+
+    def failed(self):
+        ret, state, pending = self.pipeline.get_state(0)
+        return ret == gst.STATE_CHANGE_FAILURE
+
+
+class Preroller(object):
+    """Warm up sources while the user is choosing"""
+
+    # RTSP servers drop idle sessions, so don't trust
+    # anything that has been sitting around longer
+    MAX_AGE = 30.0
+
+    def __init__(self):
+        self.warm = []
+        self.pipelines = []
+
+    def description(self, source, pipeline):
+        """Source part of pipeline string, as VideoTexture
+           would build it"""
+        if not pipeline:
+            pipeline = gstvideo.defaultPipeline(source)
+        if gstvideo.monitorMode(pipeline):
+            pipeline = gstvideo.liveMonitor(pipeline)
+        return gstvideo.splitSinkParams(pipeline)[0]
+
+    def start(self, left, right, pipeline, shared=True):
+        """Pre-roll left and right sources, in one pipeline if
+           shared as StereoFrame would. Sources that fail to
+           build are just skipped: the user may be about to
+           choose something else anyway. Nothing is done if
+           sources will be run in decode workers, and non live
+           sources are left for VideoTexture to open"""
+        if gstvideo.decodeWorkers():
+            return
+        sources = []
+        for eye, source in (("left", left), ("right", right)):
+            if source and gstvideo.isLive(self.description(source, pipeline)):
+                sources.append((eye, source))
+        shared = shared and len(sources) == 2
+        container = None
+        for eye, source in sources:
+            if container is None or not shared:
+                container = gst.Pipeline("preroll-" + eye)
+                self.pipelines.append(container)
+            try:
+                self.warm.append(WarmSource(source,
+                                    self.description(source, pipeline), container))
+            except Exception:
+                continue
+        for pipe in self.pipelines:
+            pipe.set_state(gst.STATE_PAUSED)
+
+    def take(self, source, pipeline):
+        """Return WarmSource for source and pipeline if there
+           is one and it is still usable, otherwise None"""
+        description = self.description(source, pipeline)
+        for warm in self.warm:
+            if warm.source == source and warm.description == description:
+                if time.time() - warm.startTime > self.MAX_AGE or warm.failed():
+                    return None
+                self.warm.remove(warm)
+                return warm
+        return None
+
+    def clear(self, keep=()):
+        """Discard all pre-rolled pipelines except those in keep"""
+        for warm in self.warm:
+            if warm.pipeline in keep:
+                # Shares pipeline with a source that was taken
+                for element in (warm.chain, warm.fake):
+                    element.set_state(gst.STATE_NULL)
+                    warm.pipeline.remove(element)
+        for pipe in self.pipelines:
+            if pipe not in keep:
+                pipe.set_state(gst.STATE_NULL)
+        self.pipelines = []
+        self.warm = []
@@ -0,0 +1,191 @@
+#       Source reconnection for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       When a camera drops off the network for a moment the
+#       rtspsrc errors out, or just stops delivering, and the
+#       only fix used to be quitting and going through the
+#       chooser again. A SourceSupervisor watches the pipeline
+#       bus for errors from its own video texture's elements,
+#       and the sink for frames stopping. Either way the source
+#       chain is thrown away and rebuilt from the same pipeline
+#       string, linked to the same sink, so the GL texture and
+#       everything attached to the sink stays. Until frames
+#       arrive again the texture keeps the last one, marked as
+#       stale. Failed attempts back off exponentially.
+#
+#       Everything here runs in the main loop: bus messages
+#       through a signal watch, the watchdog from a timer.
+
+from __future__ import division, print_function
+
+import time
+
+import wx
+
+import app
+
+
+# Supervisor states
+LIVE       = "live"         # Frames arriving, or not started yet
+WAITING    = "waiting"      # Source removed, backing off
+CONNECTING = "connecting"   # New source built, no frame yet
+
+
+class SourceSupervisor(object):
+    """Keep a video texture's source chain running"""
+
+    # How often to check for stalls, milliseconds
+    CHECK_INTERVAL = 250
+
+    def __init__(self, stream):
+        self.stream = stream
+        # Seconds without a frame that counts as failed
+        self.stallTime = eval(app.config.Read("reconnectStall", "3.0"))
+        # Backoff between attempts, seconds
+        self.minDelay  = eval(app.config.Read("reconnectDelay", "0.25"))
+        self.maxDelay  = eval(app.config.Read("reconnectMaxDelay", "8.0"))
+        self.delay     = self.minDelay
+        self.state     = LIVE
+        self.stopped   = False
+        self.retry     = None
+        # Called when stale changes, for redrawing
+        self.onChange  = None
+        # Times of this outage
+        self.lastFrameTime = None
+        self.failTime  = None
+        self.recoverTime = None
+        self.attemptTime = None
+        self.framesAtAttempt = 0
+        # Stats
+        self.failures  = 0
+        self.attempts  = 0
+        self.reconnects = 0
+        self.lastReason = None
+        self.lastDetect = None
+        self.lastRecovery = None
+        self.lastOutage = None
+        # Bus is shared with the other eye if in one pipeline
+        self.bus = stream.pipeline.get_bus()
+        self.bus.add_signal_watch()
+        self.handlers = [self.bus.connect("message::error", self.onError),
+                         self.bus.connect("message::eos", self.onEOS)]
+        # First new frame ends outage, the watchdog is too coarse
+        stream.setFrameCallback(self.onFrame)
+        self.timer = wx.PyTimer(self.check)
+        self.timer.Start(self.CHECK_INTERVAL)
+
+    @property
+    def stale(self):
+        """True if texture is showing an old frame"""
+        return self.state != LIVE
+
+    def ours(self, message):
+        """Message came from our video texture's elements?"""
+        src = message.src
+        return src is self.stream.stream or src.has_ancestor(self.stream.stream)
+
+    def onError(self, bus, message):
+        if self.ours(message):
+            err, debug = message.parse_error()
+            self.fail(str(err))
+
+    def onEOS(self, bus, message):
+        # Only posted by a pipeline of our own: the shared one
+        # waits for both eyes, the watchdog handles that
+        if message.src is self.stream.stream:
+            self.fail("EOS")
+
+    def onFrame(self):
+        if self.state == CONNECTING and not self.stopped:
+            self.recovered(time.time())
+
+    def frames(self):
+        return self.stream.sink.get_property("frames")
+
+    def check(self):
+        """Watchdog for sources that stop without an error"""
+        if self.stopped:
+            return
+        now = time.time()
+        if self.state == CONNECTING:
+            if self.frames() > self.framesAtAttempt:
+                self.recovered(now)
+            elif now - self.attemptTime > self.stallTime:
+                self.fail("no frames after reconnect")
+        elif self.state == LIVE and self.stream.startup is not None:
+            since = self.stream.sink.get_property("since_last_frame")
+            if since > self.stallTime * 1000000:
+                self.fail("stalled")
+
+    def fail(self, reason):
+        """Source is dead, remove it and try again later"""
+        if self.stopped or self.state == WAITING:
+            return
+        now = time.time()
+        if self.state == LIVE:
+            # Start of outage
+            since = self.stream.sink.get_property("since_last_frame")
+            if since >= 0:
+                self.lastFrameTime = now - since / 1000000.0
+            else:
+                self.lastFrameTime = now
+            self.failTime = now
+            self.delay = self.minDelay
+            self.failures += 1
+            if self.onChange:
+                self.onChange()
+        self.lastReason = reason
+        self.state = WAITING
+        # Stop it now, or rtspsrc keeps retrying by itself
+        self.stream.removeSource()
+        self.retry = wx.CallLater(max(1, int(self.delay * 1000)), self.reconnect)
+        self.delay = min(self.delay * 2, self.maxDelay)
+
+    def reconnect(self):
+        self.retry = None
+        if self.stopped:
+            return
+        self.attempts += 1
+        self.attemptTime = time.time()
+        self.framesAtAttempt = self.frames()
+        self.state = CONNECTING
+        try:
+            self.stream.addSource()
+        except Exception as e:
+            self.fail(str(e))
+
+    def recovered(self, now):
+        self.state = LIVE
+        self.recoverTime = now
+        self.reconnects += 1
+        self.lastDetect   = (self.failTime - self.lastFrameTime) * 1000.0
+        self.lastRecovery = (now - self.failTime) * 1000.0
+        self.lastOutage   = (now - self.lastFrameTime) * 1000.0
+        if self.onChange:
+            self.onChange()
+
+    def stats(self):
+        """Dict of counters, times in milliseconds of the last
+           outage: detect is last frame to failure noticed,
+           recovery failure to first new frame, outage both"""
+        return { "state":      self.state,
+                 "failures":   self.failures,
+                 "attempts":   self.attempts,
+                 "reconnects": self.reconnects,
+                 "reason":     self.lastReason,
+                 "detect":     self.lastDetect,
+                 "recovery":   self.lastRecovery,
+                 "outage":     self.lastOutage }
+
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.timer.Stop()
+        if self.retry:
+            self.retry.Stop()
+            self.retry = None
+        for h in self.handlers:
+            self.bus.disconnect(h)
+        self.bus.remove_signal_watch()
@@ -6,14 +6,15 @@
 
 #       The renderer displays the two video sources.
 #       Current options are side by side, overlaid at
-#       50% alpha each, or anaglyph (red-blue) stereo
+#       50% alpha each, anaglyph (red-blue) stereo, or
+#       the difference between the two
 #       Real quad buffered stereo might be nice, but
 #       this app was designed for use in the field on
 #       a laptop.
 
 from __future__ import division, print_function
 
-import sys, math
+import sys, os, math
 
 import wx
 from wx.glcanvas import *
@@ -27,7 +28,7 @@ from OpenGL.GL import *
 from canvas3d import Canvas3D
 import app
 from app import _
-import gpu, gstvideo, videotexture
+import alignment, disparity, exposure, focus, geometry, gpu, pairing, repaint, replay, seeking, videotexture
 from videotexture import *
 
 # Because these integers get stored in app prefs,
@@ -38,6 +39,37 @@ MYID_ANAGLYPH   = MYID_BLENDED + 1
 MYID_FULLSCREEN = MYID_ANAGLYPH + 1
 MYID_SHOW_LEFT  = MYID_FULLSCREEN + 1
 MYID_SHOW_RIGHT = MYID_SHOW_LEFT + 1
+MYID_SHOW_STATS = MYID_SHOW_RIGHT + 1
+MYID_ALIGNMENT  = MYID_SHOW_STATS + 1
+MYID_FOCUS      = MYID_ALIGNMENT + 1
+MYID_DIFFERENCE = MYID_FOCUS + 1
+MYID_BAYER_AUTO = MYID_DIFFERENCE + 1
+MYID_BAYER_FULL = MYID_BAYER_AUTO + 1
+MYID_BAYER_HALF = MYID_BAYER_FULL + 1
+MYID_REPLAY     = MYID_BAYER_HALF + 1
+MYID_EXPOSURE   = MYID_REPLAY + 1
+MYID_GRID       = MYID_EXPOSURE + 1
+MYID_PAUSE      = MYID_GRID + 1
+MYID_DISPARITY  = MYID_PAUSE + 1
+
+# Bayer preview menu choice to VideoTexture.setBinning value
+BAYER_BINNING = {
+    MYID_BAYER_AUTO: None,
+    MYID_BAYER_FULL: False,
+    MYID_BAYER_HALF: True,
+}
+
+# Streams drawn in one pass by the grid shader
+GRID_CELLS = 8
+
+# Badge on streams that are reconnecting
+STALE_COLOR = (1.0, 0.5, 0.0)
+
+# Exposure histogram colors, as in anaglyph view
+HISTOGRAM_COLORS = ((1.0, 0.3, 0.3), (0.3, 1.0, 1.0))
+
+# Seconds that warm or cold start time stays in stream stats
+STARTUP_SHOWN = 10.0
     
 class StereoFrame(Canvas3D):
     """Display frame stereo image pair"""
@@ -49,21 +81,67 @@ class StereoFrame(Canvas3D):
         # Streams, to be supplied
         self.left    = None
         self.right   = None
+        self.extra   = []       # More cameras, grid view only
         self.pipeline= None
+        self.pairer  = None
+        # Recent compressed frames, to look back at
+        self.replay  = None
+        # Pause and seek if playing files
+        self.seeker  = None
         # Single, side by side or overlay view
         self.mono    = True # Automatic if only one stream, no preference
         self.overlay = eval(app.config.Read("overlay", "0"))
+        # Full or half resolution Bayer, or choose by size
+        self.bayerPreview = eval(app.config.Read("bayerPreview", str(MYID_BAYER_AUTO)))
+        if self.bayerPreview not in BAYER_BINNING:
+            self.bayerPreview = MYID_BAYER_AUTO
         self.bkColor = (0.0, 0.0, 0.0)  # Background color
         # Internal layout
         self.BORDER  = 0.1
+        # Redraw only when there's something new to show
+        self.scheduler = repaint.RepaintScheduler(self,
+                            eval(app.config.Read("maxFrameRate", "60")))
+        # Stream statistics in status bar, off by default
+        self.statsTimer = None
+        self.prevStats  = {}
+        self.savedStatus = ""
+        # Background analyzers, results in second status field
+        self.analyzers = {}
+        self.analysisText = {}
+        # Region of interest for focus, fractions of image
+        self.focusRegion = None
+        # Parallax map drawn over left eye
+        self.disparityTex = None
+        self.disparityResult = None
+        self.disparityBox = None
+        self.dragStart = None
+        self.dragEnd   = None
+        self.Bind(wx.EVT_LEFT_DOWN, self.OnMouseDown)
+        self.Bind(wx.EVT_MOTION, self.OnMouseMove)
+        self.Bind(wx.EVT_LEFT_UP, self.OnMouseUp)
     
     def stopVideo(self):
         """Shut down GStreamer, save prefs"""
-        if self.left:
-            self.left.stop()
-        if self.right:
-            self.right.stop()
+        # Both eyes in one go if they share a pipeline
+        stopStreams(self.allStreams())
+        if self.pairer:
+            self.pairer.stop()
+        if self.replay:
+            self.SetCurrent()
+            self.replay.stop()
+        if self.seeker:
+            self.seeker.stop()
+        if self.disparityTex is not None:
+            self.SetCurrent()
+            glDeleteTextures([self.disparityTex])
+            self.disparityTex = None
+        self.scheduler.stop()
+        if self.statsTimer:
+            self.statsTimer.Stop()
+        for name in list(self.analyzers.keys()):
+            self.stopAnalyzer(name)
         app.config.Write("overlay", repr(self.overlay))
+        app.config.Write("bayerPreview", repr(self.bayerPreview))
     
     def addMenuItems(self, menu):
         """Our view controls"""
@@ -73,33 +151,144 @@ class StereoFrame(Canvas3D):
         menu.AppendCheckItem(MYID_BLENDED, _("Blended view\tctrl+b"))
         menu.AppendCheckItem(MYID_SPLIT, _("Side by side\tctrl+s"))
         menu.AppendCheckItem(MYID_ANAGLYPH, _("Anaglyph view\tctrl+a"))
+        menu.AppendCheckItem(MYID_DIFFERENCE, _("Difference view\tctrl+d"))
+        menu.AppendCheckItem(MYID_GRID, _("Grid view\tctrl+t"))
         menu.AppendCheckItem(MYID_SHOW_LEFT, _("Left eye\tctrl+l"))
         menu.AppendCheckItem(MYID_SHOW_RIGHT, _("Right eye\tctrl+r"))
+        menu.AppendCheckItem(MYID_SHOW_STATS, _("Statistics\tctrl+i"))
+        menu.AppendCheckItem(MYID_ALIGNMENT, _("Measure alignment\tctrl+g"))
+        menu.AppendCheckItem(MYID_FOCUS, _("Measure focus\tctrl+k"))
+        menu.AppendCheckItem(MYID_EXPOSURE, _("Measure exposure\tctrl+e"))
+        menu.AppendCheckItem(MYID_DISPARITY, _("Disparity map\tctrl+m"))
+        menu.AppendCheckItem(MYID_REPLAY, _("Instant replay\tctrl+p"))
+        menu.AppendCheckItem(MYID_PAUSE, _("Pause files\tctrl+u"))
+        bayer = wx.Menu()
+        bayer.AppendCheckItem(MYID_BAYER_AUTO, _("Automatic"))
+        bayer.AppendCheckItem(MYID_BAYER_FULL, _("Full resolution"))
+        bayer.AppendCheckItem(MYID_BAYER_HALF, _("Half resolution"))
+        menu.AppendMenu(wx.ID_ANY, _("Bayer preview"), bayer)
         self.window.Bind(wx.EVT_MENU, self.OnFullScreen, id=MYID_FULLSCREEN)
         self.window.Bind(wx.EVT_MENU, self.OnSplit, id=MYID_SPLIT)
         self.window.Bind(wx.EVT_MENU, self.OnMerge, id=MYID_BLENDED)
         self.window.Bind(wx.EVT_MENU, self.OnAnaglyph, id=MYID_ANAGLYPH)
+        self.window.Bind(wx.EVT_MENU, self.OnDifference, id=MYID_DIFFERENCE)
+        self.window.Bind(wx.EVT_MENU, self.OnGrid, id=MYID_GRID)
         self.window.Bind(wx.EVT_MENU, self.OnShowLeft, id=MYID_SHOW_LEFT)
         self.window.Bind(wx.EVT_MENU, self.OnShowRight, id=MYID_SHOW_RIGHT)
+        self.window.Bind(wx.EVT_MENU, self.OnShowStats, id=MYID_SHOW_STATS)
+        self.window.Bind(wx.EVT_MENU, self.OnAlignment, id=MYID_ALIGNMENT)
+        self.window.Bind(wx.EVT_MENU, self.OnFocus, id=MYID_FOCUS)
+        self.window.Bind(wx.EVT_MENU, self.OnExposure, id=MYID_EXPOSURE)
+        self.window.Bind(wx.EVT_MENU, self.OnDisparity, id=MYID_DISPARITY)
+        self.window.Bind(wx.EVT_MENU, self.OnReplay, id=MYID_REPLAY)
+        self.window.Bind(wx.EVT_MENU, self.OnPause, id=MYID_PAUSE)
+        for menuID in BAYER_BINNING:
+            self.window.Bind(wx.EVT_MENU, self.OnBayerPreview, id=menuID)
         # Immediate update, wx always checks first item
         self.OnUpdateMenu(None)
     
-    def setVideoStreams(self, left, right, pipeline):
-        """Create video streams from chooser dialog values"""
+    def setVideoStreams(self, left, right, pipeline, preroller=None, extra=()):
+        """Create video streams from chooser dialog values.
+           preroller has sources that may already be warm.
+           extra is a list of more sources, each with its own
+           pipeline, shown in the grid view"""
+        warmLeft = warmRight = None
+        if preroller:
+            warmLeft = preroller.take(left, pipeline)
+            if right:
+                warmRight = preroller.take(right, pipeline)
         # If only one stream (mono), make it the left
-        self.left = VideoTexture(left, pipeline)
         if not right:
             self.mono = True
+            if preroller:
+                preroller.clear(keep=[w.pipeline for w in (warmLeft,) if w])
+            self.left = self.newStream(left, pipeline, warmLeft)
+            self.right = None
+        elif eval(app.config.Read("sharedPipeline", "True")):
+            # One pipeline, so one clock and base time, and
+            # both eyes start and stop with one state change
+            self.mono = False
+            if warmLeft:
+                shared = warmLeft.pipeline
+            elif warmRight:
+                shared = warmRight.pipeline
+            else:
+                shared = gst.Pipeline("stereo")
+            if warmRight and warmRight.pipeline is not shared:
+                warmRight = None
+            if preroller:
+                preroller.clear(keep=(shared,))
+            self.left = VideoTexture(left, pipeline, shared, warmLeft)
+            self.right = VideoTexture(right, pipeline, shared, warmRight)
+            startStreams((self.left, self.right))
         else:
             self.mono = False
-            self.right = VideoTexture(right, pipeline)
-        self.positionStreams()
+            if preroller:
+                preroller.clear(keep=[w.pipeline for w in (warmLeft, warmRight) if w])
+            self.left = self.newStream(left, pipeline, warmLeft)
+            self.right = self.newStream(right, pipeline, warmRight)
+        self.extra = [self.newStream(source, pipeline, None) for source in extra]
+        if self.extra:
+            # Other views only show left and right
+            self.overlay = MYID_GRID
         # The video streams update the GL textures automatically,
-        # but don't force window updates. We'll draw at normal
-        # speed rather than try to synch to the video frame rate.
-        self.animate()
+        # and tell us when they have, so we only redraw when
+        # there is a new frame instead of at a fixed rate.
+        for stream in self.allStreams():
+            stream.setFrameCallback(self.scheduler.request)
+            stream.setBinning(BAYER_BINNING[self.bayerPreview])
+            # Stale badge comes and goes without a new frame
+            if stream.supervisor:
+                stream.supervisor.onChange = self.scheduler.request
+        # Show left and right frames captured at the same time
+        if self.pairer:
+            self.pairer.stop()
+            self.pairer = None
+        if self.right and eval(app.config.Read("pairFrames", "True")):
+            self.pairer = pairing.FramePairer(self.left, self.right,
+                    timeout=eval(app.config.Read("pairTimeout", "0.1")))
+        # Start recording straight away, there's no knowing
+        # when something will go wrong
+        if self.replay:
+            self.SetCurrent()
+            self.replay.stop()
+        self.replay = replay.InstantReplay(self.allStreams())
+        # Files can be moved around, both eyes together
+        if self.seeker:
+            self.seeker.stop()
+            self.seeker = None
+        eyes = [s for s in (self.left, self.right) if s]
+        if all(seeking.seekable(s) for s in eyes):
+            self.seeker = seeking.FileSeeker(eyes, self.indexCache(), self.onSeek)
+            self.seeker.useIndex = eval(app.config.Read("seekIndex", "True"))
+        self.positionStreams()
         self.OnUpdateMenu(None)
      
+    def allStreams(self):
+        """Left, right and any extra video textures"""
+        return [s for s in [self.left, self.right] + self.extra if s]
+    
+    def overlaid(self):
+        """True if the eyes are drawn on top of each other"""
+        return self.overlay not in (0, MYID_GRID) and not self.mono
+    
+    def streamShape(self, index):
+        """Geometry name for stream quad"""
+        return ("left", "right")[index] if index < 2 else "cam" + str(index + 1)
+    
+    def streamName(self, index):
+        """Short name for status bar"""
+        return (_("L"), _("R"))[index] if index < 2 else "#" + str(index + 1)
+    
+    def newStream(self, source, pipeline, warm):
+        """Video texture with its own pipeline, taking over
+           warm one if there is one"""
+        if warm is None:
+            return VideoTexture(source, pipeline)
+        stream = VideoTexture(source, pipeline, warm.pipeline, warm)
+        startStreams((stream,))
+        return stream
+    
     def OnFullScreen(self, event):
         """Change to fullscreen mode"""
         self.window.ShowFullScreen(not self.window.IsFullScreen(), style=wx.FULLSCREEN_ALL)
@@ -122,44 +311,456 @@ class StereoFrame(Canvas3D):
         self.positionStreams()
         self.OnUpdateMenu(None)
     
+    def OnDifference(self, event):
+        """Switch to absolute difference overlay view"""
+        self.overlay = MYID_DIFFERENCE
+        self.positionStreams()
+        self.OnUpdateMenu(None)
+    
+    def OnGrid(self, event):
+        """Switch to grid of all streams, the only view that
+           shows more than two"""
+        self.overlay = MYID_GRID
+        self.positionStreams()
+        self.OnUpdateMenu(None)
+    
+    def OnBayerPreview(self, event):
+        """Bayer sources at full or half resolution, or
+           automatic depending on display size"""
+        self.bayerPreview = event.GetId()
+        for stream in self.allStreams():
+            stream.setBinning(BAYER_BINNING[self.bayerPreview])
+        self.scheduler.request()
+        self.OnUpdateMenu(None)
+    
+    def OnReplay(self, event):
+        """Toggle instant replay: freeze the view and scrub back
+           through recent frames with the arrow keys"""
+        if self.replay is None:
+            return
+        # Replay textures are created and deleted
+        self.SetCurrent()
+        if self.replay.frozen:
+            self.replay.resume()
+            if not self.statsTimer:
+                self.window.SetStatusText(self.savedStatus)
+        else:
+            if not self.statsTimer:
+                self.savedStatus = self.window.GetStatusBar().GetStatusText()
+            self.replay.freeze(self.onReplayFrame)
+            self.showReplayStatus()
+        self.scheduler.request()
+        self.OnUpdateMenu(None)
+    
+    def onReplayFrame(self):
+        """Replay frame has been decoded and uploaded"""
+        self.scheduler.request()
+        self.showReplayStatus()
+    
+    def scrub(self, ch, fast):
+        """Arrow keys step through replay a frame at a time,
+           or a second with shift. Home and End go to the
+           oldest and newest. False if not a scrub key"""
+        if ch == wx.WXK_LEFT:
+            if fast:
+                self.replay.seek(-1.0)
+            else:
+                self.replay.step(-1)
+        elif ch == wx.WXK_RIGHT:
+            if fast:
+                self.replay.seek(1.0)
+            else:
+                self.replay.step(1)
+        elif ch == wx.WXK_HOME:
+            self.replay.step(-sys.maxsize)
+        elif ch == wx.WXK_END:
+            self.replay.step(sys.maxsize)
+        else:
+            return False
+        self.showReplayStatus()
+        return True
+    
+    def replayText(self):
+        """Replay memory use, and position and decode cost if
+           frozen, as short text"""
+        r = self.replay.stats()
+        memory = _("{0:.1f} MB {1:.1f} s").format(r["bytes"] / 1e6, r["seconds"])
+        if not r["frozen"]:
+            return _("replay") + " " + memory
+        text = _("REPLAY {0:+.2f} s frame {1}/{2} {3}").format(
+                r["offset"], r["position"] + 1, r["length"], memory)
+        if r["decodeTime"] is not None:
+            text += " " + _("decode {0:.1f} ms x {1}").format(r["decodeTime"], r["decoded"])
+        if r["lost"]:
+            text += " " + _("lost {0}").format(r["lost"])
+        return text
+    
+    def showReplayStatus(self):
+        if self.statsTimer:
+            self.window.SetStatusText(self.statusText())
+        elif self.replay.frozen:
+            self.window.SetStatusText(self.replayText())
+    
+    def indexCache(self):
+        """Directory for keyframe indexes, or None"""
+        cacheDir = eval(app.config.Read("indexCache", "None"))
+        if cacheDir is None:
+            cacheDir = os.path.join(os.path.expanduser("~"), ".cache",
+                                    "StereoCamCheck", "index")
+        return cacheDir or None
+    
+    def OnPause(self, event):
+        """Pause or play file sources. While paused the arrow
+           keys step and seek both eyes together"""
+        if self.seeker is None:
+            return
+        self.seeker.toggle()
+        self.showSeekStatus()
+        self.OnUpdateMenu(None)
+    
+    def onSeek(self):
+        """Seek has finished, or index is ready"""
+        self.scheduler.request()
+        self.showSeekStatus()
+    
+    def seekKey(self, ch, fast):
+        """Space pauses, arrow keys step a frame, or a second
+           with shift, page up and down jump ten seconds, Home
+           and End go to start and end. False if not a seek key"""
+        if ch == wx.WXK_SPACE:
+            self.seeker.toggle()
+        elif ch == wx.WXK_LEFT:
+            if fast:
+                self.seeker.jump(-1.0)
+            else:
+                self.seeker.step(-1)
+        elif ch == wx.WXK_RIGHT:
+            if fast:
+                self.seeker.jump(1.0)
+            else:
+                self.seeker.step(1)
+        elif ch in (wx.WXK_PAGEUP, wx.WXK_PRIOR):
+            self.seeker.jump(-10.0)
+        elif ch in (wx.WXK_PAGEDOWN, wx.WXK_NEXT):
+            self.seeker.jump(10.0)
+        elif ch == wx.WXK_HOME:
+            self.seeker.seekStart()
+        elif ch == wx.WXK_END:
+            self.seeker.seekEnd()
+        else:
+            return False
+        self.showSeekStatus()
+        self.OnUpdateMenu(None)
+        return True
+    
+    def seekText(self):
+        """File position and seek latency as short text"""
+        s = self.seeker.stats()
+        if s["duration"] is not None:
+            text = _("at {0:.2f}/{1:.2f} s").format(s["position"], s["duration"])
+        else:
+            text = _("at {0:.2f} s").format(s["position"])
+        if s["paused"]:
+            text += " " + _("paused")
+        if s["indexing"]:
+            text += " " + _("indexing")
+        elif s["indexTime"] is not None:
+            text += " " + _("{0} keyframes in {1:.0f} ms").format(s["keyframes"], s["indexTime"])
+        if s["latency"] is not None:
+            if s["lastIndexed"]:
+                how = _("indexed")
+            else:
+                how = _("plain")
+            text += " " + _("seek {0:.0f} ms {1}").format(s["latency"], how)
+        for name in ("index", "plain"):
+            if s[name] is not None:
+                text += " " + _("{0} mean {1:.0f} ms").format(name, s[name])
+        return text
+    
+    def showSeekStatus(self):
+        if self.statsTimer:
+            self.window.SetStatusText(self.statusText())
+        elif self.seeker.paused or self.seeker.pending:
+            self.window.SetStatusText(self.seekText())
+    
     def OnShowLeft(self, event):
         """Toggle left eye visibility"""
         if self.left:
             self.left.setVisible(not self.left.visible)
+            self.scheduler.request()
             self.OnUpdateMenu(None)
     
     def OnShowRight(self, event):
         """Toggle right eye"""
         if self.right:
             self.right.setVisible(not self.right.visible)
+            self.scheduler.request()
             self.OnUpdateMenu(None)
     
+    def OnShowStats(self, event):
+        """Toggle stream statistics in status bar"""
+        if self.statsTimer:
+            self.statsTimer.Stop()
+            self.statsTimer = None
+            self.window.SetStatusText(self.savedStatus)
+        else:
+            self.savedStatus = self.window.GetStatusBar().GetStatusText()
+            self.prevStats = {}
+            self.statsTimer = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER, self.OnStatsTimer, self.statsTimer)
+            self.statsTimer.Start(1000)
+        self.OnUpdateMenu(None)
+    
+    def OnStatsTimer(self, event):
+        self.window.SetStatusText(self.statusText())
+    
+    def streamStatus(self, name, stream):
+        """One stream's metrics as short text"""
+        m = stream.metrics()
+        prev = self.prevStats.get(name)
+        self.prevStats[name] = m
+        if prev is None:
+            fps = 0
+            rate = 0
+        else:
+            # Timer is once a second
+            fps = m["uploads"] - prev["uploads"]
+            rate = m["uploadBytes"] - prev["uploadBytes"]
+        text = "{0} {1} fps {2} drop {3:.1f} ms {4:.1f} MB/s".format(
+                name, fps, m["drops"], m["uploadTime"], rate / 1e6)
+        if m["decimation"] > 1:
+            text += " 1/{0}".format(m["decimation"])
+        if m["sinceStartup"] is not None and m["sinceStartup"] < STARTUP_SHOWN:
+            if m["warm"]:
+                text += " " + _("started warm {0:.0f} ms").format(m["startup"])
+            else:
+                text += " " + _("started cold {0:.0f} ms").format(m["startup"])
+        if m["latency"] is not None:
+            text += " " + _("lag {0:.0f} ms").format(m["latency"])
+        if m["dropPolicy"] != DROP_LATEST:
+            text += " q {0}/{1}".format(m["queueDepth"], m["maxQueueDepth"])
+        if m["binned"]:
+            text += " " + _("half")
+        r = m["reconnect"]
+        if m["stale"]:
+            text += " " + _("stale")
+            if r and r["reason"]:
+                text += " ({0})".format(r["reason"])
+        elif m["sinceLastFrame"] is not None and m["sinceLastFrame"] > 1000:
+            text += " " + _("stalled")
+        if r and r["reconnects"] > 0:
+            text += " " + _("reconnects {0} last {1:.0f} ms").format(r["reconnects"], r["outage"])
+        if m["workerCPU"] is not None and prev is not None:
+            # Decoding in own process, so has own CPU use
+            text += " " + _("worker {0:.0f}% cpu").format(
+                    100.0 * (m["workerCPU"] - prev["workerCPU"]))
+        return text
+    
+    def statusText(self):
+        """Stream and repaint statistics for status bar"""
+        parts = []
+        for index, stream in enumerate([self.left, self.right] + self.extra):
+            if stream:
+                parts.append(self.streamStatus(self.streamName(index), stream))
+        if self.pairer and self.pairer.skew() is not None:
+            p = self.pairer.stats()
+            parts.append(_("skew {0:+.1f} ms max {1:.1f} paired {2} late {3}").format(
+                    p["skew"], p["maxSkew"], p["matched"], p["fallbacks"]))
+        if self.replay and self.replay.available():
+            parts.append(self.replayText())
+        if self.seeker:
+            parts.append(self.seekText())
+        parts.append(_("paints {0} skipped {1}").format(
+                self.scheduler.paints, self.scheduler.skipped))
+        if any(stream.worker for stream in self.allStreams()):
+            # Compare with the workers
+            t = os.times()
+            cpu = t[0] + t[1]
+            prev = self.prevStats.get("app")
+            self.prevStats["app"] = cpu
+            if prev is not None:
+                parts.append(_("app {0:.0f}% cpu").format(100.0 * (cpu - prev)))
+        if self.init:
+            g = self.shaders.stats()
+            parts.append(_("shaders {0} compiled {1:.0f} ms {2} cached {3:.0f} ms").format(
+                    g["compiles"], g["compileTime"], g["diskHits"], g["loadTime"]))
+        return " | ".join(parts)
+    
+    def startAnalyzer(self, name, analyzer, formatter):
+        """Run analyzer in background, showing results
+           as text in the status bar"""
+        def onResult(result):
+            # Called on analyzer thread
+            wx.CallAfter(self.showAnalysis, name, formatter(result))
+        analyzer.onResult = onResult
+        self.analyzers[name] = analyzer
+        analyzer.start()
+    
+    def stopAnalyzer(self, name):
+        analyzer = self.analyzers.pop(name, None)
+        if analyzer:
+            analyzer.stop()
+        self.analysisText.pop(name, None)
+        self.showAnalysis(None, None)
+    
+    def showAnalysis(self, name, text):
+        # Window may have gone while result was on the way
+        if not self:
+            return
+        if name in self.analyzers:
+            self.analysisText[name] = text
+        parts = [self.analysisText[k] for k in sorted(self.analysisText.keys())]
+        self.window.SetStatusText(" | ".join(parts), 1)
+    
+    def OnAlignment(self, event):
+        """Toggle live measurement of stereo misalignment"""
+        if "alignment" in self.analyzers:
+            self.stopAnalyzer("alignment")
+        elif self.left and self.right:
+            self.startAnalyzer("alignment",
+                    alignment.AlignmentAnalyzer(self.left, self.right),
+                    alignment.statusText)
+        self.OnUpdateMenu(None)
+    
+    def OnFocus(self, event):
+        """Toggle live measurement of focus for each eye.
+           Shift-drag selects region to measure"""
+        if "focus" in self.analyzers:
+            self.stopAnalyzer("focus")
+        elif self.left:
+            streams = [s for s in (self.left, self.right) if s]
+            analyzer = focus.FocusAnalyzer(streams,
+                    metric=app.config.Read("focusMetric", "laplacian"))
+            analyzer.setRegion(self.focusRegion)
+            self.startAnalyzer("focus", analyzer, focus.statusText)
+        self.OnUpdateMenu(None)
+    
+    def OnExposure(self, event):
+        """Toggle live histogram, clipping and exposure
+           mismatch, drawn over the video"""
+        if "exposure" in self.analyzers:
+            self.stopAnalyzer("exposure")
+            self.scheduler.request()
+        elif self.left:
+            streams = [s for s in (self.left, self.right) if s]
+            self.startAnalyzer("exposure",
+                    exposure.ExposureAnalyzer(streams,
+                        budget=eval(app.config.Read("exposureBudget", "0.005"))),
+                    exposure.statusText)
+        self.OnUpdateMenu(None)
+    
+    def OnDisparity(self, event):
+        """Toggle live parallax map over the left eye, with
+           parallax range and percentiles in the status bar"""
+        if "disparity" in self.analyzers:
+            self.stopAnalyzer("disparity")
+            self.scheduler.request()
+        elif self.left and self.right:
+            self.startAnalyzer("disparity",
+                    disparity.DisparityAnalyzer(self.left, self.right,
+                        budget=eval(app.config.Read("disparityBudget", "0.03")),
+                        searchRange=eval(app.config.Read("disparityRange", "5.0"))),
+                    disparity.statusText)
+        self.OnUpdateMenu(None)
+    
+    def toWorld(self, event):
+        """Mouse position to ortho projection coords"""
+        mx, my = event.GetPosition()
+        aspect = float(self.width) / float(self.height)
+        return (mx / self.width - 0.5) * aspect, 0.5 - my / self.height
+    
+    def regionStream(self, x, y):
+        """Stream under world coords, default left"""
+        if self.right and self.right.visible and self.right.contains(x, y):
+            if not (self.overlaid() and self.left.visible):
+                return self.right
+        return self.left
+    
+    def OnMouseDown(self, event):
+        if not event.ShiftDown() or self.left is None:
+            event.Skip()
+            return
+        self.dragStart = self.toWorld(event)
+        self.dragEnd = self.dragStart
+        self.CaptureMouse()
+    
+    def OnMouseMove(self, event):
+        if self.dragStart is None:
+            event.Skip()
+            return
+        self.dragEnd = self.toWorld(event)
+        self.scheduler.request()
+    
+    def OnMouseUp(self, event):
+        if self.dragStart is None:
+            event.Skip()
+            return
+        if self.HasCapture():
+            self.ReleaseMouse()
+        self.dragEnd = self.toWorld(event)
+        stream = self.regionStream(*self.dragStart)
+        x0, y0 = stream.toImage(*self.dragStart)
+        x1, y1 = stream.toImage(*self.dragEnd)
+        self.dragStart = self.dragEnd = None
+        # Click without drag clears the region
+        if abs(x1 - x0) < 0.02 or abs(y1 - y0) < 0.02:
+            self.focusRegion = None
+        else:
+            self.focusRegion = (min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0))
+        if "focus" in self.analyzers:
+            self.analyzers["focus"].setRegion(self.focusRegion)
+        self.scheduler.request()
+    
     def OnUpdateMenu(self, event):
         """Auto update of menu status"""
         if self.mono:
             self.menu.Enable(MYID_SPLIT, False)
             self.menu.Enable(MYID_BLENDED, False)
             self.menu.Enable(MYID_ANAGLYPH, False)
+            self.menu.Enable(MYID_DIFFERENCE, False)
             self.menu.Enable(MYID_SHOW_LEFT, False)
             self.menu.Enable(MYID_SHOW_RIGHT, False)
+            self.menu.Enable(MYID_ALIGNMENT, False)
+            self.menu.Enable(MYID_DISPARITY, False)
         else:
             self.menu.Enable(MYID_SPLIT, True)
             self.menu.Enable(MYID_BLENDED, True)
             self.menu.Enable(MYID_ANAGLYPH, True)
+            self.menu.Enable(MYID_DIFFERENCE, True)
             self.menu.Enable(MYID_SHOW_LEFT, True)
             self.menu.Enable(MYID_SHOW_RIGHT, True)
+            self.menu.Enable(MYID_ALIGNMENT, True)
+            self.menu.Enable(MYID_DISPARITY, True)
             self.menu.Check(MYID_SPLIT, not self.overlay)
             self.menu.Check(MYID_BLENDED, self.overlay == MYID_BLENDED)
             self.menu.Check(MYID_ANAGLYPH, self.overlay == MYID_ANAGLYPH)
+            self.menu.Check(MYID_DIFFERENCE, self.overlay == MYID_DIFFERENCE)
             self.menu.Check(MYID_SHOW_LEFT, self.left and self.left.visible)
             self.menu.Check(MYID_SHOW_RIGHT, self.right and self.right.visible)
+        self.menu.Check(MYID_GRID, self.overlay == MYID_GRID)
+        self.menu.Check(MYID_SHOW_STATS, self.statsTimer is not None)
+        self.menu.Check(MYID_ALIGNMENT, "alignment" in self.analyzers)
+        self.menu.Check(MYID_FOCUS, "focus" in self.analyzers)
+        self.menu.Check(MYID_EXPOSURE, "exposure" in self.analyzers)
+        self.menu.Check(MYID_DISPARITY, "disparity" in self.analyzers)
+        self.menu.Enable(MYID_REPLAY, self.replay is not None and self.replay.available())
+        self.menu.Check(MYID_REPLAY, self.replay is not None and self.replay.frozen)
+        self.menu.Enable(MYID_PAUSE, self.seeker is not None)
+        self.menu.Check(MYID_PAUSE, self.seeker is not None and self.seeker.paused)
+        for menuID in BAYER_BINNING:
+            self.menu.Check(menuID, self.bayerPreview == menuID)
     
     def key(self, event):
-        """Quit on ESC, others ignored"""
+        """Quit on ESC, arrow keys scrub instant replay or
+           seek files, others ignored"""
         ch = event.GetKeyCode()
         if ch == wx.WXK_ESCAPE:
             if self.prevKey == ch:
                 self.window.Close()
+        elif self.replay and self.replay.frozen and self.scrub(ch, event.ShiftDown()):
+            pass
+        elif self.seeker and self.seekKey(ch, event.ShiftDown()):
+            pass
         else:
             event.Skip()
         self.prevKey = ch
@@ -174,51 +775,106 @@ class StereoFrame(Canvas3D):
         glDisable(GL_DEPTH_TEST)
         glEnableClientState(GL_VERTEX_ARRAY)
         self.initShaders()
+        self.initGeometry()
+    
+    def initGeometry(self):
+        """Everything drawn every paint is in one vertex buffer"""
+        self.geometry = geometry.GeometryBuffer()
+        self.geometry.add("left", GL_TRIANGLE_STRIP, 4)
+        self.geometry.add("right", GL_TRIANGLE_STRIP, 4)
+        self.geometry.add("separator", GL_LINES, 2)
+        self.geometry.set("separator", ((0, -0.5), (0, 0.5)))
+        # Overlay modes draw one quad covering both eyes
+        self.geometry.add("composite", GL_TRIANGLE_STRIP, 4)
+        self.compositeBox = None
+        # Parallax map, over the left eye
+        self.geometry.add("disparity", GL_TRIANGLE_STRIP, 4)
+        self.disparityBox = None
     
     def initShaders(self):
         gpu.init()
-        # Flat shader used for overlays
-        stdVert = gpu.loadShaderFile(GL_VERTEX_SHADER, "std_vert.glsl",
-                ["#version 120"])
-        flatFrag = gpu.loadShaderFile(GL_FRAGMENT_SHADER, "flat_frag.glsl")
-        self.flatShader = gpu.newProgram(stdVert, flatFrag)
-        # The video shaders vary depending on the source
-        # format (Bayer or non) and output (RGB or red-blue)
-        # Could recompile shaders on the fly as the output
-        # changes, but easier to generate all variations here
-        ## RGB shader just uses image as texture
-        rgbFrag = gpu.loadShaderFile(
-                GL_FRAGMENT_SHADER, "video_frag.glsl",
+        # Shaders vary depending on the source format (Bayer
+        # or non) and output (RGB, red-blue, etc). Each variant
+        # is compiled the first time it is drawn with, or
+        # loaded from the binary cache if the driver can.
+        cacheDir = eval(app.config.Read("shaderCache", "None"))
+        if cacheDir is None:
+            cacheDir = os.path.join(os.path.expanduser("~"), ".cache",
+                                    "StereoCamCheck", "shaders")
+        self.shaders = gpu.ProgramCache(cacheDir or None)
+    
+    def overlayShader(self):
+        """Plain texture, for the disparity map"""
+        return self.shaders.program("std_vert.glsl", "rgb_frag.glsl",
+                ["#version 120"], [], self.setImageUnit)
+    
+    def flatShader(self):
+        """Flat shader used for overlays"""
+        return self.shaders.program("std_vert.glsl", "flat_frag.glsl",
                 ["#version 120"])
-        self.rgbVideo = gpu.newProgram(stdVert, rgbFrag)
-        h = gpu.getUniform(self.rgbVideo, "image")
+    
+    def videoShader(self, bayer, anaglyph=False, binned=False):
+        """Video shader variant"""
+        defs = ["#version 120"]
+        if bayer:
+            defs.append("#define DEBAYER")
+            if binned:
+                defs.append("#define BINNED")
+        if anaglyph:
+            defs.append("#define ANAGLYPH")
+        return self.shaders.program("std_vert.glsl",
+                self.fragFiles("video_frag.glsl", bayer),
+                defs, defs, self.setImageUnit)
+    
+    def compositeShader(self, bayerLeft, bayerRight, mode, binned=False):
+        """Shader that samples both eyes in one pass. mode
+           is BLEND, ANAGLYPH or DIFFERENCE. Either eye can
+           be Bayer without the other"""
+        defs = ["#version 120", "#define " + mode]
+        if bayerLeft:
+            defs.append("#define DEBAYER_LEFT")
+        if bayerRight:
+            defs.append("#define DEBAYER_RIGHT")
+        if (bayerLeft or bayerRight) and binned:
+            defs.append("#define BINNED")
+        return self.shaders.program("composite_vert.glsl",
+                self.fragFiles("composite_frag.glsl", bayerLeft or bayerRight),
+                ["#version 120"], defs, self.setCompositeUnits)
+    
+    def fragFiles(self, fileName, bayer):
+        """Bayer variants need the demosaic function first"""
+        if bayer:
+            return ("bayer_frag.glsl", fileName)
+        return fileName
+    
+    def setImageUnit(self, prog):
+        h = gpu.getUniform(prog, "image")
         glUniform1i(h, 0)   # Always GL_TEXTURE0
-        # RGB anaglyph shader
-        rgbAnaglyphFrag = gpu.loadShaderFile(
-                GL_FRAGMENT_SHADER, "video_frag.glsl",
-                ["#version 120", "#define ANAGLYPH"])
-        self.rgbAnaglyphVideo = gpu.newProgram(stdVert, rgbAnaglyphFrag)
-        h = gpu.getUniform(self.rgbAnaglyphVideo, "image")
-        glUniform1i(h, 0)
-        ## Bayer demosaic versions
-        bayerVert = gpu.loadShaderFile(GL_VERTEX_SHADER, "std_vert.glsl",
-                ["#version 120", "#define DEBAYER"])
-        bayerFrag = gpu.loadShaderFile(
-                GL_FRAGMENT_SHADER, "video_frag.glsl",
-                ["#version 120", "#define DEBAYER"])
-        self.bayerVideo = gpu.newProgram(bayerVert, bayerFrag)
-        h = gpu.getUniform(self.bayerVideo, "image")
-        glUniform1i(h, 0)
-        bayerAnaglyphFrag = gpu.loadShaderFile(
-                GL_FRAGMENT_SHADER, "video_frag.glsl",
-                ["#version 120", "#define DEBAYER", "#define ANAGLYPH"])
-        self.bayerAnaglyphVideo = gpu.newProgram(bayerVert, bayerAnaglyphFrag)
-        h = gpu.getUniform(self.bayerAnaglyphVideo, "image")
-        glUniform1i(h, 0)
+    
+    def gridShader(self, bayer, binned=False):
+        """Shader that draws up to GRID_CELLS streams in one pass"""
+        defs = ["#version 120"]
+        if bayer:
+            defs.append("#define DEBAYER")
+            if binned:
+                defs.append("#define BINNED")
+        return self.shaders.program("grid_vert.glsl",
+                self.fragFiles("grid_frag.glsl", bayer),
+                ["#version 120"], defs, self.setGridUnits)
+    
+    def setGridUnits(self, prog):
+        for unit in range(GRID_CELLS):
+            glUniform1i(gpu.getUniform(prog, "image" + str(unit)), unit)
+    
+    def setCompositeUnits(self, prog):
+        glUniform1i(gpu.getUniform(prog, "leftImage"), 0)
+        glUniform1i(gpu.getUniform(prog, "rightImage"), 1)
     
     def positionStreams(self, force=False):
         """Position streams within window according to display option"""
-        if self.overlay == 0:
+        if self.overlay == MYID_GRID:
+            self.positionGrid(force)
+        elif self.overlay == 0:
             # Side by side mode
             maxFrac = 0.5
             if self.left:
@@ -226,13 +882,28 @@ class StereoFrame(Canvas3D):
             if self.right:
                 self.right.place(0.0, -0.5, self, force, maxFrac)
         else:
-            # Overlay blended/anaglyph
+            # Overlay blended/anaglyph/difference
             maxFrac = 1.0
             if self.left:
                 self.left.place(-0.5, -0.5, self, force, maxFrac)
             if self.right:
                 self.right.place(-0.5, -0.5, self, force, maxFrac)
+        self.scheduler.request()
         
+    def positionGrid(self, force=False):
+        """As near square a grid as possible, each stream
+           centred in its cell"""
+        streams = self.allStreams()
+        if not streams:
+            return
+        cols = int(math.ceil(math.sqrt(len(streams))))
+        rows = int(math.ceil(len(streams) / cols))
+        aspect = self.width / self.height if self.height > 0 else 1.0
+        for index, stream in enumerate(streams):
+            row, col = divmod(index, cols)
+            centre = (((col + 0.5) / cols - 0.5) * aspect, 0.5 - (row + 0.5) / rows)
+            stream.place(-0.5, -0.5, self, force, 1.0 / cols, 1.0 / rows, centre)
+    
     def setProjection(self):
         """Version 1.4 is back to ortho. Using pixel coordinates
            does something odd with texture coordinate generation
@@ -246,77 +917,275 @@ class StereoFrame(Canvas3D):
     def setViewpoint(self):
         glLoadIdentity()
     
+    def OnPaint(self, event):
+        Canvas3D.OnPaint(self, event)
+        self.scheduler.painted()
+        # Keep going until any slide animation is finished
+        for stream in self.allStreams():
+            if stream.animating:
+                self.scheduler.request()
+                break
+    
     def drawSingleStream(self):
         """Draw a single non-stereo stream"""
-        if self.left.bayer:
-            gpu.useProgram(self.bayerVideo)
-        else:
-            gpu.useProgram(self.rgbVideo)
+        gpu.useProgram(self.videoShader(self.left.bayer, binned=self.left.binned()))
         glDisable(GL_BLEND)
-        self.left.draw()
+        self.left.draw(self.geometry, "left")
     
     def drawSideBySide(self):
         """Side by side view of stereo stream pair"""
-        if self.left.bayer or self.right.bayer:
-            gpu.useProgram(self.bayerVideo)
-        else:
-            gpu.useProgram(self.rgbVideo)
         glDisable(GL_BLEND)
-        self.left.draw()
-        self.right.draw()
+        # Each eye can be full or half resolution Bayer
+        for stream, shape in ((self.left, "left"), (self.right, "right")):
+            gpu.useProgram(self.videoShader(stream.bayer, binned=stream.binned()))
+            stream.draw(self.geometry, shape)
         # Separator
-        gpu.useProgram(self.flatShader)
-        glEnableClientState(GL_COLOR_ARRAY)
-        glVertexPointer(2, GL_FLOAT, 0,
-                ((0, -0.5),(0, 0.5)))
-        glColorPointer(3, GL_FLOAT, 0,
-                (self.bkColor, self.bkColor))
-        glDrawArrays(GL_LINES, 0, 2)
-        glDisableClientState(GL_COLOR_ARRAY)
+        gpu.useProgram(self.flatShader())
+        glColor3f(*self.bkColor)
+        self.geometry.draw("separator")
     
-    def drawBlendedStreams(self):
-        """Stream pair each at 50% opacity"""
-        if self.left.bayer or self.right.bayer:
-            gpu.useProgram(self.bayerVideo)
-        else:
-            gpu.useProgram(self.rgbVideo)
-        if self.left.visible and self.right.visible:
-            opacity = 0.5
-        else:
-            opacity = 1.0
-        glEnable(GL_BLEND)
-        glBlendColor(1.0, 1.0, 1.0, opacity)
-        glBlendFunc(GL_CONSTANT_ALPHA, GL_ZERO)
-        self.left.draw()
-        glBlendColor(1.0, 1.0, 1.0, opacity)
-        glBlendFunc(GL_CONSTANT_ALPHA, GL_ONE)
-        self.right.draw()
-    
-    def drawRedBlueStreams(self):
-        """Red-blue stereo view of grayscale"""
-        if self.left.bayer or self.right.bayer:
-            gpu.useProgram(self.bayerAnaglyphVideo)
+    def shownStreams(self):
+        """Streams with something to draw"""
+        return [s for s in (self.left, self.right) if s and s.live and s.visible]
+    
+    def updateComposite(self, shown):
+        """Composite quad covers all shown eyes. Call before
+           geometry.begin"""
+        x0 = min(s.box.x for s in shown)
+        y0 = min(s.box.y for s in shown)
+        x1 = max(s.box.x + s.box.w for s in shown)
+        y1 = max(s.box.y + s.box.h for s in shown)
+        box = (x0, y0, x1 - x0, y1 - y0)
+        if box != self.compositeBox:
+            self.geometry.setQuad("composite", *box)
+            self.compositeBox = box
+    
+    def drawComposite(self, mode):
+        """Both eyes in a single pass, instead of two quads with
+           blending or color masks, which for Bayer sources
+           means every texel fetched twice as often"""
+        shown = self.shownStreams()
+        if not shown:
+            return
+        bayer = [s for s in shown if s.bayer]
+        binned = len(bayer) > 0 and all(s.binned() for s in bayer)
+        prog = self.compositeShader(self.left.bayer, self.right.bayer, mode, binned)
+        gpu.useProgram(prog)
+        glDisable(GL_BLEND)
+        # Blend halves, others keep full intensity
+        if mode == "BLEND" and len(shown) == 2:
+            full = 0.5
         else:
-            gpu.useProgram(self.rgbAnaglyphVideo)
+            full = 1.0
+        for stream, unit, suffix in ((self.right, 1, "Right"), (self.left, 0, "Left")):
+            if stream in shown:
+                stream.bind(unit, suffix)
+                b = stream.box
+                glUniform4f(gpu.getUniform(prog, suffix.lower() + "Box"), b.x, b.y, b.w, b.h)
+            else:
+                glUniform4f(gpu.getUniform(prog, suffix.lower() + "Box"), 0, 0, 1, 1)
+        glUniform2f(gpu.getUniform(prog, "eyeWeights"),
+                full if self.left in shown else 0.0,
+                full if self.right in shown else 0.0)
+        self.geometry.draw("composite")
+    
+    def drawGrid(self):
+        """All streams, one draw call per GRID_CELLS of them.
+           The quad covers every stream, and the shader picks
+           the texture for each pixel by which box it is in"""
+        shown = [s for s in self.allStreams() if s.live and s.visible]
         glDisable(GL_BLEND)
-        glColorMask(GL_TRUE, GL_FALSE, GL_FALSE, GL_FALSE)
-        self.left.draw()
-        glColorMask(GL_FALSE, GL_TRUE, GL_TRUE, GL_FALSE)
-        self.right.draw()
-        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+        for first in range(0, len(shown), GRID_CELLS):
+            batch = shown[first:first + GRID_CELLS]
+            bayer = [s for s in batch if s.bayer]
+            binned = len(bayer) > 0 and all(s.binned() for s in bayer)
+            prog = self.gridShader(len(bayer) > 0, binned)
+            gpu.useProgram(prog)
+            for cell in range(GRID_CELLS):
+                h = gpu.getUniform(prog, "box[{0}]".format(cell))
+                if cell >= len(batch):
+                    glUniform4f(h, 0, 0, 0, 0)
+                    continue
+                stream = batch[cell]
+                b = stream.box
+                glUniform4f(h, b.x, b.y, b.w, b.h)
+                suffix = "[{0}]".format(cell)
+                if bayer:
+                    glUniform1f(gpu.getUniform(prog, "bayerCell" + suffix),
+                                1.0 if stream.bayer else 0.0)
+                    # Cells are shared between batches, so always
+                    stream.configShader(suffix)
+                stream.bind(cell, suffix)
+            self.geometry.draw("composite")
+        glActiveTexture(GL_TEXTURE0)
     
     def drawWorld(self):
-        if self.left is None and self.right is None:
+        streams = self.allStreams()
+        if not streams:
             return
+        # Layout changes go to the vertex buffer before drawing
+        for index, stream in enumerate([self.left, self.right] + self.extra):
+            if stream:
+                shape = self.streamShape(index)
+                if shape not in self.geometry.shapes:
+                    self.geometry.add(shape, GL_TRIANGLE_STRIP, 4)
+                stream.updateGeometry(self.geometry, shape)
+        if self.overlay == MYID_GRID:
+            shown = [s for s in streams if s.live and s.visible]
+            if shown:
+                self.updateComposite(shown)
+        elif self.overlay and not self.mono:
+            shown = self.shownStreams()
+            if shown:
+                self.updateComposite(shown)
+        showDisparity = self.updateDisparity()
+        self.geometry.begin()
+        glEnable(GL_TEXTURE_2D)
+        glTexEnvf(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
         # There's a bunch of different ways to draw the stream(s)
-        if self.mono:
+        if self.overlay == MYID_GRID:
+            self.drawGrid()
+        elif self.mono:
             self.drawSingleStream()
         elif not self.overlay:
             self.drawSideBySide()
         elif self.overlay == MYID_BLENDED:
-            self.drawBlendedStreams()
+            self.drawComposite("BLEND")
         elif self.overlay == MYID_ANAGLYPH:
-            self.drawRedBlueStreams()
+            self.drawComposite("ANAGLYPH")
+        elif self.overlay == MYID_DIFFERENCE:
+            self.drawComposite("DIFFERENCE")
+        if showDisparity:
+            self.drawDisparity()
+        glDisable(GL_TEXTURE_2D)
+        self.geometry.end()
+        self.drawFocusRegion()
+        self.drawExposure()
+        self.drawStaleBadges()
+    
+    def updateDisparity(self):
+        """Upload any new parallax map to its texture, and move
+           its quad to the left eye. Call before geometry.begin.
+           True if there is a map to draw"""
+        analyzer = self.analyzers.get("disparity")
+        if analyzer is None or analyzer.result is None:
+            return False
+        if not (self.left.live and self.left.visible):
+            return False
+        result = analyzer.result
+        if result is not self.disparityResult:
+            rgba = result["overlay"]
+            if self.disparityTex is None:
+                self.disparityTex = glGenTextures(1)
+                glBindTexture(GL_TEXTURE_2D, self.disparityTex)
+                # Blocky is more honest than smoothed
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            else:
+                glBindTexture(GL_TEXTURE_2D, self.disparityTex)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, rgba.shape[1], rgba.shape[0], 0,
+                         GL_RGBA, GL_UNSIGNED_BYTE, rgba)
+            self.disparityResult = result
+        b = self.left.box
+        box = (b.x, b.y, b.w, b.h)
+        if box != self.disparityBox:
+            self.geometry.setQuad("disparity", *box)
+            self.disparityBox = box
+        return True
+    
+    def drawDisparity(self):
+        """Parallax map blended over left eye"""
+        gpu.useProgram(self.overlayShader())
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.disparityTex)
+        self.geometry.draw("disparity")
+        glDisable(GL_BLEND)
+    
+    def drawOutline(self, x0, y0, x1, y1, color):
+        gpu.useProgram(self.flatShader())
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0,
+                ((x0, y0), (x1, y0), (x1, y1), (x0, y1)))
+        glColorPointer(3, GL_FLOAT, 0, (color,) * 4)
+        glDrawArrays(GL_LINE_LOOP, 0, 4)
+        glDisableClientState(GL_COLOR_ARRAY)
     
+    def drawFocusRegion(self):
+        """Outline focus region on each eye, or drag in progress"""
+        glDisable(GL_BLEND)
+        if self.dragStart is not None:
+            self.drawOutline(self.dragStart[0], self.dragStart[1],
+                             self.dragEnd[0], self.dragEnd[1], (1.0, 1.0, 0.0))
+        elif self.focusRegion is not None and "focus" in self.analyzers:
+            x, y, w, h = self.focusRegion
+            for stream in (self.left, self.right):
+                if stream and stream.live and stream.visible:
+                    x0, y0 = stream.fromImage(x, y)
+                    x1, y1 = stream.fromImage(x + w, y + h)
+                    self.drawOutline(x0, y0, x1, y1, (1.0, 1.0, 0.0))
     
+    def drawExposure(self):
+        """Luminance histograms in a small panel at bottom left
+           of each eye, or one panel with both if overlaid"""
+        analyzer = self.analyzers.get("exposure")
+        if analyzer is None or analyzer.result is None:
+            return
+        result = analyzer.result
+        hists = result["histograms"]
+        streams = [self.left, self.right][:len(hists)]
+        panels = []
+        for eye, stream in enumerate(streams):
+            if not (stream and stream.live and stream.visible):
+                continue
+            if panels and self.overlaid():
+                panels[0][1].append(eye)
+            else:
+                panels.append((stream.box, [eye]))
+        peak = max([h.max() for h in hists] + [1e-6])
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        gpu.useProgram(self.flatShader())
+        for box, eyes in panels:
+            x0 = box.x + box.w * 0.02
+            y0 = box.y + box.h * 0.02
+            w = box.w * 0.3
+            h = box.h * 0.2
+            glColor4f(0.0, 0.0, 0.0, 0.5)
+            glVertexPointer(2, GL_FLOAT, 0, ((x0, y0), (x0 + w, y0), (x0, y0 + h), (x0 + w, y0 + h)))
+            glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+            for eye in eyes:
+                n = len(hists[eye])
+                glColor4f(*(HISTOGRAM_COLORS[eye] + (1.0,)))
+                glVertexPointer(2, GL_FLOAT, 0,
+                        [(x0 + w * i / (n - 1), y0 + h * hists[eye][i] / peak) for i in range(n)])
+                glDrawArrays(GL_LINE_STRIP, 0, n)
+                # Clipping as bars at the ends, full height is 10%
+                bars = []
+                for x, clip in ((x0, result["clipLow"][eye]), (x0 + w, result["clipHigh"][eye])):
+                    if clip >= exposure.CLIP_WARN:
+                        bars.extend(((x, y0), (x, y0 + h * min(clip / 10.0, 1.0))))
+                if bars:
+                    glVertexPointer(2, GL_FLOAT, 0, bars)
+                    glDrawArrays(GL_LINES, 0, len(bars))
+        glDisable(GL_BLEND)
     
+    def drawStaleBadges(self):
+        """Outline, and a filled corner, on any stream showing
+           an old frame while its source reconnects"""
+        glDisable(GL_BLEND)
+        for stream in self.allStreams():
+            if not (stream.live and stream.visible and stream.stale):
+                continue
+            b = stream.box
+            self.drawOutline(b.x, b.y, b.x + b.w, b.y + b.h, STALE_COLOR)
+            size = b.h * 0.06
+            x1 = b.x + b.w
+            y1 = b.y + b.h
+            glColor3f(*STALE_COLOR)
+            glVertexPointer(2, GL_FLOAT, 0,
+                    ((x1 - size, y1 - size), (x1, y1 - size), (x1 - size, y1), (x1, y1)))
+            glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
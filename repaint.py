@@ -0,0 +1,86 @@
+
+#       Repaint scheduling for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Instead of redrawing at a fixed 60 Hz forever, the
+#       canvas asks for a repaint only when something has
+#       changed: a texture sink has uploaded a new frame or
+#       a video texture is still sliding into place. Requests
+#       that arrive while a repaint is already pending, or
+#       sooner than the maximum rate allows, are merged into
+#       the pending one and counted as skipped.
+
+from __future__ import division, print_function
+
+import time
+
+import wx
+
+
+class RepaintScheduler(object):
+    """Coalesce repaint requests for a wx window, limited
+       to maxRate paints per second"""
+
+    # If a pending paint never happens (window hidden, etc)
+    # stop waiting for it after this many seconds
+    STALE = 1.0
+
+    def __init__(self, window, maxRate=60):
+        self.window   = window
+        self.setMaxRate(maxRate)
+        self.pending  = False
+        self.pendingSince = 0.0
+        self.lastPaint = 0.0
+        self.timer    = None
+        # Stats
+        self.requests = 0
+        self.paints   = 0
+        self.skipped  = 0
+
+    def setMaxRate(self, maxRate):
+        """Maximum paints/sec, zero or less for unlimited"""
+        self.maxRate = maxRate
+        if maxRate > 0:
+            self.minInterval = 1.0 / maxRate
+        else:
+            self.minInterval = 0.0
+
+    def request(self):
+        """Something has changed and needs to be redrawn"""
+        self.requests += 1
+        now = time.time()
+        if self.pending and now - self.pendingSince < self.STALE:
+            self.skipped += 1
+            return
+        self.pending = True
+        self.pendingSince = now
+        delay = self.minInterval - (now - self.lastPaint)
+        if delay <= 0:
+            self.window.Refresh(False)
+        else:
+            self.timer = wx.CallLater(max(1, int(delay * 1000)), self.fire)
+
+    def fire(self):
+        """Delayed repaint, if window still around"""
+        self.timer = None
+        if self.window:
+            self.window.Refresh(False)
+
+    def painted(self):
+        """Window must call this at end of every paint"""
+        self.pending  = False
+        self.lastPaint = time.time()
+        self.paints  += 1
+
+    def stop(self):
+        if self.timer:
+            self.timer.Stop()
+            self.timer = None
+
+    def stats(self):
+        """Return dict of counters"""
+        return { "requests": self.requests,
+                 "paints":   self.paints,
+                 "skipped":  self.skipped,
+                 "maxRate":  self.maxRate }
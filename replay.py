@@ -0,0 +1,394 @@
+#       Instant replay for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Once a live frame has been decoded and uploaded it is
+#       gone, which is no help when something looked wrong
+#       during a take. A ReplayRing sits on the output of the
+#       JPEG depayloader (or the input of the JPEG decoder, for
+#       other sources) and keeps the still compressed frames,
+#       which are a small fraction of the size of decoded ones.
+#       The ring is bounded by both time and memory, the oldest
+#       frames going first. Like analysis.FrameTap it is just a
+#       buffer probe, so the only work on the streaming thread
+#       is keeping a reference to the buffer.
+#
+#       While frozen, recording stops and the rings can be
+#       scrubbed. Only the frames actually shown are decoded,
+#       by pushing them through a small pipeline made from the
+#       rest of the eye's chain and a second gltexturesink with
+#       its own texture. The live textures keep updating
+#       underneath, so going back to live is instant.
+
+from __future__ import division, print_function
+
+import threading, time, collections, bisect
+
+import pygst
+pygst.require("0.10")
+import gst
+import gobject
+
+import OpenGL
+from OpenGL.GL import *
+
+import app
+
+
+# Where compressed frames can be found: element, and which
+# of its pads. First match wins
+TAP_ELEMENTS = (("rtpjpegdepay", "src"), ("jpegdec", "sink"))
+
+# Decode times to average
+DECODE_HISTORY = 32
+
+# A frame that hasn't reached the sink after this many seconds
+# never will: the decoder dropped it. Checked every CHECK_MS
+DECODE_TIMEOUT = 1.0
+CHECK_MS = 250
+
+def decodeChain(pipeline):
+    """The part of pipeline string that turns compressed frames
+       from the tap into video, without queues. None if there's
+       no tap element"""
+    components = [c.strip() for c in pipeline.split('!')]
+    names = [c.split()[0] if c else "" for c in components]
+    if "rtpjpegdepay" in names:
+        rest = components[names.index("rtpjpegdepay") + 1:]
+    elif "jpegdec" in names:
+        rest = components[names.index("jpegdec"):]
+    else:
+        return None
+    rest = [c for c in rest if c and c.split()[0] != "queue"]
+    if not rest:
+        return None
+    return " ! ".join(rest)
+
+def findTap(stream):
+    """Return pad of element in video texture pipeline that
+       carries compressed frames, or None"""
+    if not isinstance(stream.stream, gst.Bin):
+        return None
+    elements = list(stream.stream.recurse())
+    for factory, padName in TAP_ELEMENTS:
+        for e in elements:
+            if e.get_factory().get_name() == factory:
+                return e.get_pad(padName)
+    return None
+
+
+class ReplayRing(object):
+    """Compressed frames from one eye, oldest first, at most
+       maxBytes and maxSeconds worth"""
+
+    def __init__(self, stream, pad, chain, maxBytes, maxSeconds):
+        self.stream = stream
+        self.chain  = chain
+        self.maxBytes   = maxBytes
+        self.maxSeconds = maxSeconds
+        self.lock   = threading.Lock()
+        # (arrival time, buffer). Arrival time is used rather than
+        # buffer timestamps so eyes in different pipelines match
+        self.frames = collections.deque()
+        self.bytes  = 0
+        self.recording = True
+        self.removed = False
+        self.pad    = pad
+        self.probe  = self.pad.add_buffer_probe(self.onBuffer)
+
+    def onBuffer(self, pad, buf):
+        # Streaming thread. Buffers are never written to once
+        # pushed downstream, so a reference is enough
+        if not self.recording:
+            return True
+        now = time.time()
+        self.lock.acquire()
+        self.frames.append((now, buf))
+        self.bytes += buf.size
+        # Always keep the newest, even if it's over the limit
+        while len(self.frames) > 1 and (self.bytes > self.maxBytes or
+                                        now - self.frames[0][0] > self.maxSeconds):
+            t, old = self.frames.popleft()
+            self.bytes -= old.size
+        self.lock.release()
+        return True
+
+    def retap(self):
+        """Source chain has been rebuilt, probe the new one"""
+        if self.removed:
+            return
+        if self.probe is not None:
+            self.pad.remove_buffer_probe(self.probe)
+            self.probe = None
+        pad = findTap(self.stream)
+        if pad is not None:
+            self.pad = pad
+            self.probe = self.pad.add_buffer_probe(self.onBuffer)
+
+    def snapshot(self):
+        """Return list of (time, buffer), oldest first"""
+        self.lock.acquire()
+        result = list(self.frames)
+        self.lock.release()
+        return result
+
+    def caps(self):
+        return self.pad.get_negotiated_caps()
+
+    def stats(self):
+        self.lock.acquire()
+        if self.frames:
+            span = self.frames[-1][0] - self.frames[0][0]
+        else:
+            span = 0.0
+        result = (self.bytes, len(self.frames), span)
+        self.lock.release()
+        return result
+
+    def remove(self):
+        self.removed = True
+        if self.probe is not None:
+            self.pad.remove_buffer_probe(self.probe)
+            self.probe = None
+        self.lock.acquire()
+        self.frames.clear()
+        self.bytes = 0
+        self.lock.release()
+
+
+class ReplayDecoder(object):
+    """Decodes single compressed frames on demand into a
+       texture of its own. Needs the GL context current"""
+
+    def __init__(self, ring, onUpdate=None):
+        self.texID = glGenTextures(1)
+        self.pipeline = gst.parse_launch("appsrc name=replaysrc ! " + ring.chain +
+                                         " ! gltexturesink name=replaysink")
+        self.src = self.pipeline.get_by_name("replaysrc")
+        self.src.set_property("caps", ring.caps())
+        self.sink = self.pipeline.get_by_name("replaysink")
+        self.sink.set_property("texture", self.texID)
+        # Frames are old, no point waiting for the clock
+        self.sink.set_property("sync", False)
+        # Same upload size as the live texture, so the eye's
+        # shader uniforms still apply
+        live = ring.stream.sink
+        for name in ("use_pbo", "target_width", "target_height"):
+            self.sink.set_property(name, live.get_property(name))
+        if onUpdate:
+            self.sink.connect("texture-updated", lambda sink: onUpdate())
+        # Time decoding by when the frame reaches the sink
+        self.lock = threading.Lock()
+        self.pushTime = None
+        self.wanted   = None
+        self.decodeTimes = collections.deque(maxlen=DECODE_HISTORY)
+        self.decoded  = 0
+        self.lost     = 0
+        self.sink.get_pad("sink").add_buffer_probe(self.onDecoded)
+        # A frame that never arrives must not stop scrubbing
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        self.handler = bus.connect("message::error", self.onError)
+        self.timer = gobject.timeout_add(CHECK_MS, self.check)
+        self.pipeline.set_state(gst.STATE_PLAYING)
+
+    def show(self, buf):
+        """Decode buf into texture. If still busy with the last
+           one, only the most recent request is decoded next"""
+        self.lock.acquire()
+        if self.pushTime is None:
+            self.pushTime = time.time()
+            self.lock.release()
+            self.src.emit("push-buffer", buf)
+        else:
+            self.wanted = buf
+            self.lock.release()
+
+    def onDecoded(self, pad, buf):
+        # Streaming thread
+        now = time.time()
+        self.lock.acquire()
+        if self.pushTime is not None:
+            self.decodeTimes.append(now - self.pushTime)
+            self.decoded += 1
+        buf, self.wanted = self.wanted, None
+        self.pushTime = now if buf is not None else None
+        self.lock.release()
+        if buf is not None:
+            self.src.emit("push-buffer", buf)
+        return True
+
+    def pushNext(self):
+        """Give up on the frame being decoded and push the most
+           recent request, if any"""
+        self.lock.acquire()
+        if self.pushTime is not None:
+            self.lost += 1
+        buf, self.wanted = self.wanted, None
+        self.pushTime = time.time() if buf is not None else None
+        self.lock.release()
+        if buf is not None:
+            self.src.emit("push-buffer", buf)
+
+    def check(self):
+        self.lock.acquire()
+        late = self.pushTime is not None and time.time() - self.pushTime > DECODE_TIMEOUT
+        self.lock.release()
+        if late:
+            self.pushNext()
+        return True
+
+    def onError(self, bus, message):
+        # Corrupt frame. Restart so the next one can get through
+        self.pipeline.set_state(gst.STATE_READY)
+        self.pipeline.set_state(gst.STATE_PLAYING)
+        self.pushNext()
+
+    def decodeTime(self):
+        """Mean recent decode time, milliseconds, or None"""
+        self.lock.acquire()
+        times = list(self.decodeTimes)
+        self.lock.release()
+        if not times:
+            return None
+        return sum(times) / len(times) * 1000.0
+
+    def stop(self):
+        """Shut down and delete texture. Needs GL context"""
+        gobject.source_remove(self.timer)
+        bus = self.pipeline.get_bus()
+        bus.disconnect(self.handler)
+        bus.remove_signal_watch()
+        self.pipeline.set_state(gst.STATE_NULL)
+        glDeleteTextures([self.texID])
+        self.texID = None
+
+
+class InstantReplay(object):
+    """Replay rings for a set of video textures. Eyes without
+       compressed frames to record just stay live"""
+
+    def __init__(self, streams):
+        maxBytes = eval(app.config.Read("replayMB", "64")) * 1e6
+        maxSeconds = eval(app.config.Read("replaySeconds", "10"))
+        self.streams = streams
+        self.rings = []
+        for stream in streams:
+            pad = findTap(stream)
+            chain = decodeChain(stream.description)
+            if pad is not None and chain is not None and maxBytes > 0 and maxSeconds > 0:
+                ring = ReplayRing(stream, pad, chain, maxBytes, maxSeconds)
+                stream.setSourceCallback(ring.retap)
+                self.rings.append(ring)
+        self.decoders = []
+        self.frozen   = False
+        self.frames   = []      # Snapshot of each ring
+        self.position = 0       # Index into first ring frames
+
+    def available(self):
+        return len(self.rings) > 0
+
+    def freeze(self, onUpdate=None):
+        """Stop recording and show the latest frames. onUpdate()
+           is called from the main loop when one is on screen.
+           Needs the GL context current"""
+        if self.frozen or not self.available():
+            return False
+        for ring in self.rings:
+            ring.recording = False
+        self.frames = [ring.snapshot() for ring in self.rings]
+        if not self.frames[0]:
+            for ring in self.rings:
+                ring.recording = True
+            return False
+        for ring in self.rings:
+            decoder = ReplayDecoder(ring, onUpdate)
+            ring.stream.showTexture(decoder.texID)
+            self.decoders.append(decoder)
+        self.frozen = True
+        self.position = len(self.frames[0]) - 1
+        self.show()
+        return True
+
+    def resume(self):
+        """Back to live video. Needs the GL context current"""
+        if not self.frozen:
+            return
+        for ring, decoder in zip(self.rings, self.decoders):
+            ring.stream.showTexture(None)
+            decoder.stop()
+        self.decoders = []
+        self.frames = []
+        self.frozen = False
+        for ring in self.rings:
+            ring.recording = True
+
+    def show(self):
+        """Decode frames for current position. Other eyes show
+           the frame closest in time to the first"""
+        t = self.frames[0][self.position][0]
+        for frames, decoder in zip(self.frames, self.decoders):
+            if not frames:
+                continue
+            times = [f[0] for f in frames]
+            i = bisect.bisect_left(times, t)
+            if i == len(times) or (i > 0 and t - times[i - 1] < times[i] - t):
+                i -= 1
+            decoder.show(frames[i][1])
+
+    def step(self, count):
+        """Move count frames, negative is back in time"""
+        if not self.frozen:
+            return
+        position = min(max(self.position + count, 0), len(self.frames[0]) - 1)
+        if position != self.position:
+            self.position = position
+            self.show()
+
+    def seek(self, seconds):
+        """Move by time rather than frames"""
+        if not self.frozen:
+            return
+        frames = self.frames[0]
+        times = [f[0] for f in frames]
+        t = frames[self.position][0] + seconds
+        position = min(max(bisect.bisect_left(times, t), 0), len(frames) - 1)
+        if position != self.position:
+            self.position = position
+            self.show()
+
+    def stats(self):
+        """Dict of memory use and, when frozen, position and
+           decode cost. Times in milliseconds"""
+        totalBytes = 0
+        count = 0
+        span = 0.0
+        for ring in self.rings:
+            b, n, s = ring.stats()
+            totalBytes += b
+            count += n
+            span = max(span, s)
+        result = {
+            "bytes":    totalBytes,
+            "frames":   count,
+            "seconds":  span,
+            "frozen":   self.frozen,
+        }
+        if self.frozen:
+            frames = self.frames[0]
+            times = [d.decodeTime() for d in self.decoders]
+            times = [t for t in times if t is not None]
+            result["position"] = self.position
+            result["length"]   = len(frames)
+            result["offset"]   = frames[self.position][0] - frames[-1][0]
+            result["decodeTime"] = sum(times) / len(times) if times else None
+            result["decoded"]  = sum(d.decoded for d in self.decoders)
+            result["lost"]     = sum(d.lost for d in self.decoders)
+        return result
+
+    def stop(self):
+        """Remove probes and free frames. Needs GL context if frozen"""
+        self.resume()
+        for ring in self.rings:
+            ring.remove()
+        self.rings = []
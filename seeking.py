@@ -0,0 +1,461 @@
+#       Seeking and stepping file sources for stereo camera preview
+#       Written by StereoCamCheck contributors, 2026
+#       Distributed under MIT/X11 license: see file COPYING
+
+#       Recorded files used to just play from start to end.
+#       To look at one moment in both eyes they have to be
+#       paused and moved to the same timestamp together, a
+#       frame at a time or in bigger jumps. An exact (accurate)
+#       seek means decoding forward from the keyframe before
+#       the target, for long GOP video up to a second's worth
+#       per eye, and some demuxers have to search the file for
+#       that keyframe first.
+#
+#       So each file gets an index of its keyframe timestamps
+#       and byte offsets, built once by demuxing it in the
+#       background without decoding anything, and cached on
+#       disk. A cached index is only used if the file size and
+#       modification time still match. Jumps snap to a keyframe
+#       of the first eye, and a pipeline where every eye has a
+#       keyframe at that time gets a cheap keyframe seek. Frame
+#       steps are exact, but cheap too where every frame is a
+#       keyframe (MJPEG, as the Elphels record).
+#
+#       Seek latency, from the seek to every eye showing its
+#       new frame, is kept separately for seeks with and
+#       without the index so they can be compared.
+
+from __future__ import division, print_function
+
+import os, time, json, bisect, hashlib, tempfile, collections
+
+import pygst
+pygst.require("0.10")
+import gst
+import gobject
+
+# Bump if what's saved in the index changes
+INDEX_VERSION = 1
+# Seek latencies to average
+LATENCY_HISTORY = 32
+# Frame intervals used to estimate frame duration
+INTERVAL_SAMPLES = 1000
+# If the frame rate isn't known
+DEFAULT_FRAME = gst.SECOND // 25
+
+
+def seekable(stream):
+    """Can video texture be paused and moved around? Only
+       files through decodebin, not live or still images"""
+    d = stream.description
+    return not stream.liveSource and "filesrc" in d and "decodebin" in d
+
+
+class KeyframeIndex(object):
+    """Keyframe times and byte offsets of the first video
+       stream in a file. Times are nanoseconds"""
+
+    def __init__(self, path, size, mtime, times, offsets, frames,
+                 frameDuration, end, buildTime):
+        self.path    = path
+        self.size    = size
+        self.mtime   = mtime
+        self.times   = times
+        self.offsets = offsets
+        self.frames  = frames
+        self.frameDuration = frameDuration
+        self.end     = end
+        # Seconds to build, wherever it was built
+        self.buildTime = buildTime
+        self.cached  = False
+
+    def valid(self):
+        """Does the file still match?"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return st.st_size == self.size and st.st_mtime == self.mtime
+
+    def nearest(self, t):
+        """Keyframe time closest to t"""
+        i = bisect.bisect_left(self.times, t)
+        if i == len(self.times) or (i > 0 and t - self.times[i - 1] < self.times[i] - t):
+            i -= 1
+        return self.times[i]
+
+    def isKey(self, t):
+        """Is there a keyframe at t, to within half a frame?"""
+        return abs(self.nearest(t) - t) * 2 < self.frameDuration
+
+    def toDict(self):
+        return { "version": INDEX_VERSION, "path": self.path,
+                 "size": self.size, "mtime": self.mtime,
+                 "times": self.times, "offsets": self.offsets,
+                 "frames": self.frames, "frameDuration": self.frameDuration,
+                 "end": self.end, "buildTime": self.buildTime }
+
+    @staticmethod
+    def fromDict(d):
+        if d.get("version") != INDEX_VERSION:
+            return None
+        return KeyframeIndex(d["path"], d["size"], d["mtime"], d["times"],
+                             d["offsets"], d["frames"], d["frameDuration"],
+                             d["end"], d["buildTime"])
+
+
+def cacheFile(cacheDir, path):
+    h = hashlib.sha1(os.path.abspath(path).encode("utf-8"))
+    return os.path.join(cacheDir, h.hexdigest() + ".json")
+
+def loadIndex(cacheDir, path):
+    """Index from cache if there is one and file hasn't
+       changed, otherwise None"""
+    if cacheDir is None:
+        return None
+    try:
+        f = open(cacheFile(cacheDir, path))
+        index = KeyframeIndex.fromDict(json.load(f))
+        f.close()
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    if index is None or index.path != os.path.abspath(path) or not index.valid():
+        return None
+    index.cached = True
+    return index
+
+def saveIndex(cacheDir, index):
+    if cacheDir is None:
+        return
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+        # Write then rename, so never a half written file
+        fd, tmp = tempfile.mkstemp(dir=cacheDir)
+        f = os.fdopen(fd, "w")
+        json.dump(index.toDict(), f)
+        f.close()
+        os.rename(tmp, cacheFile(cacheDir, index.path))
+    except (IOError, OSError):
+        pass
+
+
+class IndexBuilder(object):
+    """Demux a file without decoding, noting keyframes of
+       the first video stream. onDone(builder) is called from
+       the main loop, with index set or None if it failed"""
+
+    def __init__(self, path, onDone):
+        self.path   = os.path.abspath(path)
+        self.onDone = onDone
+        self.index  = None
+        self.done   = False
+        self.startTime = time.time()
+        st = os.stat(self.path)
+        self.size   = st.st_size
+        self.mtime  = st.st_mtime
+        # Filled in on the streaming thread
+        self.times    = []
+        self.offsets  = []
+        self.frames   = 0
+        self.lastTime = None
+        self.intervals = []
+        self.readOffset = 0
+        self.videoPad = None
+        self.pipeline = gst.Pipeline("index")
+        src = gst.element_factory_make("filesrc")
+        src.set_property("location", self.path)
+        dec = gst.element_factory_make("decodebin")
+        dec.connect("element-added", self.onElement)
+        self.pipeline.add(src, dec)
+        src.link(dec)
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        self.handler = bus.connect("message::error", self.onError)
+        self.pipeline.set_state(gst.STATE_PLAYING)
+
+    def onElement(self, bin, element):
+        # Streaming thread, while decodebin is plugging
+        if "Demux" in element.get_factory().get_klass():
+            for pad in element.sink_pads():
+                pad.add_buffer_probe(self.onRead)
+            element.connect("pad-added", self.onPad)
+            element.connect("no-more-pads", self.onNoMorePads)
+
+    def onRead(self, pad, buf):
+        # Demuxer input, so file position
+        if buf.offset != gst.BUFFER_OFFSET_NONE:
+            self.readOffset = buf.offset
+        return True
+
+    def onPad(self, demux, pad):
+        # Nothing gets as far as a decoder
+        caps = pad.get_caps()
+        name = caps[0].get_name() if caps and len(caps) > 0 else ""
+        if self.videoPad is None and (name.startswith("video/") or name.startswith("image/")):
+            self.videoPad = pad
+            pad.add_buffer_probe(self.onVideo)
+            pad.add_event_probe(self.onEvent)
+        else:
+            pad.add_buffer_probe(lambda pad, buf: False)
+
+    def onNoMorePads(self, demux):
+        if self.videoPad is None:
+            gobject.idle_add(self.finish, False)
+
+    def onVideo(self, pad, buf):
+        t = buf.timestamp
+        if t == gst.CLOCK_TIME_NONE:
+            return False
+        self.frames += 1
+        if not buf.flag_is_set(gst.BUFFER_FLAG_DELTA_UNIT):
+            self.times.append(t)
+            self.offsets.append(self.readOffset)
+        # Decode order, so only increases count
+        if self.lastTime is not None and t > self.lastTime:
+            if len(self.intervals) < INTERVAL_SAMPLES:
+                self.intervals.append(t - self.lastTime)
+        if self.lastTime is None or t > self.lastTime:
+            self.lastTime = t
+        return False
+
+    def onEvent(self, pad, event):
+        if event.type == gst.EVENT_EOS:
+            gobject.idle_add(self.finish, True)
+        return False
+
+    def onError(self, bus, message):
+        if message.src is self.pipeline or message.src.has_ancestor(self.pipeline):
+            self.finish(False)
+
+    def finish(self, ok):
+        # Main loop
+        if self.done:
+            return False
+        self.stop()
+        if ok and self.times:
+            if self.intervals:
+                frame = sorted(self.intervals)[len(self.intervals) // 2]
+            else:
+                frame = DEFAULT_FRAME
+            # Keyframes from other streams can be out of order
+            order = sorted(range(len(self.times)), key=lambda i: self.times[i])
+            self.index = KeyframeIndex(self.path, self.size, self.mtime,
+                    [self.times[i] for i in order], [self.offsets[i] for i in order],
+                    self.frames, frame, self.lastTime + frame,
+                    time.time() - self.startTime)
+        self.onDone(self)
+        return False
+
+    def stop(self):
+        if self.done:
+            return
+        self.done = True
+        self.pipeline.set_state(gst.STATE_NULL)
+        bus = self.pipeline.get_bus()
+        bus.disconnect(self.handler)
+        bus.remove_signal_watch()
+
+
+class FileSeeker(object):
+    """Pause, seek and step video textures playing files,
+       all to the same timestamp at once"""
+
+    def __init__(self, streams, cacheDir=None, onChange=None):
+        self.streams  = list(streams)
+        self.cacheDir = cacheDir
+        # Called when a seek finishes or an index is ready
+        self.onChange = onChange
+        # Off to measure seeking without
+        self.useIndex = True
+        self.paused   = False
+        self.stopped  = False
+        self.position = 0
+        self.indexes  = {}
+        self.builders = []
+        for source in set(s.source for s in self.streams):
+            index = loadIndex(cacheDir, source)
+            if index is not None:
+                self.indexes[index.path] = index
+            else:
+                try:
+                    self.builders.append(IndexBuilder(source, self.onIndex))
+                except OSError:
+                    pass
+        # Seek in progress: start time, with index, streams
+        # without a new frame yet
+        self.pending  = None
+        self.latencies = { True: collections.deque(maxlen=LATENCY_HISTORY),
+                           False: collections.deque(maxlen=LATENCY_HISTORY) }
+        self.lastLatency = None
+        self.lastIndexed = False
+        for stream in self.streams:
+            stream.setFrameCallback(lambda s=stream: self.onFrame(s))
+
+    def onIndex(self, builder):
+        self.builders.remove(builder)
+        if builder.index is not None:
+            self.indexes[builder.index.path] = builder.index
+            saveIndex(self.cacheDir, builder.index)
+        if self.onChange:
+            self.onChange()
+
+    def index(self, stream):
+        return self.indexes.get(os.path.abspath(stream.source))
+
+    def indexed(self):
+        """Will the next seek use the index?"""
+        return self.useIndex and all(self.index(s) for s in self.streams)
+
+    def pipelines(self):
+        """Unique pipelines, and the streams in each"""
+        result = []
+        for stream in self.streams:
+            for pipe, members in result:
+                if pipe is stream.pipeline:
+                    members.append(stream)
+                    break
+            else:
+                result.append((stream.pipeline, [stream]))
+        return result
+
+    def frameDuration(self):
+        """Of the first stream, nanoseconds"""
+        index = self.index(self.streams[0])
+        if index is not None:
+            return index.frameDuration
+        caps = self.streams[0].sink.get_pad("sink").get_negotiated_caps()
+        if caps and caps[0].has_field("framerate"):
+            rate = caps[0]["framerate"]
+            if rate.num > 0:
+                return gst.SECOND * rate.denom // rate.num
+        return DEFAULT_FRAME
+
+    def duration(self):
+        """Of the shortest stream, nanoseconds, or None"""
+        ends = []
+        for pipe, members in self.pipelines():
+            for stream in members:
+                index = self.index(stream)
+                if index is not None:
+                    ends.append(index.end)
+            try:
+                ends.append(pipe.query_duration(gst.FORMAT_TIME)[0])
+            except gst.QueryError:
+                pass
+        ends = [e for e in ends if e > 0]
+        return min(ends) if ends else None
+
+    def currentPosition(self):
+        if self.paused:
+            return self.position
+        try:
+            return self.streams[0].pipeline.query_position(gst.FORMAT_TIME)[0]
+        except gst.QueryError:
+            return self.position
+
+    def pause(self):
+        if self.paused:
+            return
+        self.position = self.currentPosition()
+        for pipe, members in self.pipelines():
+            pipe.set_state(gst.STATE_PAUSED)
+        self.paused = True
+
+    def play(self):
+        if not self.paused:
+            return
+        self.pending = None
+        for pipe, members in self.pipelines():
+            pipe.set_state(gst.STATE_PLAYING)
+        self.paused = False
+
+    def toggle(self):
+        if self.paused:
+            self.play()
+        else:
+            self.pause()
+
+    def seek(self, t, snap=False):
+        """Pause, and move every stream to t nanoseconds. If
+           snap and indexed, to the nearest keyframe instead"""
+        self.pause()
+        end = self.duration()
+        if end is not None:
+            t = min(t, end - self.frameDuration())
+        t = max(int(t), 0)
+        indexed = self.indexed()
+        if indexed and snap:
+            t = self.index(self.streams[0]).nearest(t)
+        for pipe, members in self.pipelines():
+            key = indexed and all(self.index(s).isKey(t) for s in members)
+            if key:
+                flags = gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_KEY_UNIT
+            else:
+                flags = gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_ACCURATE
+            pipe.seek_simple(gst.FORMAT_TIME, flags, t)
+        self.position = t
+        self.pending = (time.time(), indexed, set(self.streams))
+
+    def step(self, frames):
+        """Move count frames, negative is back"""
+        self.pause()
+        self.seek(self.position + frames * self.frameDuration())
+
+    def jump(self, seconds):
+        """Move by time, to a keyframe if indexed"""
+        self.pause()
+        self.seek(self.position + seconds * gst.SECOND, True)
+
+    def seekStart(self):
+        self.seek(0, True)
+
+    def seekEnd(self):
+        end = self.duration()
+        if end is not None:
+            self.seek(end, True)
+
+    def onFrame(self, stream):
+        # Main loop, new frame on stream's texture
+        if self.stopped or self.pending is None:
+            return
+        start, indexed, waiting = self.pending
+        waiting.discard(stream)
+        if not waiting:
+            self.lastLatency = time.time() - start
+            self.lastIndexed = indexed
+            self.latencies[indexed].append(self.lastLatency)
+            self.pending = None
+            if self.onChange:
+                self.onChange()
+
+    def stats(self):
+        """Dict of position and seek latencies. Times in
+           seconds, latencies in milliseconds, None if not
+           known. index and plain are mean latencies with and
+           without the index. keyframes and indexTime are the
+           total keyframes and longest build time of the indexes"""
+        def mean(values):
+            return sum(values) / len(values) * 1000.0 if values else None
+        end = self.duration()
+        indexes = list(self.indexes.values())
+        return {
+            "paused":   self.paused,
+            "position": self.currentPosition() / gst.SECOND,
+            "duration": end / gst.SECOND if end is not None else None,
+            "indexing": len(self.builders),
+            "indexed":  self.indexed(),
+            "seeking":  self.pending is not None,
+            "latency":  self.lastLatency * 1000.0 if self.lastLatency is not None else None,
+            "lastIndexed": self.lastIndexed,
+            "index":    mean(self.latencies[True]),
+            "plain":    mean(self.latencies[False]),
+            "keyframes": sum(len(i.times) for i in indexes),
+            "indexTime": max(i.buildTime for i in indexes) * 1000.0 if indexes else None,
+        }
+
+    def stop(self):
+        self.stopped = True
+        for builder in self.builders:
+            builder.stop()
+        self.builders = []
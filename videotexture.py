@@ -7,7 +7,7 @@
 
 from __future__ import division, print_function
 
-import sys, math
+import sys, math, time
 
 import wx
 from wx.glcanvas import *
@@ -18,7 +18,7 @@ import OpenGL
 from OpenGL import GL
 from OpenGL.GL import *
 
-import app, gpu, gstvideo
+import app, debayer, decodeworker, gpu, gstvideo, reconnect
 from app import _
 
 
@@ -35,6 +35,25 @@ def fit(w, h, maxW, maxH):
     # If we get here, who knows?
     return 0.1
 
+# GLTextureSink drop_policy values
+DROP_LATEST = 0     # Lowest latency, only newest frame kept
+DROP_FIFO   = 1     # Queue frames, drop oldest if full
+DROP_BLOCK  = 2     # Queue frames, make upstream wait if full
+
+# Upper bounds, in milliseconds, for upload time histogram
+UPLOAD_BUCKETS = (1, 2, 4, 8, 16, 33)
+
+def histogram(values, buckets):
+    """Count values <= each bucket bound, plus one final
+       count for anything bigger than the last"""
+    counts = [0] * (len(buckets) + 1)
+    for v in values:
+        i = 0
+        while i < len(buckets) and v > buckets[i]:
+            i += 1
+        counts[i] += 1
+    return counts
+
 class Vec2f(object):
     """Convenience class for storing 2D values.
        wx.Point is integer coords, need float"""
@@ -70,19 +89,67 @@ class Rect(object):
             return Rect(lerp(r1.x, r2.x, a), lerp(r1.y, r2.y, a),
                         lerp(r1.w, r2.w, a), lerp(r1.h, r2.h, a))
 
+def startStreams(streams):
+    """Start video textures together. Those in the same
+       pipeline start with a single state change"""
+    now = time.time()
+    pipelines = []
+    for stream in streams:
+        stream.startTime = now
+        stream.startup = None
+        stream.firstFrameTime = None
+        if stream.pipeline not in pipelines:
+            pipelines.append(stream.pipeline)
+    for pipe in pipelines:
+        pipe.set_state(gst.STATE_PLAYING)
+
+def stopStreams(streams):
+    """Stop video textures, one state change per pipeline"""
+    pipelines = []
+    for stream in streams:
+        stream.stopSupervisor()
+        if stream.pipeline not in pipelines:
+            pipelines.append(stream.pipeline)
+    for pipe in pipelines:
+        pipe.set_state(gst.STATE_NULL)
+    for stream in streams:
+        stream.stopWorker()
+
+
 class VideoTexture(object):
     """Display single GStreamer video source within OpenGL
        view. Drawn from bottom left, animated move to position"""
     instCounter = 0
     
-    def __init__(self, source, gstPipeline):
+    def __init__(self, source, gstPipeline, container=None, warm=None):
+        """If container is a gst.Pipeline, the video source
+           and sink are added to it and not started: use
+           startStreams. Otherwise has own pipeline and
+           starts playing straight away. warm is an optional
+           preroll.WarmSource already in container"""
         # Can't really do anything until first frame arrives
         self.live = False
         # This allows app to show/hide
         self.visible = True
+        # Time to first frame on screen
+        self.startTime = time.time()
+        self.startup = None
+        self.firstFrameTime = None
+        self.source = source
+        self.warm = warm is not None
         self.initTexture()
         self.initLayout()
-        self.connectSource(source, gstPipeline)
+        self.connectSource(source, gstPipeline, container, warm)
+        self.sink.connect("texture-updated", self.onTextureUpdated)
+        # Rebuild live sources if they drop out
+        self.sourceCallbacks = []
+        self.supervisor = None
+        if self.liveSource and eval(app.config.Read("reconnect", "True")):
+            self.supervisor = reconnect.SourceSupervisor(self)
+            if self.worker:
+                # Held back shmsrc can't report a worker that never starts
+                self.worker.onExit = lambda: self.supervisor.fail(
+                        "decode worker exited, status {0}".format(self.worker.exitStatus))
     
     def newSinkName(self):
         """Generate unique name for Gst object"""
@@ -95,6 +162,8 @@ class VideoTexture(object):
         self.fx     = 0
         self.fy     = 0
         self.maxArea= 1.0
+        self.maxHeight = 1.0
+        self.origin = (0.0, 0.0)
         # Actual dimensions depend on video data. Assume
         # 4:3 for now so calculations don't break
         self.dest   = Rect(0, 0, 4/3, 1)
@@ -106,7 +175,12 @@ class VideoTexture(object):
         # Tex coords, video dimensions must wait until first use
         self.tex = Vec2f(0, 0)
         self.vid = Vec2f(0, 0)
+        # Texture size can be smaller than video, see resize
+        self.texSize = Vec2f(0, 0)
         self.firstFrame = False
+        # Box needs copying to vertex buffer
+        self.layoutChanged = True
+        self.geometry = None
     
     def initTexture(self):
         """Create OpenGL texture and GstGLTextureSink"""
@@ -114,18 +188,54 @@ class VideoTexture(object):
         # Now create the GstGLTextureSink
         self.sink = gst.element_factory_make("gltexturesink", self.newSinkName())
         self.sink.set_property("texture", self.texID)
+        # Asynchronous upload, if the OpenGL driver can
+        self.sink.set_property("use_pbo", eval(app.config.Read("usePBO", "True")))
+        # Latency or lossless? Pipeline can override
+        self.sink.set_property("drop_policy",
+                eval(app.config.Read("dropPolicy", str(DROP_LATEST))))
+        self.sink.set_property("queue_size",
+                eval(app.config.Read("queueSize", "4")))
+        # Only upload as many pixels as are displayed
+        self.decimate = eval(app.config.Read("decimateUpload", "True"))
         # State we need to track
         self.bayer = False
         self.prog  = None
+        # Half resolution Bayer: None is automatic
+        self.binning = None
+        # Instant replay can show another texture instead
+        self.replayTex = None
     
-    def connectSource(self, source, pipeline):
+    def connectSource(self, source, pipeline, container=None, warm=None):
         """Try and open video source, attach texture sink"""
         # First, create pipeline. (Which presumably is open-ended)
         if pipeline is None:
             pipeline = gstvideo.defaultPipeline(source)
+        # Newest frame always, rather than every frame on time
+        self.monitor = gstvideo.monitorMode(pipeline)
+        if self.monitor:
+            pipeline = gstvideo.liveMonitor(pipeline)
+            self.sink.set_property("sync", False)
         # Apply any gltexturesink params and create pipeline
         pipeline = gstvideo.configSink(self.sink, pipeline)
-        self.stream = gstvideo.createPipeline(source, pipeline)
+        self.liveSource = gstvideo.isLive(pipeline)
+        self.worker = None
+        if gstvideo.decodeWorkers():
+            # Source runs in another process, only upload here
+            self.worker = decodeworker.DecodeWorker(source, pipeline,
+                    eval(app.config.Read("workerShmMB", "64")) * 1e6, not self.monitor)
+            self.worker.start()
+            pipeline = self.worker.description
+            # Worker does any waiting for the clock
+            self.sink.set_property("sync", False)
+        self.description = pipeline
+        if warm is not None:
+            # Already built and running, replace its fakesink
+            warm.release()
+            self.stream = warm.chain
+        elif container is None:
+            self.stream = gstvideo.createPipeline(source, pipeline)
+        else:
+            self.stream = gstvideo.createBin(source, pipeline)
         # Get last element
         if isinstance(self.stream, gst.Bin):
             chain = [e for e in self.stream.sorted()]
@@ -143,15 +253,151 @@ class VideoTexture(object):
                         _("Error creating GST pipeline"),
                         wx.OK | wx.ICON_ERROR, None)
             raise RuntimeError("Unable to link GLTextureSink to pipeline")
+        if self.worker:
+            self.worker.attach(self.stream)
         # We're good
-        self.stream.set_state(gst.STATE_PLAYING)
+        if container is None:
+            self.pipeline = self.stream
+            self.pipeline.set_state(gst.STATE_PLAYING)
+        else:
+            self.pipeline = container
+            if warm is None:
+                container.add(self.stream)
     
     def stop(self):
-        self.stream.set_state(gst.STATE_NULL)
+        self.stopSupervisor()
+        self.pipeline.set_state(gst.STATE_NULL)
+        self.stopWorker()
+    
+    def stopSupervisor(self):
+        if self.supervisor:
+            self.supervisor.stop()
+    
+    def stopWorker(self):
+        if self.worker:
+            self.worker.stop()
+    
+    @property
+    def stale(self):
+        """True if the texture is an old frame from a source
+           that has failed and is being reconnected"""
+        return self.supervisor is not None and self.supervisor.stale
+    
+    def sourceElements(self):
+        """Everything in the stream except our sink"""
+        return [e for e in self.stream.elements() if e is not self.sink]
+    
+    def removeSource(self):
+        """Stop and discard the source chain, keeping the sink
+           and texture. For reconnecting"""
+        for e in self.sourceElements():
+            e.set_state(gst.STATE_NULL)
+            self.stream.remove(e)
+        # Worker may be what failed
+        self.stopWorker()
+    
+    def addSource(self):
+        """New source chain from the same pipeline string,
+           linked to the existing sink and started"""
+        if self.worker:
+            self.worker.start()
+        chain = gstvideo.createBin(self.source, self.description)
+        if self.worker:
+            self.worker.attach(chain)
+        self.stream.add(chain)
+        chain.sorted()[0].link(self.sink)
+        # Sink may have had EOS from the old source
+        pad = self.sink.get_pad("sink")
+        pad.send_event(gst.event_new_flush_start())
+        pad.send_event(gst.event_new_flush_stop())
+        chain.sync_state_with_parent()
+        for func in self.sourceCallbacks:
+            func()
+    
+    def setSourceCallback(self, func):
+        """func() is called after the source chain has been
+           rebuilt, for anything that probes source elements"""
+        self.sourceCallbacks.append(func)
+    
+    def onTextureUpdated(self, sink):
+        # Sink changes texture size if decimation changes
+        w = sink.get_property("upload_width")
+        h = sink.get_property("upload_height")
+        if w != self.texSize.w or h != self.texSize.h:
+            self.texSize = Vec2f(w, h)
+            # Shader uniforms need resetting
+            self.prog = None
+        if self.startup is None:
+            self.firstFrameTime = time.time()
+            self.startup = self.firstFrameTime - self.startTime
+    
+    def setFrameCallback(self, func):
+        """func() is called from the main loop every time
+           the sink uploads a new frame to the texture"""
+        self.sink.connect("texture-updated", lambda sink: func())
+    
+    def metrics(self):
+        """Return dict of stream statistics from the sink.
+           Times are in milliseconds, None if not known yet"""
+        sink = self.sink
+        times = [t / 1000.0 for t in sink.get_property("upload_times")]
+        latencies = [t / 1000.0 for t in sink.get_property("latencies") if t >= 0]
+        since = sink.get_property("since_last_frame")
+        return {
+            "frames":       sink.get_property("frames"),
+            "drops":        sink.get_property("drops"),
+            "uploads":      sink.get_property("uploads"),
+            "uploadTime":   sink.get_property("upload_time") / 1000.0,
+            "uploadHistogram": list(zip(UPLOAD_BUCKETS + (None,),
+                                    histogram(times, UPLOAD_BUCKETS))),
+            "sinceLastFrame": since / 1000.0 if since >= 0 else None,
+            "dropPolicy":   sink.get_property("drop_policy"),
+            "queueDepth":   sink.get_property("queue_depth"),
+            "maxQueueDepth": sink.get_property("max_queue_depth"),
+            "startup":      self.startup * 1000.0 if self.startup is not None else None,
+            "warm":         self.warm,
+            "sinceStartup": time.time() - self.firstFrameTime if self.startup is not None else None,
+            "binned":       self.binned(),
+            "uploadBytes":  sink.get_property("upload_bytes"),
+            "decimation":   sink.get_property("decimation"),
+            "latency":      sum(latencies) / len(latencies) if latencies else None,
+            "maxLatency":   max(latencies) if latencies else None,
+            "stale":        self.stale,
+            "reconnect":    self.supervisor.stats() if self.supervisor else None,
+            "workerCPU":    self.worker.cpu() if self.worker else None,
+        }
+    
+    @property
+    def animating(self):
+        """True if still sliding into position"""
+        return self.live and self.animStep < 1.0
     
     def setVisible(self, state):
         self.visible = state
     
+    def showTexture(self, texID):
+        """Draw texID instead of the live texture, or None to
+           go back to live. Must be the same size and format"""
+        self.replayTex = texID
+    
+    def setBinning(self, state):
+        """True or False to force half or full resolution
+           Bayer, None to choose from display scale"""
+        self.binning = state
+    
+    def binned(self):
+        """True if Bayer texture should be drawn at half
+           resolution, one pixel per RGGB quad. At half size
+           or less on screen the full demosaic is wasted"""
+        if not self.bayer:
+            return False
+        if self.binning is not None:
+            return self.binning
+        # Texture may already be decimated
+        if self.texSize.w <= 0:
+            return self.scale <= 0.5
+        return self.scale * self.vid.w / self.texSize.w <= 0.5
+    
     def checkLive(self):
         if self.live:
             return True
@@ -160,22 +406,27 @@ class VideoTexture(object):
                          self.sink.get_property("height"))
         if self.vid.w > 0 and self.vid.h > 0:
             self.tex = Vec2f(1.0, 1.0)
+            self.texSize = Vec2f(self.sink.get_property("upload_width"),
+                                 self.sink.get_property("upload_height"))
             self.bayer = self.sink.get_property("is_bayer")
             self.resize()
             self.setCoords()
             self.live = True
         return self.live
     
-    def place(self, fx, fy, canvas, force=False, maxArea=1.0):
-        """Place texture relative to midpoint of canvas.
-           fx, fy are fractions of width/height, can be
-           negative. force True to turn off animated move.
-           maxArea restricts display width to fraction of
-           total canvas"""
+    def place(self, fx, fy, canvas, force=False, maxArea=1.0,
+              maxHeight=1.0, origin=(0.0, 0.0)):
+        """Place texture relative to midpoint of canvas, or
+           origin in world coords if given. fx, fy are fractions
+           of width/height, can be negative. force True to turn
+           off animated move. maxArea, maxHeight restrict display
+           width and height to fraction of total canvas"""
         # Remember values
         self.fx = fx
         self.fy = fy
         self.maxArea = maxArea
+        self.maxHeight = maxHeight
+        self.origin = origin
         if self.canvas is None:
             self.canvas = canvas
         # Apply now or later?
@@ -187,23 +438,29 @@ class VideoTexture(object):
         """Resize display box to match texture, either
            animating to new size or force straight away"""
         self.scale = fit(self.vid.w, self.vid.h,
-            self.canvas.width * self.maxArea, self.canvas.height)
+            self.canvas.width * self.maxArea, self.canvas.height * self.maxHeight)
         # Use of canvas height for dest.w is not a mistake
         self.dest.w = self.vid.w * self.scale / self.canvas.height
         self.dest.h = self.vid.h * self.scale / self.canvas.height
+        if self.decimate:
+            # Sink skips pixels that GL_NEAREST would anyway
+            self.sink.set_property("target_width", int(self.vid.w * self.scale))
+            self.sink.set_property("target_height", int(self.vid.h * self.scale))
         if force:
             self.start.w = self.dest.w
             self.start.h = self.dest.h
             self.box.w   = self.dest.w
             self.box.h   = self.dest.h
+            self.layoutChanged = True
     
     def setCoords(self, force=True):
         """Set location (not size) on live texture"""
-        self.dest.x = self.fx * self.dest.w
-        self.dest.y = self.fy * self.dest.h
+        self.dest.x = self.origin[0] + self.fx * self.dest.w
+        self.dest.y = self.origin[1] + self.fy * self.dest.h
         if force:
             self.box = self.dest.copy()
             self.animStep = 1.0
+            self.layoutChanged = True
         else:
             self.start = self.box.copy()
             self.animStep = 0.0
@@ -214,51 +471,73 @@ class VideoTexture(object):
             return
         self.animStep = min(self.animStep + 0.2, 1.0)
         self.box = Rect.step(self.start, self.dest, self.animStep)
+        self.layoutChanged = True
+    
+    def contains(self, x, y):
+        """True if world coords x, y are within display box"""
+        b = self.box
+        return b.x <= x <= b.x + b.w and b.y <= y <= b.y + b.h
+    
+    def toImage(self, x, y):
+        """World coords to fraction of video image, origin
+           top left as in GStreamer, clamped to 0..1"""
+        b = self.box
+        if b.w <= 0 or b.h <= 0:
+            return 0.0, 0.0
+        fx = (x - b.x) / b.w
+        fy = 1.0 - (y - b.y) / b.h
+        return min(max(fx, 0.0), 1.0), min(max(fy, 0.0), 1.0)
+    
+    def fromImage(self, fx, fy):
+        """Inverse of toImage"""
+        b = self.box
+        return b.x + fx * b.w, b.y + (1.0 - fy) * b.h
     
-    def configShader(self):
-        """Set uniforms in current GPU program"""
+    def configShader(self, suffix=""):
+        """Set uniforms in current GPU program. suffix is
+           added to uniform names, for shaders with two eyes"""
         if self.bayer:
             shader = gpu.getProgram()
-            h = gpu.getUniform(shader, "sourceSize")
-            glUniform4f(h, self.vid.w, self.vid.h, 1.0/self.vid.w, 1.0/self.vid.h)
-            h = gpu.getUniform(shader, "firstRed")
+            h = gpu.getUniform(shader, "sourceSize" + suffix)
+            size = self.texSize
+            glUniform4f(h, size.w, size.h, 1.0/size.w, 1.0/size.h)
+            h = gpu.getUniform(shader, "firstRed" + suffix)
             # This is the RGGB ordering that works with Elphel
-            glUniform2f(h, 1, 0)
+            glUniform2f(h, *debayer.ELPHEL_FIRST_RED)
     
-    def draw(self):
+    def updateGeometry(self, geometry, shape):
+        """Animate, and copy display box to the named quad in
+           geometry if it has moved. Call before geometry.begin"""
         # First actual frame has arrived?
         if not self.checkLive():
             return
+        # Animated slide to new position?
+        self.slide()
+        if self.layoutChanged or self.geometry is not geometry:
+            geometry.setQuad(shape, self.box.x, self.box.y, self.box.w, self.box.h,
+                             self.tex.w, self.tex.h)
+            self.layoutChanged = False
+            self.geometry = geometry
+    
+    def draw(self, geometry, shape):
+        """Draw from geometry, which must be bound"""
+        if not self.live:
+            return
         # App allows display?
         if not self.visible:
             return
+        self.bind()
+        geometry.draw(shape)
+    
+    def bind(self, unit=0, suffix=""):
+        """Bind texture to texture unit, setting up current
+           program if it has changed. Leaves unit active"""
         # App has changed shaders?
         if gpu.getProgram() != self.prog:
-            self.configShader()
+            self.configShader(suffix)
             self.prog = gpu.getProgram()
-        # Animated slide to new position?
-        self.slide()
-        # Just rect with texture coords
-        glBindTexture(GL_TEXTURE_2D, self.texID)
-        glEnable(GL_TEXTURE_2D)
-        glTexEnvf(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
-        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
-        verts = (
-            self.box.x, self.box.y + self.box.h,    # Upper left
-            self.box.x, self.box.y,                 # Lower left
-            self.box.x + self.box.w, self.box.y + self.box.h,   # Upper right
-            self.box.x + self.box.w, self.box.y,                # Lower right
-        )
-        # GStreamer has image origin at top left
-        texCoords = (
-            0, 0,
-            0, self.tex.h,
-            self.tex.w, 0,
-            self.tex.w, self.tex.h,
-        )
-        glVertexPointer(2, GL_FLOAT, 0, verts)
-        glTexCoordPointer(2, GL_FLOAT, 0, texCoords)
-        glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
-        glDisable(GL_TEXTURE_2D)
-        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
-
+        glActiveTexture(GL_TEXTURE0 + unit)
+        if self.replayTex is not None:
+            glBindTexture(GL_TEXTURE_2D, self.replayTex)
+        else:
+            glBindTexture(GL_TEXTURE_2D, self.texID)